@@ -1,29 +1,245 @@
 from fastapi import Depends, HTTPException, Header
-from typing import Optional
+from typing import Any, Dict, Optional
 from app.config import settings
+from app.instrumentation import registry
+import hashlib
+import hmac
+import json
 import logging
+import math
+import time
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+# Paths that are never shed or rate limited (health checks, docs)
+ADMISSION_EXEMPT_PATHS = ("/", "/health", "/ready", "/docs", "/redoc", "/openapi.json")
+# Internal endpoints are only exempt when INTERNAL_METRICS_TOKEN guards them; otherwise they take an API key like the rest
+INTERNAL_PATH_PREFIX = "/internal/"
+
+
+def hash_api_key(api_key: str) -> str:
+    """SHA-256 hex digest of an API key, as used in API_KEYS and for lookups"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `burst` tokens
+
+    A rate of 0 or less disables limiting. Not thread-safe; it is only used
+    from the event loop.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until_token(self) -> float:
+        """Seconds until a token is available, without taking it; 0 when one is available now"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def try_acquire(self) -> float:
+        """Take one token; return 0 on success, otherwise the seconds until one is available"""
+        wait = self.time_until_token()
+        if not wait and self.rate > 0:
+            self.tokens -= 1
+        return wait
+
+    def available(self) -> Optional[float]:
+        if self.rate <= 0:
+            return None
+        self._refill()
+        return self.tokens
+
+
+class ApiKey:
+    """A configured API key with its rate limit and counters"""
+
+    def __init__(self, name: str, digest: str, rate: float, burst: float):
+        self.name = name
+        self.digest = digest
+        self.bucket = TokenBucket(rate, burst)
+        self.allowed = 0
+        self.rejected = 0
+
+
+def parse_api_keys(value: str, default_rate: float, default_burst: float) -> Dict[str, ApiKey]:
+    """Parse API_KEYS ('name:key[:rate[:burst]]' or 'name:sha256:<digest>[:rate[:burst]]') into digest -> ApiKey"""
+    keys = {}
+    for item in value.split(","):
+        fields = [field.strip() for field in item.split(":")]
+        if len(fields) < 2 or not fields[0] or not fields[1]:
+            continue
+        name = fields[0]
+        if fields[1].lower() == "sha256" and len(fields) >= 3:
+            digest, limits = fields[2].lower(), fields[3:]
+        else:
+            digest, limits = hash_api_key(fields[1]), fields[2:]
+        try:
+            rate = float(limits[0]) if len(limits) > 0 and limits[0] else default_rate
+            burst = float(limits[1]) if len(limits) > 1 and limits[1] else max(default_burst, rate)
+        except ValueError:
+            logger.error("Ignoring API key %s with invalid rate limit: %s", name, ":".join(limits))
+            continue
+        keys[digest] = ApiKey(name, digest, rate, burst)
+    return keys
+
+
+class AdmissionController:
+    """API key lookup, per-key token buckets and a global in-flight cap
+
+    Keys are stored by SHA-256 digest only: a provided key is hashed, looked
+    up in a dict and then compared with `hmac.compare_digest`, so neither the
+    raw keys nor the comparison time leak. State is per worker process.
+    """
+
+    def __init__(self, keys: Dict[str, ApiKey], max_in_flight: int = 0):
+        self.keys = keys
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.shed = 0
+
+    def lookup(self, api_key: str) -> Optional[ApiKey]:
+        digest = hash_api_key(api_key)
+        key = self.keys.get(digest)
+        if key is None or not hmac.compare_digest(key.digest, digest):
+            return None
+        return key
+
+    def try_enter(self) -> bool:
+        """Reserve an in-flight slot; False means the request must be shed"""
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            self.shed += 1
+            registry.inc("admission_rejections_total", ("in_flight",))
+            return False
+        self.in_flight += 1
+        return True
+
+    def leave(self):
+        self.in_flight -= 1
+
+    def retry_after(self, api_key: Optional[str]) -> float:
+        """Seconds a shed request should wait: until its key's bucket refills a token, at least 1"""
+        key = self.lookup(api_key) if api_key else None
+        return max(1.0, key.bucket.time_until_token() if key is not None else 0.0)
+
+    def admit(self, key: ApiKey) -> float:
+        """Charge one request to a key; return 0 if admitted, otherwise the Retry-After delay in seconds"""
+        wait = key.bucket.try_acquire()
+        if wait:
+            key.rejected += 1
+            registry.inc("admission_rejections_total", ("rate_limit",))
+        else:
+            key.allowed += 1
+        return wait
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "shed": self.shed,
+            "keys": [
+                {
+                    "name": key.name,
+                    "rate_per_second": key.bucket.rate,
+                    "burst": key.bucket.burst,
+                    "tokens_available": key.bucket.available(),
+                    "allowed": key.allowed,
+                    "rejected": key.rejected,
+                }
+                for key in self.keys.values()
+            ],
+        }
+
+
+def _build_admission_controller() -> AdmissionController:
+    keys = parse_api_keys(settings.api_keys, settings.rate_limit_per_second, settings.rate_limit_burst)
+    if settings.api_key:
+        # The single API_KEY keeps working as the "default" key with the default limits
+        keys.setdefault(hash_api_key(settings.api_key), ApiKey("default", hash_api_key(settings.api_key), settings.rate_limit_per_second, settings.rate_limit_burst))
+    logger.info("Admission control configured - %s API keys, max in-flight requests: %s", len(keys), settings.max_in_flight_requests or "unlimited")
+    return AdmissionController(keys, settings.max_in_flight_requests)
+
+
+# Global admission controller shared by the auth dependencies and the middleware
+admission = _build_admission_controller()
+
+
+def _retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+class AdmissionMiddleware:
+    """ASGI middleware shedding requests beyond the global in-flight cap with 429
+
+    Runs before routing, body parsing and auth, so an overloaded worker turns
+    excess requests away without doing any work for them. Retry-After is at
+    least a second, or as long as the caller's key takes to refill a token.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        exempt = path in ADMISSION_EXEMPT_PATHS or (settings.internal_metrics_token and path.startswith(INTERNAL_PATH_PREFIX))
+        if scope["type"] != "http" or exempt:
+            await self.app(scope, receive, send)
+            return
+
+        if not admission.try_enter():
+            logger.warning("Shedding request to %s - %s requests in flight", path, admission.in_flight)
+            api_key = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"x-api-key"), None)
+            retry_after = _retry_after(admission.retry_after(api_key))
+            body = json.dumps({"detail": "Server is busy, retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", retry_after.encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.leave()
+
+
 async def verify_api_key(x_api_key: Optional[str] = Header(None, alias="x-api-key")) -> str:
     """
     Dependency function to verify API key on every endpoint.
-    
+
     This function will be called automatically by FastAPI for any endpoint
-    that includes it as a dependency.
-    
+    that includes it as a dependency. Each valid key is also charged against
+    its token bucket.
+
     Args:
         x_api_key: API key from the x-api-key header
-        
+
     Returns:
         str: The validated API key
-        
+
     Raises:
-        HTTPException: If API key is missing or invalid
+        HTTPException: 401 if the API key is missing or invalid, 429 with
+            Retry-After if the key is over its rate limit
     """
     logger.debug("Starting API key verification")
-    
+
     if not x_api_key:
         logger.warning("API key verification failed - No API key provided")
         logger.debug("Raising HTTPException for missing API key")
@@ -31,49 +247,48 @@ async def verify_api_key(x_api_key: Optional[str] = Header(None, alias="x-api-ke
             status_code=401,
             detail="API key is required. Please provide it in the 'x-api-key' header."
         )
-    
-    logger.debug(f"API key provided: {x_api_key[:8]}...")
-    
-    if not settings.validate_api_key(x_api_key):
-        logger.warning(f"API key verification failed - Invalid API key: {x_api_key[:8]}...")
+
+    logger.debug("API key provided: %s...", x_api_key[:8])
+
+    key = admission.lookup(x_api_key)
+    if key is None:
+        logger.warning("API key verification failed - Invalid API key: %s...", x_api_key[:8])
         logger.debug("Raising HTTPException for invalid API key")
         raise HTTPException(
             status_code=401,
             detail="Invalid API key"
         )
-    
-    logger.debug("API key verification successful")
+
+    wait = admission.admit(key)
+    if wait:
+        logger.warning("Rate limit exceeded for API key %s - retry in %.2fs", key.name, wait)
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": _retry_after(wait)}
+        )
+
+    logger.debug("API key verification successful for %s", key.name)
     return x_api_key
 
 # Alternative: Optional API key validation (for endpoints that don't require auth)
 async def verify_api_key_optional(x_api_key: Optional[str] = Header(None, alias="x-api-key")) -> Optional[str]:
     """
     Optional API key verification for endpoints that can work with or without authentication.
-    
+
     Args:
         x_api_key: API key from the x-api-key header
-        
+
     Returns:
         Optional[str]: The validated API key if provided, None otherwise
-        
+
     Raises:
-        HTTPException: If API key is provided but invalid
+        HTTPException: If API key is provided but invalid or over its rate limit
     """
     logger.debug("Starting optional API key verification")
-    
+
     if not x_api_key:
         logger.debug("No API key provided - proceeding without authentication")
         return None
-    
-    logger.debug(f"API key provided: {x_api_key[:8]}...")
-    
-    if not settings.validate_api_key(x_api_key):
-        logger.warning(f"Optional API key verification failed - Invalid API key: {x_api_key[:8]}...")
-        logger.debug("Raising HTTPException for invalid API key")
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid API key"
-        )
-    
-    logger.debug("Optional API key verification successful")
-    return x_api_key
+
+    return await verify_api_key(x_api_key)
@@ -1,18 +1,32 @@
 import os
+import tempfile
 from typing import Optional
+from dotenv import load_dotenv
 import logging
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+# Load .env before reading any setting
+load_dotenv()
+
 class Settings:
     """Application settings and configuration"""
     
     def __init__(self):
         # API Key - can be set via environment variable or use default for development
         self.api_key: str = os.getenv("API_KEY", "test-api-key-12345")
-        logger.debug(f"API key loaded: {self.api_key[:8]}...")
+        logger.debug("API key loaded: %s...", self.api_key[:8])
         
+        # Additional API keys with per-key rate limits
+        # API_KEYS: comma-separated "name:key[:rate[:burst]]" entries; "name:sha256:<hex digest>[:rate[:burst]]" avoids storing the raw key
+        # Limits are requests per second and bucket size per worker; rate 0 disables limiting for that key
+        self.api_keys: str = os.getenv("API_KEYS", "")
+        self.rate_limit_per_second: float = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+        self.rate_limit_burst: float = float(os.getenv("RATE_LIMIT_BURST", "40"))
+        # Requests processed concurrently per worker before new ones are shed (0 = unlimited)
+        self.max_in_flight_requests: int = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "100"))
+
         # Database settings
         self.database_url: Optional[str] = os.getenv("DATABASE_URL")
         if self.database_url:
@@ -28,18 +42,139 @@ class Settings:
         else:
             logger.warning("No HappyRobot bearer token configured")
         
+        # Database client settings
+        self.db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+        self.db_query_timeout: float = float(os.getenv("DB_QUERY_TIMEOUT", "10"))
+
+        # In-memory mock database (used when Supabase is not configured)
+        # MOCK_DB_FIXTURES: comma-separated JSON/NDJSON/CSV files; each file seeds the table named after it (e.g. fixtures/loads.csv)
+        self.mock_db_fixtures: str = os.getenv("MOCK_DB_FIXTURES", "")
+        self.mock_db_latency_ms: float = float(os.getenv("MOCK_DB_LATENCY_MS", "0"))
+
+        # STATE_DIR: directory of the state files shared by the workers of one host (cache, recent origins, sketches, load snapshot)
+        # Defaults to a directory under the system temp dir; each *_PATH setting below can still point elsewhere
+        self.state_dir: str = os.getenv("STATE_DIR", os.path.join(tempfile.gettempdir(), "carrier-sales"))
+
+        # Cache for geocodes and carrier lookups
+        # CACHE_BACKEND: "memory" (per worker, default), "sqlite" (one WAL-mode file shared by all workers on the host) or "none"
+        self.cache_backend: str = os.getenv("CACHE_BACKEND", "memory")
+        self.cache_path: str = os.getenv("CACHE_PATH", os.path.join(self.state_dir, "shared_cache.sqlite3"))
+        self.cache_max_entries: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+        self.geocode_cache_ttl: float = float(os.getenv("GEOCODE_CACHE_TTL", "604800"))
+        self.carrier_cache_ttl: float = float(os.getenv("CARRIER_CACHE_TTL", "300"))
+
+        # Startup warm-up (/ready passes once it finishes or WARMUP_TIMEOUT seconds passed)
+        # RECENT_ORIGINS_PATH: file shared by all workers counting recently searched origins (empty disables tracking)
+        self.warmup_timeout: float = float(os.getenv("WARMUP_TIMEOUT", "30"))
+        self.warmup_connections: int = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+        self.warmup_top_origins: int = int(os.getenv("WARMUP_TOP_ORIGINS", "20"))
+        self.recent_origins_path: str = os.getenv("RECENT_ORIGINS_PATH", os.path.join(self.state_dir, "recent_origins.json"))
+        self.recent_origins_window_days: float = float(os.getenv("RECENT_ORIGINS_WINDOW_DAYS", "7"))
+
+        # Outbound dependency resilience (Nominatim, HappyRobot)
+        # A breaker opens when BREAKER_ERROR_RATE of at least BREAKER_MIN_CALLS calls in BREAKER_WINDOW_SECONDS failed
+        # HEDGE_DEPENDENCIES: comma-separated dependencies whose idempotent calls are hedged after their p95 latency, e.g. "happyrobot"
+        self.breaker_window_seconds: float = float(os.getenv("BREAKER_WINDOW_SECONDS", "30"))
+        self.breaker_min_calls: int = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+        self.breaker_error_rate: float = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+        self.breaker_open_seconds: float = float(os.getenv("BREAKER_OPEN_SECONDS", "15"))
+        self.nominatim_max_concurrency: int = int(os.getenv("NOMINATIM_MAX_CONCURRENCY", "4"))
+        self.happyrobot_max_concurrency: int = int(os.getenv("HAPPYROBOT_MAX_CONCURRENCY", "10"))
+        self.bulkhead_max_wait: float = float(os.getenv("BULKHEAD_MAX_WAIT", "1"))
+        self.hedge_dependencies: str = os.getenv("HEDGE_DEPENDENCIES", "")
+        self.hedge_min_delay_ms: float = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+
+        # Load search time budget in milliseconds (0 disables); callers can override it per request with the x-deadline-ms header
+        self.load_search_budget_ms: float = float(os.getenv("LOAD_SEARCH_BUDGET_MS", "3000"))
+
+        # Pickup time matching: "same_day", "exact" or a number of hours either side of the requested pickup
+        # PICKUP_WINDOW_CANDIDATES: loads fetched from the window and ranked by distance from the requested time
+        self.pickup_window: str = os.getenv("PICKUP_WINDOW", "same_day")
+        self.pickup_window_candidates: int = int(os.getenv("PICKUP_WINDOW_CANDIDATES", "25"))
+
+        # Empty-lane cache: search attempts that found no loads are skipped for NEGATIVE_CACHE_TTL seconds (0 disables)
+        self.negative_cache_ttl: float = float(os.getenv("NEGATIVE_CACHE_TTL", "60"))
+        self.negative_cache_max_entries: int = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "10000"))
+
+        # Negotiation and booking (/loads/negotiate, /loads/confirm)
+        # RESERVATION_LEASE_SECONDS: how long a negotiation holds a load for its carrier on this worker
+        # NEGOTIATION_MAX_MARKUP: highest agreed rate as a fraction above the loadboard rate (0.1 = up to 10% more)
+        self.reservation_lease_seconds: float = float(os.getenv("RESERVATION_LEASE_SECONDS", "300"))
+        self.negotiation_max_markup: float = float(os.getenv("NEGOTIATION_MAX_MARKUP", "0.1"))
+
+        # Call sessions (requests sharing an x-call-id header reuse carrier checks, geocodes and searches)
+        # SESSION_IDLE_SECONDS: a session is dropped after this long without a request (0 disables sessions)
+        # SESSION_PREFETCH_LIMIT: loads prefetched around a call's origin (0 disables prefetching)
+        self.session_idle_seconds: float = float(os.getenv("SESSION_IDLE_SECONDS", "600"))
+        self.session_max: int = int(os.getenv("SESSION_MAX", "5000"))
+        self.session_prefetch_limit: int = int(os.getenv("SESSION_PREFETCH_LIMIT", "500"))
+
+        # Response compression (brotli is used when the optional brotli package is installed, gzip otherwise)
+        # COMPRESSION_MIN_SIZE: responses smaller than this many bytes are sent uncompressed
+        self.compression_min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        self.gzip_level: int = int(os.getenv("GZIP_LEVEL", "6"))
+        self.brotli_quality: int = int(os.getenv("BROTLI_QUALITY", "5"))
+
+        # Load chaining (/loads/chains): open loads are snapshotted every CHAIN_REFRESH_SECONDS into grid cells of CHAIN_CELL_MILES
+        # Each leg may start at most CHAIN_MAX_DEADHEAD_MILES from the previous drop-off and CHAIN_MAX_WAIT_HOURS after it
+        self.chain_refresh_seconds: float = float(os.getenv("CHAIN_REFRESH_SECONDS", "60"))
+        self.chain_cell_miles: float = float(os.getenv("CHAIN_CELL_MILES", "50"))
+        self.chain_max_legs: int = int(os.getenv("CHAIN_MAX_LEGS", "3"))
+        self.chain_max_deadhead_miles: float = float(os.getenv("CHAIN_MAX_DEADHEAD_MILES", "150"))
+        self.chain_max_wait_hours: float = float(os.getenv("CHAIN_MAX_WAIT_HOURS", "48"))
+        self.chain_average_speed_mph: float = float(os.getenv("CHAIN_AVERAGE_SPEED_MPH", "50"))
+        self.chain_branching: int = int(os.getenv("CHAIN_BRANCHING", "5"))
+        self.chain_scan_limit: int = int(os.getenv("CHAIN_SCAN_LIMIT", "50"))
+
+        # LOAD_SNAPSHOT_PATH: memory-mapped snapshot file of open loads shared by all workers (empty disables it)
+        # Rebuilt by one worker once it is older than CHAIN_REFRESH_SECONDS; the others map it instead of querying the database
+        self.load_snapshot_path: str = os.getenv("LOAD_SNAPSHOT_PATH", os.path.join(self.state_dir, "open_loads.snapshot"))
+
+        # Bulk load import: rows geocoded and inserted per batch
+        self.import_batch_size: int = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+        # Metrics export settings
+        self.export_page_size: int = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+        # Quantile sketch settings (empty SKETCH_STATE_PATH disables persistence)
+        self.sketch_state_path: str = os.getenv("SKETCH_STATE_PATH", os.path.join(self.state_dir, "metric_sketches.json"))
+        self.sketch_relative_accuracy: float = float(os.getenv("SKETCH_RELATIVE_ACCURACY", "0.01"))
+        self.sketch_max_buckets: int = int(os.getenv("SKETCH_MAX_BUCKETS", "2048"))
+        self.sketch_flush_interval: float = float(os.getenv("SKETCH_FLUSH_INTERVAL", "30"))
+
+        # Instrumentation settings (/internal/metrics)
+        # INSTRUMENTATION_DIR must be shared by all uvicorn workers; defaults to a directory under the system temp dir
+        self.instrumentation_dir: str = os.getenv("INSTRUMENTATION_DIR", "")
+        self.instrumentation_flush_interval: float = float(os.getenv("INSTRUMENTATION_FLUSH_INTERVAL", "5"))
+        # INTERNAL_METRICS_TOKEN: bearer token for all /internal/* endpoints; when unset they require an API key instead
+        self.internal_metrics_token: str = os.getenv("INTERNAL_METRICS_TOKEN", "")
+
+        # Event loop monitoring (/internal/loop): lag is measured every LOOP_MONITOR_INTERVAL_MS (0 disables)
+        # and the blocking call site is captured when the loop is stuck for LOOP_STALL_THRESHOLD_MS
+        self.loop_monitor_interval_ms: float = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+        self.loop_stall_threshold_ms: float = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+
+        # Per-request profiling (/internal/profiles); off unless PROFILE_TOKEN or PROFILE_SAMPLE_RATE is set
+        # PROFILE_TOKEN: requests with a matching x-profile header are profiled
+        # PROFILE_SAMPLE_RATE: fraction of all other requests profiled
+        self.profile_token: str = os.getenv("PROFILE_TOKEN", "")
+        self.profile_sample_rate: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.profile_interval_ms: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+        self.profile_buffer_size: int = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+
         # Other settings can be added here
         self.debug: bool = os.getenv("DEBUG", "false").lower() == "true"
-        logger.debug(f"Debug mode: {self.debug}")
+        logger.debug("Debug mode: %s", self.debug)
+
+        # Logging settings
+        # LOG_SAMPLE_RATES: fraction of INFO/DEBUG lines kept per logger, e.g. "app.routers.loads=0.1,app.utils=0.05"
+        # LOG_LEVELS: per-logger level overrides, e.g. "app.utils=DEBUG"
+        self.log_level: str = os.getenv("LOG_LEVEL", "DEBUG" if self.debug else "INFO")
+        self.log_format: str = os.getenv("LOG_FORMAT", "json")
+        self.log_sample_rates: str = os.getenv("LOG_SAMPLE_RATES", "")
+        self.log_levels: str = os.getenv("LOG_LEVELS", "")
         
         logger.info("Settings initialized successfully")
-    
-    def validate_api_key(self, provided_key: str) -> bool:
-        """Validate the provided API key"""
-        logger.debug(f"Validating API key: {provided_key[:8]}...")
-        is_valid = provided_key == self.api_key
-        logger.debug(f"API key validation result: {is_valid}")
-        return is_valid
 
 # Global settings instance
 settings = Settings()
@@ -0,0 +1,56 @@
+"""
+Bulk import loads from a CSV or NDJSON file into the configured database.
+
+    python -m app.import_loads loads.csv
+    python -m app.import_loads loads.ndjson --batch-size 1000
+
+The file is read in chunks and goes through the same pipeline as
+POST /loads/import: rows are streamed, each unique place is geocoded once
+(through the shared geocode cache), and loads are inserted in batches. The
+report is printed as JSON; the exit status is 1 if any row failed.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from app.utils.utils_ingest import IMPORT_FORMATS, import_loads
+
+CHUNK_SIZE = 1 << 16
+
+
+async def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def run(path: str, format: str, batch_size: int | None) -> dict:
+    from app.supabase import supabase
+    from app.utils.utils_metrics import close_http_client
+
+    try:
+        return await import_loads(read_chunks(path), format, batch_size)
+    finally:
+        await supabase.close()
+        await close_http_client()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV (with a header line) or NDJSON file of loads")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="File format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, help="Rows geocoded and inserted per batch (default IMPORT_BATCH_SIZE)")
+    args = parser.parse_args(argv)
+
+    format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    report = asyncio.run(run(args.path, format, args.batch_size))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    def __init__(self, name: str, kind: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float] = ()):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+
+class MetricsRegistry:
+    """Counters and histograms aggregated across uvicorn workers
+
+    Every worker keeps its own cumulative values in memory and periodically
+    writes them to `<directory>/<parent pid>/worker-<pid>.json`. Workers started
+    by the same uvicorn master share a parent pid, so a scrape served by any of
+    them sums the files of all siblings (including workers that were restarted,
+    which keeps counters monotonic). Values from other workers can be up to
+    `flush_interval` seconds old; the scraping worker's own values are live.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, _Metric] = {}
+        self._counters: Dict[str, Dict[LabelValues, float]] = {}
+        self._histograms: Dict[str, Dict[LabelValues, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def generation_dir(self) -> str:
+        return os.path.join(self.directory, str(os.getppid()))
+
+    @property
+    def worker_file(self) -> str:
+        return os.path.join(self.generation_dir, f"worker-{os.getpid()}.json")
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self._metrics[name] = _Metric(name, "counter", help_text, labelnames)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self._metrics[name] = _Metric(name, "histogram", help_text, labelnames, sorted(buckets))
+        self._histograms.setdefault(name, {})
+
+    def inc(self, name: str, labels: LabelValues = (), amount: float = 1.0):
+        with self._lock:
+            series = self._counters[name]
+            series[labels] = series.get(labels, 0.0) + amount
+
+    def observe(self, name: str, labels: LabelValues, value: float):
+        metric = self._metrics[name]
+        # One slot per bucket, then +Inf, sum and count
+        slot = bisect_left(metric.buckets, value)
+        with self._lock:
+            series = self._histograms[name]
+            values = series.get(labels)
+            if values is None:
+                values = series[labels] = [0.0] * (len(metric.buckets) + 3)
+            values[slot] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def _state(self) -> Dict[str, Dict[str, List]]:
+        with self._lock:
+            return {
+                "counters": {name: [[list(labels), value] for labels, value in series.items()] for name, series in self._counters.items()},
+                "histograms": {name: [[list(labels), list(values)] for labels, values in series.items()] for name, series in self._histograms.items()},
+            }
+
+    def flush(self):
+        """Write this worker's values to its file in the shared directory"""
+        try:
+            os.makedirs(self.generation_dir, exist_ok=True)
+            # Per thread: /internal/metrics flushes from a worker thread while the flush loop runs on the event loop
+            tmp_path = f"{self.worker_file}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._state(), f)
+            os.replace(tmp_path, self.worker_file)
+        except OSError as e:
+            logger.error("Error flushing instrumentation state to %s: %s", self.worker_file, e)
+
+    def cleanup_stale_generations(self):
+        """Remove directories left behind by uvicorn masters that are no longer running"""
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.listdir(self.directory):
+            if not entry.isdigit() or int(entry) == os.getppid():
+                continue
+            try:
+                os.kill(int(entry), 0)
+            except ProcessLookupError:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+            except PermissionError:
+                pass
+
+    def _merged(self) -> Dict[str, Dict]:
+        """Sum the values of every worker of this generation"""
+        self.flush()
+        counters: Dict[str, Dict[LabelValues, float]] = {name: {} for name in self._counters}
+        histograms: Dict[str, Dict[LabelValues, List[float]]] = {name: {} for name in self._histograms}
+        try:
+            files = [name for name in os.listdir(self.generation_dir) if name.endswith(".json")]
+        except OSError:
+            files = []
+        for file_name in files:
+            try:
+                with open(os.path.join(self.generation_dir, file_name)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable instrumentation file %s: %s", file_name, e)
+                continue
+            for name, series in state.get("counters", {}).items():
+                if name not in counters:
+                    continue
+                for labels, value in series:
+                    key = tuple(labels)
+                    counters[name][key] = counters[name].get(key, 0.0) + value
+            for name, series in state.get("histograms", {}).items():
+                if name not in histograms:
+                    continue
+                for labels, values in series:
+                    key = tuple(labels)
+                    current = histograms[name].get(key)
+                    if current is None or len(current) != len(values):
+                        histograms[name][key] = list(values)
+                    else:
+                        histograms[name][key] = [a + b for a, b in zip(current, values)]
+        return {"counters": counters, "histograms": histograms}
+
+    def render(self) -> str:
+        """Render all metrics of all workers in the Prometheus text exposition format"""
+        merged = self._merged()
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind == "counter":
+                for labels, value in sorted(merged["counters"][metric.name].items()):
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+                continue
+            for labels, values in sorted(merged["histograms"][metric.name].items()):
+                cumulative = 0.0
+                for bound, bucket_count in zip(metric.buckets, values):
+                    cumulative += bucket_count
+                    lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, labels, ('le', _format_value(bound)))} {_format_value(cumulative)}")
+                lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, labels, ('le', '+Inf'))} {_format_value(values[-1])}")
+                lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(values[-2])}")
+                lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, labels)} {_format_value(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+    async def run_flush_loop(self):
+        """Flush this worker's values every flush_interval seconds until cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                self.flush()
+        except asyncio.CancelledError:
+            self.flush()
+            raise
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labels: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# (name, start, duration) of the spans of the request being profiled; None when it is not profiled
+request_spans: ContextVar[Optional[List[Tuple[str, float, float]]]] = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Time a named stage; usable around sync code or awaits inside async code"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        registry.inc("app_span_errors_total", (name,))
+        raise
+    finally:
+        duration = time.perf_counter() - start_time
+        registry.observe("app_span_duration_seconds", (name,), duration)
+        spans = request_spans.get()
+        if spans is not None:
+            spans.append((name, start_time, duration))
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware counting requests and timing them per route template and status"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[object, str] = {}
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # Keep unmatched paths (404s, scanners) out of the label space
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            path = "unmatched"
+            for route in getattr(scope.get("app"), "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route_label(scope)
+            method = scope.get("method", "")
+            registry.inc("http_requests_total", (method, route, str(status_code)))
+            registry.observe("http_request_duration_seconds", (method, route), time.perf_counter() - start_time)
+
+
+# Global registry shared by the middleware, spans and the /internal/metrics endpoint
+registry = MetricsRegistry(
+    settings.instrumentation_dir or os.path.join(tempfile.gettempdir(), "carrier-sales-metrics"),
+    settings.instrumentation_flush_interval,
+)
+registry.counter("http_requests_total", "HTTP requests by method, route and status code", ("method", "route", "status"))
+registry.histogram("http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route"))
+registry.histogram("app_span_duration_seconds", "Duration of named processing stages", ("span",))
+registry.counter("app_span_errors_total", "Named processing stages that raised an exception", ("span",))
+registry.histogram("db_query_duration_seconds", "Database query latency by repository operation", ("operation",))
+registry.counter("db_query_errors_total", "Database queries that failed or timed out", ("operation",))
+registry.counter("admission_rejections_total", "Requests rejected by admission control by reason (rate_limit, in_flight)", ("reason",))
+registry.counter("singleflight_calls_total", "Coalesced calls by group and role (leader ran the computation, follower joined it)", ("group", "role"))
+registry.counter("cache_requests_total", "Cache lookups by namespace and result (hit, miss)", ("namespace", "result"))
+registry.counter("dependency_calls_total", "Outbound dependency calls by outcome (success, failure, circuit_open, bulkhead_full)", ("dependency", "outcome"))
+registry.counter("dependency_hedges_total", "Hedged outbound requests launched and won by the hedge", ("dependency", "result"))
+registry.histogram("event_loop_lag_seconds", "How late the event loop heartbeat woke up", (), (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+registry.counter("event_loop_stalls_total", "Times the event loop was blocked for at least LOOP_STALL_THRESHOLD_MS")
+registry.counter("call_session_requests_total", "Call-session lookups by kind (carrier, geocode, search, prefetch) and result (hit, miss)", ("kind", "result"))
+registry.counter("load_bookings_total", "Booking confirmations by outcome (booked, unavailable, rejected)", ("outcome",))
@@ -0,0 +1,173 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Argument types that cannot change between enqueueing and formatting
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, bytes, type(None), Decimal, date, datetime, time, timedelta, uuid.UUID)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves message formatting to the background listener
+
+    The stock QueueHandler merges `msg % args` in the calling thread before
+    enqueueing. Here records whose arguments are all immutable (strings,
+    numbers, dates, ...) are enqueued with their arguments, so `getMessage()`
+    runs on the writer thread. Records with mutable arguments such as dicts or
+    models are merged now, since the caller may change them before the writer
+    gets to them. Exceptions are always rendered now and `exc_info` cleared,
+    so queued records do not keep traceback frames alive.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_ARG_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of low-severity records per logger
+
+    `rates` maps logger name prefixes to the fraction of records to keep, e.g.
+    {"app.routers.loads": 0.1}. The longest matching prefix wins. Records at
+    WARNING and above are never dropped.
+    """
+
+    def __init__(self, rates: Dict[str, float], max_level: int = logging.INFO):
+        super().__init__()
+        self.rates = rates
+        self.max_level = max_level
+        self._prefixes = sorted(rates, key=len, reverse=True)
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            for prefix in self._prefixes:
+                if name == prefix or name.startswith(prefix + "."):
+                    rate = self.rates[prefix]
+                    break
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse 'app.routers.loads=0.1,app.utils=0.05' into a prefix -> rate mapping"""
+    rates = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, rate = item.split("=", 1)
+        try:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+def parse_logger_levels(value: str) -> Dict[str, str]:
+    """Parse 'app.utils=DEBUG,httpx=WARNING' into a logger -> level mapping"""
+    levels = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str = "INFO", log_format: str = "json", log_file: Optional[str] = None, sample_rates: Optional[Dict[str, float]] = None, logger_levels: Optional[Dict[str, str]] = None, stream=None):
+    """Route all logging through a queue to a background writer thread
+
+    Output handlers (stdout and the optional log file) run on the listener
+    thread, so slow terminals or disks never block a request. Sampling happens
+    before enqueueing, so dropped records cost nothing beyond the filter check.
+    """
+    global _listener
+
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    output_handlers: List[logging.Handler] = [logging.StreamHandler(stream or sys.stdout)]
+    if log_file:
+        output_handlers.append(logging.FileHandler(log_file, mode="a"))
+    for handler in output_handlers:
+        handler.setFormatter(formatter)
+
+    # Replace any previous pipeline, flushing what it still has queued
+    shutdown_logging()
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    for name, logger_level in (logger_levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *output_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(shutdown_logging)
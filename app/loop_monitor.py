@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.instrumentation import registry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Frames under this directory are the app's own code; a stall is charged to the innermost one
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Call sites kept in the report; the ones with the least stalled time are dropped first
+MAX_OFFENDERS = 100
+
+
+class _Offender:
+    def __init__(self, site: str):
+        self.site = site
+        self.stalls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.stack: List[str] = []
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "site": self.site,
+            "stalls": self.stalls,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "stack": self.stack,
+        }
+
+
+def _call_site(frame) -> str:
+    """`file:line in function` of the innermost app frame of a stack (or of the innermost frame)"""
+    innermost = frame
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(APP_DIR):
+            break
+        frame = frame.f_back
+    frame = frame or innermost
+    return f"{os.path.relpath(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+class LoopMonitor:
+    """Measures event loop lag and finds the code that blocks the loop
+
+    A heartbeat task sleeps `interval` seconds at a time and records how late
+    it wakes up in the `event_loop_lag_seconds` histogram. A watchdog thread
+    checks the heartbeat; once it is `threshold` seconds overdue, the loop is
+    stalled and the watchdog captures the loop thread's stack. When the
+    heartbeat runs again, the whole stall is charged to the call site
+    captured during it. Costs one wake-up per interval on the loop and one
+    per threshold / 2 in the watchdog.
+    """
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._offenders: Dict[str, _Offender] = {}
+        self._last_beat = time.perf_counter()
+        self._captured: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            overdue = time.perf_counter() - self._last_beat - self.interval
+            if overdue < self.threshold or self._captured is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            site = _call_site(frame)
+            stack = [line.rstrip() for line in traceback.format_stack(frame)][-15:]
+            self._captured = (site, stack)
+
+    def _record_stall(self, lag: float):
+        captured, self._captured = self._captured, None
+        site, stack = captured if captured is not None else ("unknown (stall ended before the watchdog saw it)", [])
+        self.stalls += 1
+        registry.inc("event_loop_stalls_total")
+        with self._lock:
+            offender = self._offenders.get(site)
+            if offender is None:
+                if len(self._offenders) >= MAX_OFFENDERS:
+                    del self._offenders[min(self._offenders.values(), key=lambda item: item.total_seconds).site]
+                offender = self._offenders[site] = _Offender(site)
+            offender.stalls += 1
+            offender.total_seconds += lag
+            offender.max_seconds = max(offender.max_seconds, lag)
+            offender.stack = stack
+        logger.warning("Event loop blocked for %.3fs at %s", lag, site)
+
+    async def run(self):
+        """Heartbeat until cancelled; starts and stops the watchdog thread"""
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._last_beat = time.perf_counter()
+        watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = time.perf_counter()
+                lag = max(0.0, now - self._last_beat - self.interval)
+                self._last_beat = now
+                registry.observe("event_loop_lag_seconds", (), lag)
+                self.max_lag = max(self.max_lag, lag)
+                if lag >= self.threshold:
+                    self._record_stall(lag)
+                else:
+                    # A capture for a stall that ended just under the threshold is stale
+                    self._captured = None
+        finally:
+            self._stopped.set()
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        """Stall counts and the call sites that blocked the loop the longest"""
+        with self._lock:
+            offenders = sorted(self._offenders.values(), key=lambda item: item.total_seconds, reverse=True)[:limit]
+            return {
+                "interval_ms": self.interval * 1000,
+                "threshold_ms": self.threshold * 1000,
+                "stalls": self.stalls,
+                "max_lag_ms": round(self.max_lag * 1000, 3),
+                "offenders": [offender.report() for offender in offenders],
+            }
+
+
+# Global monitor started by the app lifespan (LOOP_MONITOR_INTERVAL_MS=0 disables it)
+loop_monitor = LoopMonitor(settings.loop_monitor_interval_ms / 1000, settings.loop_stall_threshold_ms / 1000)
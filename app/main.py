@@ -1,34 +1,83 @@
+import time
+
+# Start of app import, for the import time and time-to-ready reported by /ready
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
-from app.routers import carriers, loads, metrics
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from app.config import settings
+from app.logging_config import setup_logging, parse_sample_rates, parse_logger_levels
 import logging
-import uvicorn
 from datetime import datetime
 from datetime import timezone
-import sys
-
-# Configure comprehensive logging
-log_handlers = [logging.StreamHandler(sys.stdout)]
-if settings.debug:  # or an env flag like os.getenv("LOG_TO_FILE") == "true"
-    log_handlers.append(logging.FileHandler('app.log', mode='a'))
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=log_handlers
+# Configure logging before importing the routers so their import-time logs go through the queue
+setup_logging(
+    level=settings.log_level,
+    log_format=settings.log_format,
+    log_file='app.log' if settings.debug else None,
+    sample_rates=parse_sample_rates(settings.log_sample_rates),
+    logger_levels=parse_logger_levels(settings.log_levels),
 )
 
-# Set different log levels for different modules
+from app.routers import carriers, loads, metrics, internal
+from app.utils.utils_sketches import metric_sketches
+from app.supabase import supabase
+from app.instrumentation import InstrumentationMiddleware, registry
+from app.auth import AdmissionMiddleware
+from app.middleware import CompressionMiddleware, ConditionalGetMiddleware
+from app.profiling import ProfilingMiddleware
+from app.loop_monitor import loop_monitor
+from app.utils.utils_traffic import recent_origins
+from app.utils.utils_metrics import close_http_client
+from app.utils.utils_chains import load_graph
+from app.utils.utils_sessions import call_sessions
+from app.warmup import readiness, warm_up
+import asyncio
+
 logger = logging.getLogger(__name__)
-logging.getLogger("app.routers.carriers").setLevel(logging.INFO)
-logging.getLogger("app.routers.loads").setLevel(logging.INFO)
-logging.getLogger("app.utils").setLevel(logging.DEBUG)
-logging.getLogger("app.auth").setLevel(logging.INFO)
+
+# Background tasks started on startup and cancelled on shutdown
+background_tasks: list[asyncio.Task] = []
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry.cleanup_stale_generations()
+    background_tasks.append(asyncio.create_task(registry.run_flush_loop()))
+    background_tasks.append(asyncio.create_task(metric_sketches.run_flush_loop()))
+    background_tasks.append(asyncio.create_task(recent_origins.run_flush_loop()))
+    background_tasks.append(asyncio.create_task(load_graph.run_refresh_loop()))
+    if loop_monitor.interval > 0:
+        background_tasks.append(asyncio.create_task(loop_monitor.run()))
+    # Warm-up runs in the background so /health answers while /ready still fails
+    background_tasks.append(asyncio.create_task(warm_up()))
+    logger.info("=" * 50)
+    logger.info("Starting Carrier Sales API v1.0.0")
+    logger.info("Debug mode: %s", settings.debug)
+    logger.info("API Key configured: %s", 'Yes' if settings.api_key else 'No')
+    logger.info("Logging configured - level: %s, format: %s, sample rates: %s", settings.log_level, settings.log_format, settings.log_sample_rates or "none")
+    logger.info("App imported in %.3fs", readiness.import_seconds)
+    logger.info("=" * 50)
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    # The sketch and origin flush loops persist this worker's pending values when cancelled
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    # Cancels prefetches of calls still in progress
+    call_sessions.close()
+    await supabase.close()
+    await close_http_client()
+    logger.info("Carrier Sales API shutdown complete")
 
 app = FastAPI(
     title="Carrier Sales API", 
     version="1.0.0",
-    description="API for carrier validation and load matching with API key authentication"
+    description="API for carrier validation and load matching with API key authentication",
+    lifespan=lifespan,
 )
 
 # Root health check endpoint
@@ -43,6 +92,12 @@ async def health_check():
         "uptime": "running"
     }
 
+# Readiness check: fails with 503 until warm-up finished
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint for load balancers; reports import, warm-up and time-to-ready durations"""
+    return JSONResponse(readiness.state(), status_code=200 if readiness.ready else 503)
+
 @app.get("/", include_in_schema=False)
 async def root():
     return {"status": "ok", "message": "Carrier Sales API is running"}
@@ -51,16 +106,29 @@ async def root():
 app.include_router(carriers.router)
 app.include_router(loads.router)
 app.include_router(metrics.router)
+app.include_router(internal.router)
 
-# Log configuration on startup
-@app.on_event("startup")
-async def startup_event():
-    logger.info("=" * 50)
-    logger.info("Starting Carrier Sales API v1.0.0")
-    logger.info(f"Debug mode: {settings.debug}")
-    logger.info(f"API Key configured: {'Yes' if settings.api_key else 'No'}")
-    logger.info("Logging configured - INFO level for routers, DEBUG level for utils")
-    logger.info("=" * 50)
+# Strong ETags and 304s for load and metrics reads
+app.add_middleware(ConditionalGetMiddleware)
+
+# Brotli/gzip compression of larger responses; outside the ETag middleware so encoded bodies get their own ETags
+app.add_middleware(CompressionMiddleware)
+
+# Shed requests beyond the in-flight cap before they reach routing or auth
+app.add_middleware(AdmissionMiddleware)
+
+# Per-route request counts, status codes and latency histograms
+app.add_middleware(InstrumentationMiddleware)
+
+# Opt-in per-request profiling; not installed at all unless configured
+if settings.profile_token or settings.profile_sample_rate > 0:
+    app.add_middleware(ProfilingMiddleware)
+
+# Import finished; warm-up starts with the lifespan
+readiness.process_started = _import_started
+readiness.import_seconds = time.perf_counter() - _import_started
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,5 +1,27 @@
 from fastapi import FastAPI, Depends
 from app.auth import verify_api_key
+from app.config import settings
+from typing import List, Optional
+import hashlib
+import logging
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# GET responses under these prefixes get a strong ETag and honour If-None-Match
+ETAG_PATH_PREFIXES = ("/loads/", "/metrics/")
+
+# Content types worth compressing (exports in arrow/parquet are already compact binary)
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Suffixes the compression middleware adds to ETags of encoded responses
+ENCODING_ETAG_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
 
 def create_app() -> FastAPI:
     """Create FastAPI application with global API key validation"""
@@ -34,3 +56,207 @@ def apply_auth_to_router(router, exclude_paths: list = None):
             route.dependencies.append(Depends(verify_api_key))
     
     return router
+
+
+def _header(headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _without_headers(headers, *names: bytes) -> list:
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in [candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates]
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware adding strong ETags to GET reads and answering If-None-Match with 304
+
+    The ETag is a hash of the complete response body, so it changes exactly
+    when the serialized result set does. Only single-message 200 responses are
+    tagged; streamed responses (exports) pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(ETAG_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = _header(scope["headers"], b"if-none-match")
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # Streaming response: give up on tagging it
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            headers = _without_headers(start_message["headers"], b"etag") + [(b"etag", etag.encode())]
+            if if_none_match and _etag_matches(if_none_match, etag):
+                headers = _without_headers(headers, b"content-length", b"content-type")
+                await send({"type": "http.response.start", "status": 304, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({**start_message, "headers": headers})
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q-values; None means identity"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(available, key=lambda coding: weights.get(coding, weights.get("*", 0.0)))
+    return best if weights.get(best, weights.get("*", 0.0)) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.brotli_quality)
+            self._compress = self._compressor.process
+            self._finish = self._compressor.finish
+        else:
+            # wbits 16 + MAX_WBITS writes a gzip header and trailer
+            self._compressor = zlib.compressobj(settings.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = self._compressor.compress
+            self._finish = self._compressor.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with brotli or gzip as negotiated by Accept-Encoding
+
+    Bodies below COMPRESSION_MIN_SIZE bytes, non-text content types and
+    responses that already carry a Content-Encoding are sent as is. Streamed
+    responses are compressed chunk by chunk. A strong ETag set further in is
+    suffixed with the encoding (an encoded body is a different representation),
+    and the suffix is stripped from If-None-Match on the way in so conditional
+    requests keep matching.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(_header(scope["headers"], b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Rewritten in place: the router stores the matched endpoint in this scope, and the
+        # instrumentation middleware further out reads it from there for the route label
+        scope["headers"] = self._strip_etag_suffixes(scope["headers"])
+        start_message = None
+        compressor: Optional[_Compressor] = None
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                start, start_message = start_message, None
+                if not self._compressible(start, body, more_body):
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                await send({**start, "headers": self._encoded_headers(start["headers"], encoding)})
+            if compressor is None:
+                await send(message)
+                return
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _compressible(start, body: bytes, more_body: bool) -> bool:
+        headers = start["headers"]
+        content_type = _header(headers, b"content-type") or ""
+        if start["status"] < 200 or start["status"] in (204, 304) or _header(headers, b"content-encoding"):
+            return False
+        if not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return False
+        return more_body or len(body) >= settings.compression_min_size
+
+    @staticmethod
+    def _encoded_headers(headers, encoding: str) -> list:
+        etag = _header(headers, b"etag")
+        vary = _header(headers, b"vary")
+        headers = _without_headers(headers, b"content-length", b"etag", b"vary")
+        headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"vary", f"{vary}, Accept-Encoding".encode() if vary else b"Accept-Encoding"))
+        if etag and etag.endswith('"') and not etag.startswith("W/"):
+            headers.append((b"etag", (etag[:-1] + ENCODING_ETAG_SUFFIXES[encoding] + '"').encode()))
+        elif etag:
+            headers.append((b"etag", etag.encode()))
+        return headers
+
+    @staticmethod
+    def _strip_etag_suffixes(headers) -> List[tuple]:
+        result = []
+        for key, value in headers:
+            if key.lower() == b"if-none-match":
+                text = value.decode("latin-1")
+                for suffix in ENCODING_ETAG_SUFFIXES.values():
+                    text = text.replace(suffix + '"', '"')
+                value = text.encode("latin-1")
+            result.append((key, value))
+        return result
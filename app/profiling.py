@@ -0,0 +1,295 @@
+import asyncio
+import hmac
+import logging
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.instrumentation import request_spans
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# (filename, first line, function name), the key pstats uses for a function
+FunctionKey = Tuple[str, int, str]
+
+
+class RequestProfile:
+    """Stack samples and spans of one profiled request"""
+
+    def __init__(self, method: str, path: str, reason: str, interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.interval = interval
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status: Optional[int] = None
+        # Stack (root first) -> [samples, seconds]; each sample weighs the time since the sampler's previous wake-up
+        self.samples: Dict[Tuple[FunctionKey, ...], List[float]] = {}
+        self.spans: List[Tuple[str, float, float]] = []
+        # The request's task and every task started while handling it
+        self.tasks: set = set()
+        # Outermost coroutine frames of those tasks, read by the sampler thread under the profiler's lock
+        self.frames: set = set()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "samples": sum(int(count) for count, _ in self.samples.values()),
+            "sample_interval_ms": self.interval * 1000,
+        }
+
+    def span_breakdown(self) -> List[Dict[str, Any]]:
+        return [
+            {"span": name, "start_ms": round((start - self.start) * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+            for name, start, duration in sorted(self.spans, key=lambda span: span[1])
+        ]
+
+    def add_sample(self, stack: Tuple[FunctionKey, ...], seconds: float):
+        entry = self.samples.get(stack)
+        if entry is None:
+            self.samples[stack] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def collapsed(self) -> str:
+        """Samples as collapsed stacks ("root;...;leaf microseconds"), the input of flamegraph.pl and speedscope"""
+        stacks = sorted(self.samples.items(), key=lambda item: item[1][1], reverse=True)
+        lines = [";".join(_frame_label(key) for key in stack) + f" {round(seconds * 1e6)}" for stack, (_, seconds) in stacks]
+        return "\n".join(lines) + "\n"
+
+    def pstats(self) -> bytes:
+        """Samples in the marshalled format of pstats.Stats.dump_stats
+
+        Times are sampled on-CPU time on the event loop; call counts are the
+        number of samples a function appeared in.
+        """
+        stats: Dict[FunctionKey, list] = {}
+        for stack, (count, seconds) in self.samples.items():
+            seen = set()
+            for depth, key in enumerate(stack):
+                entry = stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                leaf = depth == len(stack) - 1
+                if leaf:
+                    entry[2] += seconds
+                # Recursive functions count once per sample
+                if key not in seen:
+                    seen.add(key)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth:
+                    edge = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    edge[0] += count
+                    edge[1] += count
+                    edge[2] += seconds if leaf else 0.0
+                    edge[3] += seconds
+        return marshal.dumps({
+            key: (cc, nc, tt, ct, {caller: tuple(edge) for caller, edge in callers.items()})
+            for key, (cc, nc, tt, ct, callers) in stats.items()
+        })
+
+    def top_functions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        own: Counter = Counter()
+        for stack, (_, seconds) in self.samples.items():
+            own[stack[-1]] += seconds
+        return [{"function": _frame_label(key), "self_ms": round(seconds * 1000, 3)} for key, seconds in own.most_common(limit)]
+
+
+# Profile of the request being handled in this context
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def _frame_label(key: FunctionKey) -> str:
+    filename, line, name = key
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class _Sampler(threading.Thread):
+    """Samples the event loop thread's stack while a profiled request's task runs on it
+
+    Only on-CPU time of the profiled requests is recorded: while their tasks
+    wait for the database or Nominatim the loop runs other work and nothing
+    is sampled. Wait time shows up in the span breakdown instead.
+
+    The running task is recognised by its outermost coroutine frame in the
+    sampled stack, so the sampler never touches the loop's own state from
+    its thread. `profiles` and the profiles' frames and samples are only
+    read or changed under `lock`.
+    """
+
+    def __init__(self, loop_thread_id: int, interval: float, lock: threading.Lock):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.lock = lock
+        self.profiles: List[RequestProfile] = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        last_wake = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            # A busy loop holds the GIL past the interval; weigh the sample by the real time since the last one
+            now = time.perf_counter()
+            elapsed, last_wake = now - last_wake, now
+            frame = sys._current_frames().get(self.loop_thread_id)
+            frames, stack = [], []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(frame)
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+            with self.lock:
+                for profile in self.profiles:
+                    if not profile.frames.isdisjoint(frames):
+                        profile.add_sample(stack, elapsed)
+
+
+class Profiler:
+    """Runs the sampler while at least one request is profiled and keeps the last profiles
+
+    Tasks started while handling a profiled request (coalesced searches,
+    prefetches, task groups) are attributed to it through a task factory
+    that is installed only while a profile is running.
+    """
+
+    def __init__(self, interval: float, buffer_size: int):
+        self.interval = interval
+        self.profiles: deque = deque(maxlen=buffer_size)
+        self._active: List[RequestProfile] = []
+        self._sampler: Optional[_Sampler] = None
+        self._previous_task_factory = None
+        # Guards what the sampler thread reads: the active profiles and their task frames and samples
+        self._lock = threading.Lock()
+
+    def _track(self, profile: RequestProfile, task: asyncio.Task):
+        frame = getattr(task.get_coro(), "cr_frame", None)
+        profile.tasks.add(task)
+        if frame is not None:
+            with self._lock:
+                profile.frames.add(frame)
+        task.add_done_callback(lambda task: self._untrack(profile, task, frame))
+
+    def _untrack(self, profile: RequestProfile, task: asyncio.Task, frame):
+        profile.tasks.discard(task)
+        with self._lock:
+            profile.frames.discard(frame)
+
+    def _task_factory(self, loop, coro, context=None):
+        if self._previous_task_factory is None:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        elif context is None:
+            task = self._previous_task_factory(loop, coro)
+        else:
+            task = self._previous_task_factory(loop, coro, context=context)
+        # Runs in the creating task's context, which tells which request started the task
+        profile = _current_profile.get() if context is None else context.get(_current_profile)
+        if profile is not None:
+            self._track(profile, task)
+        return task
+
+    def start(self, method: str, path: str, reason: str) -> RequestProfile:
+        profile = RequestProfile(method, path, reason, self.interval)
+        self._track(profile, asyncio.current_task())
+        if not self._active:
+            loop = asyncio.get_running_loop()
+            self._previous_task_factory = loop.get_task_factory()
+            loop.set_task_factory(self._task_factory)
+            self._sampler = _Sampler(threading.get_ident(), self.interval, self._lock)
+            self._sampler.start()
+        self._active.append(profile)
+        with self._lock:
+            self._sampler.profiles = list(self._active)
+        return profile
+
+    def finish(self, profile: RequestProfile, status: int):
+        profile.duration = time.perf_counter() - profile.start
+        profile.status = status
+        self._active.remove(profile)
+        with self._lock:
+            self._sampler.profiles = list(self._active)
+            profile.frames.clear()
+        profile.tasks.clear()
+        if not self._active:
+            self._sampler.stopped.set()
+            self._sampler = None
+            asyncio.get_running_loop().set_task_factory(self._previous_task_factory)
+            self._previous_task_factory = None
+        self.profiles.append(profile)
+        logger.info("Profiled %s %s in %.3fs - %s samples, id %s", profile.method, profile.path, profile.duration, profile.summary()["samples"], profile.id)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that send the x-profile token or are sampled
+
+    Only installed when PROFILE_TOKEN or PROFILE_SAMPLE_RATE is set, so
+    requests pay nothing otherwise. The profile id is returned in the
+    x-profile-id response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.token = settings.profile_token.encode()
+        self.sample_rate = settings.profile_sample_rate
+
+    def _reason(self, scope) -> Optional[str]:
+        if scope["type"] != "http" or scope["path"].startswith("/internal/"):
+            return None
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile" and hmac.compare_digest(value, self.token):
+                    return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        reason = self._reason(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(scope.get("method", ""), scope["path"], reason)
+        profile_token = _current_profile.set(profile)
+        spans_token = request_spans.set(profile.spans)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_spans.reset(spans_token)
+            _current_profile.reset(profile_token)
+            profiler.finish(profile, status_code)
+
+
+# Global profiler used by ProfilingMiddleware and /internal/profiles
+profiler = Profiler(settings.profile_interval_ms / 1000, settings.profile_buffer_size)
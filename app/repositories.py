@@ -0,0 +1,243 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+from app.supabase import DatabaseClient, supabase
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# (min_lat, max_lat, min_lng, max_lng)
+BoundingBox = Tuple[float, float, float, float]
+
+
+@dataclass
+class LoadSearch:
+    """Filters for one load search attempt"""
+    equipment_type: str
+    origin_box: BoundingBox
+    destination_box: Optional[BoundingBox] = None
+    # [start, end] range of pickup times, from pickup_window_bounds
+    pickup_window: Optional[Tuple[datetime, datetime]] = None
+    # Requested pickup (naive UTC) inside pickup_window; the `limit` loads picked up closest to it are returned
+    pickup_target: Optional[datetime] = None
+    min_pickup_date: Optional[date] = None
+    limit: int = 3
+
+
+def pickup_distance(load: Dict[str, Any], target: datetime) -> float:
+    """Seconds between a load's pickup and a naive UTC target; inf when the load has no valid pickup time"""
+    try:
+        pickup = datetime.fromisoformat(str(load.get("pickup_datetime")))
+    except ValueError:
+        return float("inf")
+    if pickup.tzinfo is not None:
+        pickup = pickup.astimezone(timezone.utc).replace(tzinfo=None)
+    return abs((pickup - target).total_seconds())
+
+
+class CarrierRepository(ABC):
+    """Data access for the carriers table"""
+
+    @abstractmethod
+    async def exists(self, mc_number: str) -> bool:
+        """Return True if a carrier with this MC number exists"""
+
+    @abstractmethod
+    async def page(self, after_mc_number: Optional[str], limit: int, mc_prefix: Optional[str] = None, columns: str = "*") -> List[Dict[str, Any]]:
+        """Return up to `limit` carriers with mc_number greater than `after_mc_number` and starting with `mc_prefix`, ordered by mc_number"""
+
+
+class LoadRepository(ABC):
+    """Data access for the loads table"""
+
+    @abstractmethod
+    async def search(self, search: LoadSearch) -> List[Dict[str, Any]]:
+        """Return loads that are not booked and match every filter of the search
+
+        With a pickup window the loads are picked up in order: by distance
+        from pickup_target when it is set, else earliest first.
+        """
+
+    @abstractmethod
+    async def get(self, load_id: str) -> Optional[Dict[str, Any]]:
+        """Return the load with this load_id, or None"""
+
+    @abstractmethod
+    async def book(self, load_id: str, booking: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Write the booking columns of a load that is not booked yet (compare-and-set on booking_id)
+
+        Returns the updated load, or None when the load is missing or was
+        already booked; of concurrent bookings of one load exactly one wins.
+        """
+
+    @abstractmethod
+    async def insert_many(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert a batch of loads in one request"""
+
+    @abstractmethod
+    async def list_open(self, after_load_id: Optional[str], limit: int, min_pickup_date: date) -> List[Dict[str, Any]]:
+        """Return up to `limit` loads not booked yet, picked up on or after `min_pickup_date`, with load_id greater than `after_load_id`, ordered by load_id"""
+
+
+class MetricsRepository(ABC):
+    """Data access for the metrics table"""
+
+    @abstractmethod
+    async def insert(self, row: Dict[str, Any]) -> None:
+        """Insert a metrics row"""
+
+    @abstractmethod
+    async def list_running(self) -> List[Dict[str, Any]]:
+        """Return id, organization_id and run_id of rows whose call is still running"""
+
+    @abstractmethod
+    async def update(self, row_id: Any, data: Dict[str, Any]) -> None:
+        """Update a metrics row by id"""
+
+    @abstractmethod
+    async def page(self, after_id: Optional[int], limit: int, organization_id: Optional[str] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Return up to `limit` rows with id greater than `after_id`, ordered by id"""
+
+
+def _digits_prefix_end(prefix: str) -> Optional[str]:
+    """Smallest digit string above every string starting with `prefix` ("129" -> "13"), None for all nines"""
+    prefix = prefix.rstrip("9")
+    if not prefix:
+        return None
+    return prefix[:-1] + str(int(prefix[-1]) + 1)
+
+
+class SupabaseCarrierRepository(CarrierRepository):
+    def __init__(self, client: DatabaseClient):
+        self.client = client
+
+    async def exists(self, mc_number: str) -> bool:
+        query = self.client.table("carriers").select("mc_number").eq("mc_number", mc_number).limit(1)
+        result = await self.client.execute(query, "carriers.exists")
+        return bool(result.data)
+
+    async def page(self, after_mc_number: Optional[str], limit: int, mc_prefix: Optional[str] = None, columns: str = "*") -> List[Dict[str, Any]]:
+        query = self.client.table("carriers").select(columns)
+        if mc_prefix:
+            # A digit range instead of LIKE, so the mc_number index is used under any collation
+            query = query.gte("mc_number", mc_prefix)
+            prefix_end = _digits_prefix_end(mc_prefix)
+            if prefix_end is not None:
+                query = query.lt("mc_number", prefix_end)
+        if after_mc_number is not None:
+            query = query.gt("mc_number", after_mc_number)
+        result = await self.client.execute(query.order("mc_number").limit(limit), "carriers.page")
+        return result.data if result.data else []
+
+
+class SupabaseLoadRepository(LoadRepository):
+    def __init__(self, client: DatabaseClient):
+        self.client = client
+
+    def _search_query(self, search: LoadSearch):
+        """Query of a search without its pickup window, ordering and limit"""
+        origin_min_lat, origin_max_lat, origin_min_lng, origin_max_lng = search.origin_box
+        query = (
+            self.client.table("loads")
+            .select("*")
+            .eq("equipment_type", search.equipment_type)
+            .gte("origin_lat", origin_min_lat)
+            .lte("origin_lat", origin_max_lat)
+            .gte("origin_lng", origin_min_lng)
+            .lte("origin_lng", origin_max_lng)
+            .is_("booking_id", "null")
+        )
+        if search.destination_box is not None:
+            destination_min_lat, destination_max_lat, destination_min_lng, destination_max_lng = search.destination_box
+            query = (
+                query
+                .gte("destination_lat", destination_min_lat)
+                .lte("destination_lat", destination_max_lat)
+                .gte("destination_lng", destination_min_lng)
+                .lte("destination_lng", destination_max_lng)
+            )
+        if search.min_pickup_date is not None:
+            query = query.gte("pickup_datetime", search.min_pickup_date)
+        return query
+
+    async def search(self, search: LoadSearch) -> List[Dict[str, Any]]:
+        if search.pickup_window is None:
+            result = await self.client.execute(self._search_query(search).limit(search.limit), "loads.search")
+            return result.data if result.data else []
+
+        pickup_start, pickup_end = search.pickup_window
+        if search.pickup_target is None:
+            query = self._search_query(search).gte("pickup_datetime", pickup_start).lte("pickup_datetime", pickup_end)
+            result = await self.client.execute(query.order("pickup_datetime").limit(search.limit), "loads.search")
+            return result.data if result.data else []
+
+        # The closest pickups are the latest ones before the target and the earliest ones after it, each an index range scan
+        earlier = self._search_query(search).gte("pickup_datetime", pickup_start).lte("pickup_datetime", search.pickup_target)
+        later = self._search_query(search).gt("pickup_datetime", search.pickup_target).lte("pickup_datetime", pickup_end)
+        results = await asyncio.gather(
+            self.client.execute(earlier.order("pickup_datetime", desc=True).limit(search.limit), "loads.search"),
+            self.client.execute(later.order("pickup_datetime").limit(search.limit), "loads.search"),
+        )
+        loads = [load for result in results for load in (result.data or [])]
+        loads.sort(key=lambda load: pickup_distance(load, search.pickup_target))
+        return loads[:search.limit]
+
+    async def get(self, load_id: str) -> Optional[Dict[str, Any]]:
+        query = self.client.table("loads").select("*").eq("load_id", load_id).limit(1)
+        result = await self.client.execute(query, "loads.get")
+        return result.data[0] if result.data else None
+
+    async def book(self, load_id: str, booking: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # A single conditional UPDATE: the row lock makes a concurrent booking re-check booking_id and match nothing
+        query = self.client.table("loads").update(booking).eq("load_id", load_id).is_("booking_id", "null")
+        result = await self.client.execute(query, "loads.book")
+        return result.data[0] if result.data else None
+
+    async def insert_many(self, rows: List[Dict[str, Any]]) -> None:
+        await self.client.execute(self.client.table("loads").insert(rows), "loads.insert_many")
+
+    async def list_open(self, after_load_id: Optional[str], limit: int, min_pickup_date: date) -> List[Dict[str, Any]]:
+        query = self.client.table("loads").select("*").gte("pickup_datetime", min_pickup_date).is_("booking_id", "null")
+        if after_load_id is not None:
+            query = query.gt("load_id", after_load_id)
+        result = await self.client.execute(query.order("load_id").limit(limit), "loads.list_open")
+        return result.data if result.data else []
+
+
+class SupabaseMetricsRepository(MetricsRepository):
+    def __init__(self, client: DatabaseClient):
+        self.client = client
+
+    async def insert(self, row: Dict[str, Any]) -> None:
+        await self.client.execute(self.client.table("metrics").insert(row), "metrics.insert")
+
+    async def list_running(self) -> List[Dict[str, Any]]:
+        query = self.client.table("metrics").select("id, organization_id, run_id").eq("call_status", "running")
+        result = await self.client.execute(query, "metrics.list_running")
+        return result.data if result.data else []
+
+    async def update(self, row_id: Any, data: Dict[str, Any]) -> None:
+        await self.client.execute(self.client.table("metrics").update(data).eq("id", row_id), "metrics.update")
+
+    async def page(self, after_id: Optional[int], limit: int, organization_id: Optional[str] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        query = self.client.table("metrics").select("*")
+        if organization_id:
+            query = query.eq("organization_id", organization_id)
+        if start_date:
+            query = query.gte("created_at", start_date.isoformat())
+        if end_date:
+            query = query.lt("created_at", end_date.isoformat())
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        result = await self.client.execute(query.order("id").limit(limit), "metrics.page")
+        return result.data if result.data else []
+
+
+# Global repositories backed by the configured database client
+carrier_repository: CarrierRepository = SupabaseCarrierRepository(supabase)
+load_repository: LoadRepository = SupabaseLoadRepository(supabase)
+metrics_repository: MetricsRepository = SupabaseMetricsRepository(supabase)
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from app.schemas.schemas import CarrierResponse
-from app.utils.utils_carriers import validate_mc_format, extract_mc_digits, check_carrier_exists
+from fastapi import APIRouter, Depends, Header, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from app.schemas.schemas import CarrierResponse, CarriersPageResponse
+from app.utils.utils_carriers import validate_mc_format, extract_mc_digits, check_carrier_exists, parse_carrier_fields, iter_carrier_pages, get_carrier_page
+from app.utils.utils_export import stream_ndjson
 from app.auth import verify_api_key
+from app.utils.utils_sessions import call_sessions
+from typing import Optional
 import logging
 import time
 
@@ -13,6 +17,7 @@ router = APIRouter(prefix="/carriers", tags=["carriers"])
 @router.get("/validate_carrier", response_model=CarrierResponse)
 async def validate_carrier(
     mc_number: str = Query(..., description="MC number to validate (format: MC XXXXXX)"),
+    x_call_id: Optional[str] = Header(None, alias="x-call-id", description="Id shared by the requests of one call, e.g. the HappyRobot run id (optional)"),
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -20,28 +25,29 @@ async def validate_carrier(
     
     Args:
         mc_number: Número MC a validar (formato completo: MC XXXXXX)
+        x_call_id: Id de la llamada; el resultado se recuerda durante la llamada
         api_key: API key válida para autenticación (validated via dependency)
     
     Returns:
         CarrierResponse: Respuesta con el resultado de la validación
     """
     start_time = time.time()
-    logger.info(f"Starting MC validation for: {mc_number}")
+    logger.info("Starting MC validation for: %s", mc_number)
     
     try:
         # API key is automatically validated by the dependency
         logger.debug("API key validation passed")
         
         # Validar formato del MC number
-        logger.debug(f"Calling validate_mc_format for: {mc_number}")
+        logger.debug("Calling validate_mc_format for: %s", mc_number)
         format_valid = validate_mc_format(mc_number)
-        logger.debug(f"MC format validation result: {format_valid}")
+        logger.debug("MC format validation result: %s", format_valid)
         
         if not format_valid:
             message = f"MC number {mc_number} is invalid. Expected format: MC XXXXXX"
-            logger.warning(f"MC validation failed: {mc_number} - Invalid format")
+            logger.warning("MC validation failed: %s - Invalid format", mc_number)
             processing_time = time.time() - start_time
-            logger.info(f"MC validation completed in {processing_time:.3f}s for: {mc_number}")
+            logger.info("MC validation completed in %.3fs for: %s", processing_time, mc_number)
             
             return CarrierResponse(
                 statusCode=200,
@@ -50,15 +56,15 @@ async def validate_carrier(
             )
         
         # Extraer los dígitos del MC number
-        logger.debug(f"Extracting MC digits from: {mc_number}")
+        logger.debug("Extracting MC digits from: %s", mc_number)
         mc_digits = extract_mc_digits(mc_number)
-        logger.debug(f"Extracted MC digits: {mc_digits}")
+        logger.debug("Extracted MC digits: %s", mc_digits)
         
         if not mc_digits:
             message = f"Could not extract MC digits from: {mc_number}"
-            logger.error(f"MC digit extraction failed: {mc_number}")
+            logger.error("MC digit extraction failed: %s", mc_number)
             processing_time = time.time() - start_time
-            logger.info(f"MC validation completed in {processing_time:.3f}s for: {mc_number}")
+            logger.info("MC validation completed in %.3fs for: %s", processing_time, mc_number)
             
             return CarrierResponse(
                 statusCode=200,
@@ -67,19 +73,19 @@ async def validate_carrier(
             )
         
         # Verificar si el carrier existe en la base de datos
-        logger.debug(f"Checking if carrier exists with MC digits: {mc_digits}")
-        carrier_exists = check_carrier_exists(mc_digits)
-        logger.debug(f"Carrier exists check result: {carrier_exists}")
+        logger.debug("Checking if carrier exists with MC digits: %s", mc_digits)
+        carrier_exists = await check_carrier_exists(mc_digits, call_sessions.get(x_call_id))
+        logger.debug("Carrier exists check result: %s", carrier_exists)
         
         if carrier_exists:
             message = f"MC number {mc_number} is valid and carrier exists in database"
-            logger.info(f"MC validation successful: {mc_number} - Carrier found in database")
+            logger.info("MC validation successful: %s - Carrier found in database", mc_number)
         else:
             message = f"MC number {mc_number} has valid format but carrier not found in database"
-            logger.warning(f"MC validation failed: {mc_number} - Carrier not found in database")
+            logger.warning("MC validation failed: %s - Carrier not found in database", mc_number)
         
         processing_time = time.time() - start_time
-        logger.info(f"MC validation completed in {processing_time:.3f}s for: {mc_number}")
+        logger.info("MC validation completed in %.3fs for: %s", processing_time, mc_number)
         
         return CarrierResponse(
             statusCode=200,
@@ -89,8 +95,8 @@ async def validate_carrier(
         
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"Error during MC validation for {mc_number}: {str(e)}")
-        logger.error(f"Processing time: {processing_time:.3f}s")
+        logger.error("Error during MC validation for %s: %s", mc_number, str(e))
+        logger.error("Processing time: %.3fs", processing_time)
         raise HTTPException(status_code=500, detail="Internal server error during MC validation")
 
 @router.get("/health")
@@ -100,24 +106,49 @@ async def health_check():
     logger.debug("Returning carriers health status")
     return {"status": "healthy", "service": "Carrier Sales API"}
 
-@router.get("/carriers")
-async def get_carriers(api_key: str = Depends(verify_api_key)):
-    """Get carriers endpoint with API key validation"""
+@router.get("/carriers", response_model=CarriersPageResponse)
+async def get_carriers(
+    mc_prefix: Optional[str] = Query(None, description="Only carriers whose MC number starts with these digits (optional)"),
+    after: Optional[str] = Query(None, description="Return carriers after this MC number: next_after of the previous page (optional)"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return; mc_number is always included (default: all)"),
+    limit: int = Query(100, ge=1, le=1000, description="Carriers per page for format=json"),
+    format: str = Query("json", description="json (one page) or ndjson (every matching carrier, streamed)"),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    List carriers ordered by MC number, optionally searching by a prefix of its digits
+
+    Pagination is keyset on mc_number: pass `next_after` of a page as `after`
+    to get the next one, so a deep page costs the same as the first. With
+    format=ndjson every matching carrier after `after` is streamed one page
+    of EXPORT_PAGE_SIZE rows at a time, so memory per request stays flat.
+    """
     start_time = time.time()
-    logger.info("Get carriers endpoint called")
+    logger.info("Get carriers - prefix: %s, after: %s, fields: %s, limit: %s, format: %s", mc_prefix, after, fields, limit, format)
 
-    
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="Invalid format. Expected json or ndjson")
+    prefix_digits = extract_mc_digits(mc_prefix) if mc_prefix else None
+    if mc_prefix and not prefix_digits:
+        raise HTTPException(status_code=400, detail="mc_prefix must contain digits")
     try:
-        logger.debug("API key validation passed")
-        logger.debug("Returning carriers list")
-        
+        columns = parse_carrier_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        pages = iter_carrier_pages(prefix_digits, after, columns)
+        return StreamingResponse(stream_ndjson(pages), media_type="application/x-ndjson", headers={"X-Export-Order": "mc_number", "X-Export-Resume-Param": "after"})
+
+    try:
+        carriers, next_after = await get_carrier_page(prefix_digits, after, columns, limit)
+
         processing_time = time.time() - start_time
-        logger.info(f"Get carriers completed in {processing_time:.3f}s")
-        
-        return {"message": "Hello, World!"}
-        
+        logger.info("Get carriers completed in %.3fs - %s carriers", processing_time, len(carriers))
+        return CarriersPageResponse(statusCode=200, carriers=carriers, next_after=next_after)
+
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"Error in get_carriers endpoint: {str(e)}")
-        logger.error(f"Processing time: {processing_time:.3f}s")
+        logger.error("Error in get_carriers endpoint: %s", str(e))
+        logger.error("Processing time: %.3fs", processing_time)
         raise HTTPException(status_code=500, detail="Internal server error")
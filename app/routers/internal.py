@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from app.config import settings
+from app.instrumentation import registry
+from app.auth import admission, verify_api_key
+from app.utils.utils_resilience import dependencies
+from app.profiling import profiler
+from app.loop_monitor import loop_monitor
+from typing import Optional
+import asyncio
+import hmac
+import logging
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+async def verify_internal_token(authorization: Optional[str] = Header(None), x_api_key: Optional[str] = Header(None, alias="x-api-key")):
+    """Require `Authorization: Bearer <INTERNAL_METRICS_TOKEN>`, or a valid API key when no token is configured
+
+    Without a token the internal endpoints are treated like any other API
+    endpoint: the key is checked and charged against its rate limit.
+    """
+    if not settings.internal_metrics_token:
+        await verify_api_key(x_api_key)
+        return
+    expected = f"Bearer {settings.internal_metrics_token}"
+    if not authorization or not hmac.compare_digest(authorization, expected):
+        logger.warning("Internal endpoint access denied - missing or invalid bearer token")
+        raise HTTPException(status_code=401, detail="Invalid internal token")
+
+async def verify_profile_token(x_profile: Optional[str] = Header(None, alias="x-profile")):
+    """Require the x-profile header to equal PROFILE_TOKEN; profiles cannot be read without one configured
+
+    Profiles hold the stacks and timings of real requests, so they need
+    more than the internal endpoints' API key.
+    """
+    if not settings.profile_token:
+        raise HTTPException(status_code=403, detail="Profiles can only be read when PROFILE_TOKEN is set")
+    if not x_profile or not hmac.compare_digest(x_profile, settings.profile_token):
+        logger.warning("Profile access denied - missing or invalid x-profile token")
+        raise HTTPException(status_code=401, detail="Invalid profile token")
+
+router = APIRouter(prefix="/internal", tags=["internal"], include_in_schema=False, dependencies=[Depends(verify_internal_token)])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def internal_metrics():
+    """Prometheus text exposition of request, span and query metrics for all workers"""
+    # Reads and merges the files of every worker; kept off the event loop
+    text = await asyncio.to_thread(registry.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/limiter")
+async def limiter_state():
+    """In-flight requests and per-key token bucket state of this worker"""
+    return admission.state()
+
+@router.get("/dependencies")
+async def dependency_state():
+    """Circuit breaker, bulkhead and hedging state of each outbound dependency in this worker"""
+    return {name: dependency.snapshot() for name, dependency in dependencies.items()}
+
+@router.get("/loop")
+async def loop_health():
+    """Event loop stalls of this worker and the call sites that blocked the loop the longest"""
+    return loop_monitor.report()
+
+@router.get("/profiles", dependencies=[Depends(verify_profile_token)])
+async def list_profiles():
+    """Summaries of the last PROFILE_BUFFER_SIZE profiled requests of this worker, newest first"""
+    return [profile.summary() for profile in reversed(profiler.profiles)]
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(verify_profile_token)])
+async def get_profile(profile_id: str, format: str = Query("json", description="json, collapsed or pstats")):
+    """One profile: json (spans and hottest functions), collapsed stacks or a pstats file"""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found in this worker")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    if format == "pstats":
+        return Response(profile.pstats(), media_type="application/octet-stream", headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'})
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Invalid format. Expected one of: json, collapsed, pstats")
+    return {**profile.summary(), "spans": profile.span_breakdown(), "top_functions": profile.top_functions()}
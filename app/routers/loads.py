@@ -1,8 +1,17 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from app.schemas.schemas import LoadsResponse, LoadResponse
-from app.utils.utils_loads import find_loads_within_radius, process_parameters
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request
+from app.schemas.schemas import LoadsResponse, LoadResponse, LoadImportResponse, LoadChainsResponse, NegotiateRequest, NegotiateResponse, ConfirmRequest, ConfirmResponse
+from app.utils.utils_loads import find_loads_within_radius_coalesced, process_parameters, get_coordinates, parse_pickup_window
+from app.utils.utils_chains import load_graph
+from app.utils.utils_snapshot import epoch
 from app.auth import verify_api_key
+from app.config import settings
+from app.utils.utils_deadline import Deadline
+from app.utils.utils_sessions import call_sessions
+from app.utils.utils_ingest import IMPORT_FORMATS, import_loads
+from app.utils.utils_reservations import negotiate_load, confirm_load
+from app.utils.utils_carriers import extract_mc_digits
 from typing import Optional
+import asyncio
 import logging
 import time
 
@@ -17,6 +26,9 @@ async def find_matching_loads(
     origin: str = Query(..., description="Starting location (required)"),
     destination: Optional[str] = Query(None, description="Delivery location (optional)"),
     pickup_datetime: Optional[str] = Query(None, description="Date and time for pickup (optional)"),
+    pickup_window: Optional[str] = Query(None, description="Pickup times matched around pickup_datetime: same_day, exact or hours either side (default PICKUP_WINDOW)"),
+    x_deadline_ms: Optional[float] = Header(None, alias="x-deadline-ms", description="Time budget for the search in milliseconds (optional)"),
+    x_call_id: Optional[str] = Header(None, alias="x-call-id", description="Id shared by the requests of one call, e.g. the HappyRobot run id (optional)"),
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -27,14 +39,24 @@ async def find_matching_loads(
         origin: Starting location (required)
         destination: Delivery location (optional)
         pickup_datetime: Date and time for pickup (optional)
+        pickup_window: same_day, exact or a number of hours either side of pickup_datetime; defaults to PICKUP_WINDOW
+        x_deadline_ms: Time budget in milliseconds; defaults to LOAD_SEARCH_BUDGET_MS
+        x_call_id: Call id; searches of the same call reuse its geocodes, results and prefetched loads
         api_key: API key for authentication (validated via dependency)
     
     Returns:
-        LoadsResponse: Response with the matching loads
+        LoadsResponse: Response with the matching loads; deadline_exceeded is
+        set when the budget ran out before every search attempt could run
     """
     start_time = time.time()
-    logger.info(f"Starting load search - Equipment: {equipment_type}, Origin: {origin}")
-    logger.debug(f"Optional parameters - Destination: {destination}, Pickup: {pickup_datetime}")
+    deadline = Deadline.from_milliseconds(x_deadline_ms if x_deadline_ms is not None else settings.load_search_budget_ms)
+    logger.info("Starting load search - Equipment: %s, Origin: %s", equipment_type, origin)
+    logger.debug("Optional parameters - Destination: %s, Pickup: %s, Window: %s", destination, pickup_datetime, pickup_window)
+
+    try:
+        pickup_window = parse_pickup_window(pickup_window)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pickup_window. Expected same_day, exact or a number of hours")
     
     try:
         # API key is automatically validated by the dependency
@@ -43,34 +65,190 @@ async def find_matching_loads(
         equipment_type, pickup_datetime = process_parameters(equipment_type, pickup_datetime)
 
         # Find matching loads
-        logger.debug(f"Calling find_loads_within_radius with: {equipment_type}, {origin}, {destination}, {pickup_datetime}")
-        raw_loads_data, omitted_parameters = find_loads_within_radius(equipment_type, origin, destination, pickup_datetime)
-        logger.debug(f"Found {len(raw_loads_data)} matching loads; omitted_parameters={omitted_parameters}")
+        logger.debug("Calling find_loads_within_radius with: %s, %s, %s, %s", equipment_type, origin, destination, pickup_datetime)
+        # Concurrent identical searches share one geocode + query sequence
+        raw_loads_data, omitted_parameters, deadline_exceeded = await find_loads_within_radius_coalesced(equipment_type, origin, destination, pickup_datetime, deadline, pickup_window, call_sessions.get(x_call_id))
+        logger.debug("Found %s matching loads; omitted_parameters=%s, deadline_exceeded=%s", len(raw_loads_data), omitted_parameters, deadline_exceeded)
         
         # Convert raw database data to LoadResponse models
         matching_loads = [LoadResponse(**load_data) for load_data in raw_loads_data]
 
         loads_available = len(matching_loads) > 0
         message = f"Number of available loads: {len(matching_loads)}"
+        if deadline_exceeded:
+            message += " (search cut short by the time budget)"
         
         if loads_available:
-            logger.info(f"Load search successful - Found {len(matching_loads)} loads for {equipment_type} from {origin}")
+            logger.info("Load search successful - Found %s loads for %s from %s", len(matching_loads), equipment_type, origin)
         else:
-            logger.info(f"Load search completed - No loads found for {equipment_type} from {origin}")
+            logger.info("Load search completed - No loads found for %s from %s", equipment_type, origin)
         
         processing_time = time.time() - start_time
-        logger.info(f"Load search completed in {processing_time:.3f}s")
+        logger.info("Load search completed in %.3fs", processing_time)
         
         return LoadsResponse(
             statusCode=200,
             loads_available=loads_available,
             message=message,
             loads=matching_loads,
-            omitted_parameters=omitted_parameters
+            omitted_parameters=omitted_parameters,
+            deadline_exceeded=deadline_exceeded
         )
         
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"Error during load search for {equipment_type} from {origin}: {str(e)}")
-        logger.error(f"Processing time: {processing_time:.3f}s")
-        raise HTTPException(status_code=500, detail="Internal server error during load search")
\ No newline at end of file
+        logger.error("Error during load search for %s from %s: %s", equipment_type, origin, str(e))
+        logger.error("Processing time: %.3fs", processing_time)
+        raise HTTPException(status_code=500, detail="Internal server error during load search")
+
+@router.get("/chains", response_model=LoadChainsResponse)
+async def find_load_chains(
+    equipment_type: str = Query(..., description="Type of equipment (required)"),
+    origin: str = Query(..., description="Where the carrier is now (required)"),
+    home: str = Query(..., description="Where the carrier wants to end up (required)"),
+    max_legs: int = Query(2, ge=1, description="Maximum loads in a chain"),
+    available_at: Optional[str] = Query(None, description="When the carrier is free, ISO datetime (default: now)"),
+    x_deadline_ms: Optional[float] = Header(None, alias="x-deadline-ms", description="Time budget in milliseconds (optional)"),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Find chains of loads (outbound plus backhaul, up to max_legs) from origin back towards home
+
+    Chains are built from an in-memory snapshot of open loads: each leg must
+    be reachable from the previous drop-off within the deadhead limit and
+    before its pickup time. Chains are ranked by total deadhead miles,
+    including the empty miles from the last drop-off to home.
+    """
+    start_time = time.time()
+    deadline = Deadline.from_milliseconds(x_deadline_ms if x_deadline_ms is not None else settings.load_search_budget_ms)
+    logger.info("Starting chain search - Equipment: %s, Origin: %s, Home: %s, Legs: %s", equipment_type, origin, home, max_legs)
+
+    try:
+        equipment_type, available_datetime = process_parameters(equipment_type, available_at)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid available_at datetime")
+
+    try:
+        max_legs = min(max_legs, settings.chain_max_legs)
+        (origin_lat, origin_lng), (home_lat, home_lng), graph = await asyncio.gather(
+            get_coordinates(origin, deadline=deadline),
+            get_coordinates(home, deadline=deadline),
+            load_graph.get(),
+        )
+        if origin_lat is None or home_lat is None:
+            logger.warning("Could not get coordinates for origin %s or home %s", origin, home)
+            return LoadChainsResponse(statusCode=200, chains_available=False, message="Could not locate origin or home", chains=[], deadline_exceeded=deadline.expired, graph_age_seconds=round(time.time() - graph.built_at, 1))
+
+        available_epoch = epoch(available_datetime) if available_datetime else time.time()
+        # Scoring is CPU-bound; keep it off the event loop
+        chains, deadline_exceeded = await asyncio.to_thread(graph.find_chains, equipment_type, (origin_lat, origin_lng), (home_lat, home_lng), available_epoch, max_legs, deadline)
+
+        processing_time = time.time() - start_time
+        logger.info("Chain search completed in %.3fs - %s chains", processing_time, len(chains))
+        message = f"Number of load chains: {len(chains)}"
+        if deadline_exceeded:
+            message += " (search cut short by the time budget)"
+        return LoadChainsResponse(
+            statusCode=200,
+            chains_available=bool(chains),
+            message=message,
+            chains=chains,
+            deadline_exceeded=deadline_exceeded,
+            graph_age_seconds=round(time.time() - graph.built_at, 1),
+        )
+    except Exception as e:
+        processing_time = time.time() - start_time
+        logger.error("Error during chain search from %s to %s: %s", origin, home, str(e))
+        logger.error("Processing time: %.3fs", processing_time)
+        raise HTTPException(status_code=500, detail="Internal server error during chain search")
+
+@router.post("/import", response_model=LoadImportResponse)
+async def import_loads_file(
+    request: Request,
+    format: str = Query("csv", description="File format: csv (with a header line) or ndjson"),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Bulk import loads from a CSV or NDJSON request body
+
+    The body is parsed as it is received. Each unique origin/destination place
+    is geocoded once, rows are inserted in batches, and rows that cannot be
+    imported are reported by line number without aborting the import.
+    """
+    start_time = time.time()
+    logger.info("Load import started - format: %s", format)
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Expected one of: {', '.join(IMPORT_FORMATS)}")
+
+    try:
+        report = await import_loads(request.stream(), format)
+        processing_time = time.time() - start_time
+        logger.info("Load import completed in %.3fs - inserted %s of %s rows", processing_time, report["inserted"], report["rows_read"])
+        return LoadImportResponse(statusCode=200, **report)
+    except Exception as e:
+        processing_time = time.time() - start_time
+        logger.error("Error during load import: %s", str(e))
+        logger.error("Processing time: %.3fs", processing_time)
+        raise HTTPException(status_code=500, detail="Internal server error during load import")
+
+@router.post("/negotiate", response_model=NegotiateResponse)
+async def negotiate(request: NegotiateRequest, api_key: str = Depends(verify_api_key)):
+    """
+    Answer a carrier's rate offer for a load
+
+    Offers up to NEGOTIATION_MAX_MARKUP above the loadboard rate are accepted
+    and higher ones are countered with that maximum. While negotiating, the
+    load is held for the carrier for RESERVATION_LEASE_SECONDS, so agents on
+    other calls are not told they can have it; a booked or held load is
+    rejected.
+    """
+    start_time = time.time()
+    logger.info("Negotiation started - Load: %s, MC: %s, Rate: %s", request.load_id, request.carrier_mc, request.proposed_rate)
+    carrier_mc = extract_mc_digits(request.carrier_mc)
+    if not carrier_mc or request.proposed_rate <= 0:
+        raise HTTPException(status_code=400, detail="Invalid carrier_mc or proposed_rate")
+
+    try:
+        result = await negotiate_load(request.load_id, carrier_mc, request.proposed_rate)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"Load {request.load_id} not found")
+    except Exception as e:
+        processing_time = time.time() - start_time
+        logger.error("Error during negotiation for load %s: %s", request.load_id, str(e))
+        logger.error("Processing time: %.3fs", processing_time)
+        raise HTTPException(status_code=500, detail="Internal server error during negotiation")
+
+    processing_time = time.time() - start_time
+    logger.info("Negotiation completed in %.3fs - Load: %s, status: %s", processing_time, request.load_id, result["status"])
+    return NegotiateResponse(**result)
+
+@router.post("/confirm", response_model=ConfirmResponse)
+async def confirm(request: ConfirmRequest, api_key: str = Depends(verify_api_key)):
+    """
+    Book a load for a carrier at the final rate
+
+    Only one confirmation of a load is ever booked, however many agents
+    confirm it at once; the others get status "unavailable". Confirming a
+    load already booked for the same carrier returns that booking again, so
+    retries are safe. A final rate above NEGOTIATION_MAX_MARKUP over the
+    loadboard rate is rejected.
+    """
+    start_time = time.time()
+    logger.info("Booking confirmation started - Load: %s, MC: %s, Rate: %s", request.load_id, request.carrier_mc, request.final_rate)
+    carrier_mc = extract_mc_digits(request.carrier_mc)
+    if not carrier_mc or request.final_rate <= 0:
+        raise HTTPException(status_code=400, detail="Invalid carrier_mc or final_rate")
+
+    try:
+        result = await confirm_load(request.load_id, carrier_mc, request.final_rate)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"Load {request.load_id} not found")
+    except Exception as e:
+        processing_time = time.time() - start_time
+        logger.error("Error during booking confirmation for load %s: %s", request.load_id, str(e))
+        logger.error("Processing time: %.3fs", processing_time)
+        raise HTTPException(status_code=500, detail="Internal server error during booking confirmation")
+
+    processing_time = time.time() - start_time
+    logger.info("Booking confirmation completed in %.3fs - Load: %s, status: %s", processing_time, request.load_id, result["status"])
+    return ConfirmResponse(**result)
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from app.schemas.schemas import LoadsResponse, LoadResponse, MetricsRequest, MetricsResponse, MetricsStatsResponse
-from app.utils.utils_metrics import get_metrics_from_supabase, store_metrics_in_supabase, update_metrics_in_supabase
+from fastapi.responses import StreamingResponse
+from app.schemas.schemas import LoadsResponse, LoadResponse, MetricsRequest, MetricsResponse, MetricsStatsResponse, StoreMetricsResponse, MetricsPercentilesResponse
+from app.utils.utils_metrics import get_metrics_from_supabase, store_metrics_in_supabase, update_metrics_in_supabase, iter_metrics_pages
+from app.utils.utils_sketches import metric_sketches
+from app.utils.utils_export import EXPORT_FORMATS, stream_csv, stream_columnar, pyarrow_available
 from app.auth import verify_api_key
 from typing import Optional
+from datetime import datetime
 import logging
 import time
 import asyncio
@@ -24,7 +28,7 @@ async def get_metrics(api_key: str = Depends(verify_api_key)):
 
         # get metrics from supabase
         metrics = get_metrics_from_supabase()
-        logger.debug(f"Metrics: {metrics}")
+        logger.debug("Metrics: %s", metrics)
         
         # return metrics
         return MetricsResponse(
@@ -34,11 +38,69 @@ async def get_metrics(api_key: str = Depends(verify_api_key)):
         )
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"Error in get_metrics endpoint: {str(e)}")
-        logger.error(f"Processing time: {processing_time:.3f}s")
+        logger.error("Error in get_metrics endpoint: %s", str(e))
+        logger.error("Processing time: %.3fs", processing_time)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@router.post("/store_metrics", response_model=MetricsResponse)
+@router.get("/percentiles", response_model=MetricsPercentilesResponse)
+async def get_metric_percentiles(api_key: str = Depends(verify_api_key)):
+    """Get p50/p90/p99 for call duration and negotiation metrics from the quantile sketches"""
+    start_time = time.time()
+    logger.info("Get metric percentiles endpoint called")
+    try:
+        # Reading the shared state file is blocking I/O
+        percentiles = await asyncio.to_thread(metric_sketches.percentiles, (0.5, 0.9, 0.99))
+        processing_time = time.time() - start_time
+        logger.info("Get metric percentiles completed in %.3fs", processing_time)
+        return MetricsPercentilesResponse(statusCode=200, success=True, percentiles=percentiles)
+    except Exception as e:
+        processing_time = time.time() - start_time
+        logger.error("Error in get_metric_percentiles endpoint: %s", str(e))
+        logger.error("Processing time: %.3fs", processing_time)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/export")
+async def export_metrics(
+    format: str = Query("csv", description="Export format: csv, arrow or parquet"),
+    start_date: Optional[datetime] = Query(None, description="Only rows created at or after this datetime (optional)"),
+    end_date: Optional[datetime] = Query(None, description="Only rows created before this datetime (optional)"),
+    organization_id: Optional[str] = Query(None, description="Only rows for this organization (optional)"),
+    after_id: Optional[int] = Query(None, description="Resume the export after this metrics id (optional)"),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Stream the metrics table as CSV, Arrow IPC or Parquet
+
+    Rows are read page by page with keyset pagination on `id` and encoded as they
+    arrive, so memory use does not grow with the size of the export. Rows are
+    always emitted in ascending `id` order: an interrupted download can be resumed
+    by passing the last received `id` as `after_id`.
+    """
+    logger.info("Metrics export requested - format: %s, organization: %s, start: %s, end: %s, after_id: %s", format, organization_id, start_date, end_date, after_id)
+
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{format}'. Expected one of: {', '.join(EXPORT_FORMATS)}")
+    if format != "csv" and not pyarrow_available():
+        logger.error("Metrics export in %s format requested but pyarrow is not installed", format)
+        raise HTTPException(status_code=501, detail=f"Export format '{format}' is not available on this server")
+    if start_date and end_date and start_date >= end_date:
+        raise HTTPException(status_code=400, detail="start_date must be earlier than end_date")
+
+    pages = iter_metrics_pages(start_date, end_date, organization_id, after_id)
+    if format == "csv":
+        body = stream_csv(pages)
+    else:
+        body = stream_columnar(pages, format)
+
+    extension = {"csv": "csv", "arrow": "arrows", "parquet": "parquet"}[format]
+    headers = {
+        "Content-Disposition": f'attachment; filename="metrics.{extension}"',
+        "X-Export-Order": "id",
+        "X-Export-Resume-Param": "after_id",
+    }
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
+
+@router.post("/store_metrics", response_model=StoreMetricsResponse)
 async def store_metrics(metrics: MetricsRequest, api_key: str = Depends(verify_api_key)):
     """Store metrics endpoint with API key validation"""
     start_time = time.time()
@@ -58,11 +120,11 @@ async def store_metrics(metrics: MetricsRequest, api_key: str = Depends(verify_a
         return StoreMetricsResponse(statusCode=200, success=success, message=message)
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"Error in store_metrics endpoint: {str(e)}")
-        logger.error(f"Processing time: {processing_time:.3f}s")
+        logger.error("Error in store_metrics endpoint: %s", str(e))
+        logger.error("Processing time: %.3fs", processing_time)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@router.post("/update_metrics", response_model=MetricsResponse)
+@router.post("/update_metrics", response_model=StoreMetricsResponse)
 async def update_metrics(api_key: str = Depends(verify_api_key)):
     """Update metrics endpoint with API key validation - Fetches rows where call_status is 'running' and updates them with HappyRobot data"""
     start_time = time.time()
@@ -75,16 +137,16 @@ async def update_metrics(api_key: str = Depends(verify_api_key)):
         async def background_update():
             try:
                 result = await update_metrics_in_supabase()
-                logger.info(f"Background metrics update completed: {result}")
+                logger.info("Background metrics update completed: %s", result)
             except Exception as e:
-                logger.error(f"Error in background metrics update: {str(e)}")
+                logger.error("Error in background metrics update: %s", str(e))
         
         # Create and start the background task
         asyncio.create_task(background_update())
         
         # Return immediate response
         processing_time = time.time() - start_time
-        logger.info(f"Metrics update process started in background. Processing time: {processing_time:.3f}s")
+        logger.info("Metrics update process started in background. Processing time: %.3fs", processing_time)
         
         return StoreMetricsResponse(
             statusCode=200, 
@@ -93,8 +155,8 @@ async def update_metrics(api_key: str = Depends(verify_api_key)):
         )
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"Error in update_metrics endpoint: {str(e)}")
-        logger.error(f"Processing time: {processing_time:.3f}s")
+        logger.error("Error in update_metrics endpoint: %s", str(e))
+        logger.error("Processing time: %.3fs", processing_time)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/health", response_model=MetricsStatsResponse)
@@ -110,6 +172,6 @@ async def metrics_health_check(api_key: str = Depends(verify_api_key)):
         return MetricsStatsResponse(statusCode=200, success=True, message="Metrics health check passed")
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"Error in metrics health check endpoint: {str(e)}")
-        logger.error(f"Processing time: {processing_time:.3f}s")
+        logger.error("Error in metrics health check endpoint: %s", str(e))
+        logger.error("Processing time: %.3fs", processing_time)
         raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
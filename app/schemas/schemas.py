@@ -47,6 +47,8 @@ class LoadResponse(BaseModel):
     origin_lng: Optional[float] = None
     destination_lat: Optional[float] = None
     destination_lng: Optional[float] = None
+    # Hours from the requested pickup_datetime to this load's pickup (negative when earlier); set by searches with a pickup_datetime
+    pickup_offset_hours: Optional[float] = None
 
 class LoadsResponse(BaseModel):
     statusCode: int
@@ -54,12 +56,52 @@ class LoadsResponse(BaseModel):
     message: str
     loads: List[LoadResponse]
     omitted_parameters: List[str] = Field(default_factory=list)
+    # True when the request's time budget ran out before every search attempt could run
+    deadline_exceeded: bool = False
+
+class LoadChainLeg(BaseModel):
+    deadhead_miles: float  # empty miles driven to this leg's pickup
+    load: LoadResponse
+
+class LoadChain(BaseModel):
+    legs: List[LoadChainLeg]
+    deadhead_miles: float  # total empty miles, including the return home
+    return_deadhead_miles: float
+    loaded_miles: float
+    total_rate: float
+
+class LoadChainsResponse(BaseModel):
+    statusCode: int
+    chains_available: bool
+    message: str
+    chains: List[LoadChain]
+    deadline_exceeded: bool = False
+    graph_age_seconds: float  # age of the open-loads snapshot the chains were built from
+
+class LoadImportError(BaseModel):
+    line: int
+    error: str
+
+class LoadImportResponse(BaseModel):
+    statusCode: int
+    rows_read: int
+    inserted: int
+    failed: int
+    places_geocoded: int
+    places_unresolved: int
+    errors: List[LoadImportError] = Field(default_factory=list)  # first 100 row errors
+    seconds: float
 
 class CarrierResponse(BaseModel):
     statusCode: int
     verified_carrier: bool
     message: str
 
+class CarriersPageResponse(BaseModel):
+    statusCode: int
+    carriers: List[Dict[str, Any]]
+    next_after: Optional[str] = None  # mc_number to pass as `after` for the next page; None on the last page
+
 class NegotiateRequest(BaseModel):
     load_id: str
     carrier_mc: str
@@ -110,6 +152,19 @@ class StoreMetricsResponse(BaseModel):
     success: Optional[bool] = True
     message: Optional[str] = ""
 
+class PercentileSummary(BaseModel):
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+
+class MetricsPercentilesResponse(BaseModel):
+    statusCode: int
+    success: Optional[bool] = True
+    percentiles: Dict[str, PercentileSummary]
+
 
 class MetricsStatsResponse(BaseModel):
     total_calls: int
@@ -1,7 +1,20 @@
 import os
+import asyncio
+import importlib.util
+import bisect
+import csv
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from dotenv import load_dotenv
 import logging
 
+from app.config import settings
+from app.instrumentation import registry
+
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
@@ -10,110 +23,584 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-logger.debug(f"Supabase URL: {SUPABASE_URL}")
-logger.debug(f"Supabase Key: {SUPABASE_KEY[:8] if SUPABASE_KEY else 'None'}...")
+logger.debug("Supabase URL: %s", SUPABASE_URL)
+logger.debug("Supabase Key: %s...", SUPABASE_KEY[:8] if SUPABASE_KEY else 'None')
+
+
+class DatabaseClient(ABC):
+    """Interface shared by every database backend behind the repositories
+
+    `table()` returns a PostgREST-style query builder and `execute()` runs a built
+    query. Every implementation bounds the number of in-flight queries with
+    `pool_size`, enforces `query_timeout` and records per-operation timings.
+    """
+
+    def __init__(self, pool_size: int, query_timeout: float):
+        self.pool_size = pool_size
+        self.query_timeout = query_timeout
+        self._semaphore = asyncio.Semaphore(pool_size)
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @abstractmethod
+    def table(self, table_name: str):
+        """Return a query builder for the given table"""
+
+    @abstractmethod
+    async def _run(self, query):
+        """Run a built query and return its result"""
+
+    async def execute(self, query, operation: str = "query"):
+        """Execute a query built from `table()`, waiting for a free pool slot first"""
+        async with self._semaphore:
+            start_time = time.perf_counter()
+            failed = False
+            try:
+                return await asyncio.wait_for(self._run(query), timeout=self.query_timeout)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self._record(operation, time.perf_counter() - start_time, failed)
+
+    def _record(self, operation: str, elapsed: float, failed: bool):
+        stats = self._stats.setdefault(operation, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["errors"] += int(failed)
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        registry.observe("db_query_duration_seconds", (operation,), elapsed)
+        if failed:
+            registry.inc("db_query_errors_total", (operation,))
+        logger.debug("Query %s took %.4fs (failed=%s)", operation, elapsed, failed)
+
+    def query_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return count, errors, total/avg/max seconds per operation"""
+        return {
+            operation: {**stats, "avg_seconds": stats["total_seconds"] / stats["count"] if stats["count"] else 0.0}
+            for operation, stats in self._stats.items()
+        }
+
+    async def warm_up(self, connections: int = 1):
+        """Open up to `connections` pooled connections ahead of the first request"""
+
+    async def close(self):
+        """Release pooled connections"""
+
+
+class PooledAsyncSupabaseClient(DatabaseClient):
+    """Async PostgREST client for Supabase backed by a bounded httpx connection pool
+
+    postgrest/httpx are imported and the pool is created on first use (normally
+    during warm-up), not when the app is imported.
+    """
+
+    def __init__(self, url: str, key: str, pool_size: int = 10, query_timeout: float = 10.0):
+        super().__init__(pool_size, query_timeout)
+        self.url = url
+        self.key = key
+        self._postgrest = None
+
+    @property
+    def _client(self):
+        if self._postgrest is None:
+            self._postgrest = self._create_client()
+        return self._postgrest
+
+    def _create_client(self):
+        import httpx
+        from postgrest import AsyncPostgrestClient
+        from postgrest.utils import AsyncClient
+
+        pool_size = self.pool_size
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+
+        class _PooledPostgrestClient(AsyncPostgrestClient):
+            def create_session(self, base_url, headers, timeout, verify=True):
+                return AsyncClient(
+                    base_url=base_url,
+                    headers=headers,
+                    timeout=timeout,
+                    verify=verify,
+                    follow_redirects=True,
+                    http2=True,
+                    limits=limits,
+                )
+
+        client = _PooledPostgrestClient(
+            f"{self.url}/rest/v1",
+            headers={"apiKey": self.key, "Authorization": f"Bearer {self.key}"},
+            timeout=self.query_timeout,
+        )
+        logger.debug("Initialized PooledAsyncSupabaseClient with pool size %s", pool_size)
+        return client
+
+    def table(self, table_name: str):
+        return self._client.table(table_name)
+
+    async def _run(self, query):
+        return await query.execute()
+
+    async def warm_up(self, connections: int = 1):
+        # Concurrent probes make the pool open several connections at once
+        probes = [self.execute(self.table("carriers").select("mc_number").limit(1), "warm_up") for _ in range(min(connections, self.pool_size))]
+        await asyncio.gather(*probes)
+
+    async def close(self):
+        if self._postgrest is not None:
+            await self._postgrest.aclose()
 
-# Try to create real Supabase client, fallback to mock if it fails
-try:
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        logger.warning("Supabase URL or KEY not provided, using mock client")
-        raise ImportError("Supabase credentials not provided")
+
+# Mock Supabase client for local development, benchmarks and fallback
+class MockSupabaseClient(DatabaseClient):
+    """In-memory database client with the same query builder API as Supabase
+
+    Tables live in a MockDatabase; filters, ordering, limits, inserts and
+    updates are applied for real. `latency_ms` adds an artificial non-blocking
+    delay to every query so the client can stand in for the real backend.
+    """
+
+    def __init__(self, url, key, pool_size: int = 10, query_timeout: float = 10.0, latency_ms: float = 0.0, database: "MockDatabase | None" = None):
+        super().__init__(pool_size, query_timeout)
+        self.url = url
+        self.key = key
+        self.latency_ms = latency_ms
+        self.database = database or MockDatabase()
+        logger.debug("Initialized MockSupabaseClient")
     
-    from supabase import create_client
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    logger.info("Real Supabase client initialized successfully")
+    def table(self, table_name):
+        logger.debug("Accessing table: %s", table_name)
+        return MockTable(self.database, table_name)
+
+    async def _run(self, query):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        # Scans and lazy index builds must not block the event loop
+        return await asyncio.to_thread(query.execute)
+
+
+def _index_key(value):
+    """Normalize a value into a comparable (type rank, value) key; None is not indexable"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return (0, float(value))
+    if isinstance(value, (int, float)):
+        return (0, float(value))
+    if isinstance(value, (datetime, date)):
+        return (1, value.isoformat())
+    return (1, str(value))
+
+
+class SortedIndex:
+    """Sorted (key, row id) pairs of one column, searched with bisect"""
+
+    def __init__(self, rows: Dict[int, Dict[str, Any]], column: str):
+        self.column = column
+        pairs = sorted((key, row_id) for row_id, row in rows.items() if (key := _index_key(row.get(column))) is not None)
+        self.keys = [key for key, _ in pairs]
+        self.row_ids = [row_id for _, row_id in pairs]
+
+    def add(self, row_id: int, value):
+        key = _index_key(value)
+        if key is None:
+            return
+        position = bisect.bisect_left(self.keys, key)
+        # Keep equal keys ordered by row id so removal can find the exact entry
+        while position < len(self.keys) and self.keys[position] == key and self.row_ids[position] < row_id:
+            position += 1
+        self.keys.insert(position, key)
+        self.row_ids.insert(position, row_id)
+
+    def remove(self, row_id: int, value):
+        key = _index_key(value)
+        if key is None:
+            return
+        position = bisect.bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key:
+            if self.row_ids[position] == row_id:
+                del self.keys[position]
+                del self.row_ids[position]
+                return
+            position += 1
+
+    def span(self, operator: str, value) -> Tuple[int, int]:
+        """Return the [start, end) positions of entries matching `column <operator> value`"""
+        key = _index_key(value)
+        rank = key[0]
+        type_start = bisect.bisect_left(self.keys, (rank,))
+        type_end = bisect.bisect_left(self.keys, (rank + 1,))
+        if operator == "eq":
+            return bisect.bisect_left(self.keys, key), bisect.bisect_right(self.keys, key)
+        if operator == "gte":
+            return bisect.bisect_left(self.keys, key), type_end
+        if operator == "gt":
+            return bisect.bisect_right(self.keys, key), type_end
+        if operator == "lte":
+            return type_start, bisect.bisect_right(self.keys, key)
+        if operator == "lt":
+            return type_start, bisect.bisect_left(self.keys, key)
+        raise ValueError(f"Operator {operator} cannot use an index")
+
+
+_COMPARATORS = {
+    "eq": lambda actual, expected: actual == expected,
+    "neq": lambda actual, expected: actual != expected,
+    "gt": lambda actual, expected: actual > expected,
+    "gte": lambda actual, expected: actual >= expected,
+    "lt": lambda actual, expected: actual < expected,
+    "lte": lambda actual, expected: actual <= expected,
+}
+
+INDEXABLE_OPERATORS = ("eq", "gt", "gte", "lt", "lte")
+
+# Columns the repositories filter on; their indexes are built when a table is seeded
+INDEXED_COLUMNS = {
+    "loads": ("load_id", "equipment_type", "origin_lat", "origin_lng", "destination_lat", "destination_lng", "pickup_datetime"),
+    "carriers": ("mc_number",),
+    "metrics": ("id", "call_status", "organization_id", "created_at"),
+}
+
+# Non-text columns of CSV fixtures; every other CSV value is kept as a string
+CSV_COLUMN_TYPES = {
+    "loads": {
+        "loadboard_rate": float, "weight": float, "num_of_pieces": int, "miles": float,
+        "origin_lat": float, "origin_lng": float, "destination_lat": float, "destination_lng": float,
+    },
+    "metrics": {
+        "id": int, "load_loadboard_rate": float, "carrier_initial_offer": float, "load_agreed_rate": float,
+        "negotiation_attempts": int, "call_duration": float, "negotiation_performance": float, "rate_difference": float,
+    },
+}
+
+
+def _matches(row: Dict[str, Any], column: str, operator: str, value) -> bool:
+    if operator == "is":
+        # Only IS NULL is supported, the form PostgREST's is_(column, "null") takes
+        return row.get(column) is None
+    if operator == "in":
+        actual = _index_key(row.get(column))
+        return actual is not None and actual in {_index_key(item) for item in value}
+    actual = _index_key(row.get(column))
+    expected = _index_key(value)
+    if actual is None or expected is None or actual[0] != expected[0]:
+        return operator == "neq" and actual != expected
+    return _COMPARATORS[operator](actual, expected)
+
+
+class MockTableData:
+    """Rows of one table keyed by insertion order, with sorted indexes per column
+
+    Indexes of INDEXED_COLUMNS are built when the table is seeded; other
+    columns get one on their first filtered query.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.indexes: Dict[str, SortedIndex] = {}
+        self._next_row_id = 0
+        self._next_id = 1
+
+    def index(self, column: str) -> SortedIndex:
+        index = self.indexes.get(column)
+        if index is None:
+            index = self.indexes[column] = SortedIndex(self.rows, column)
+            logger.debug("Built sorted index on %s.%s (%s entries)", self.name, column, len(index.keys))
+        return index
+
+    def build_indexes(self, columns: Iterable[str]):
+        """(Re)build the sorted indexes of the given columns from the current rows"""
+        for column in columns:
+            self.indexes.pop(column, None)
+            self.index(column)
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = dict(row)
+        if "id" not in row:
+            row["id"] = self._next_id
+        if isinstance(row["id"], int):
+            self._next_id = max(self._next_id, row["id"] + 1)
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        row_id = self._next_row_id
+        self._next_row_id += 1
+        self.rows[row_id] = row
+        for column, index in self.indexes.items():
+            index.add(row_id, row.get(column))
+        return dict(row)
+
+    def update(self, row_id: int, changes: Dict[str, Any]) -> Dict[str, Any]:
+        row = self.rows[row_id]
+        for column, value in changes.items():
+            index = self.indexes.get(column)
+            if index is not None:
+                index.remove(row_id, row.get(column))
+                index.add(row_id, value)
+            row[column] = value
+        return dict(row)
+
+    def delete(self, row_id: int) -> Dict[str, Any]:
+        row = self.rows.pop(row_id)
+        for column, index in self.indexes.items():
+            index.remove(row_id, row.get(column))
+        return row
+
+    def matching_row_ids(self, filters: List[Tuple[str, str, Any]], limit: Optional[int] = None) -> List[int]:
+        """Return ids of rows matching every filter, in insertion order
+
+        Indexed filters on the same column are intersected into one span (so
+        gte/lte on a column is a single range), the column with the fewest
+        candidates drives the scan and the remaining filters are checked row
+        by row. Without ordering, the scan stops as soon as `limit` rows match.
+        """
+        spans: Dict[str, Tuple[int, int]] = {}
+        for column, operator, value in filters:
+            if operator not in INDEXABLE_OPERATORS or _index_key(value) is None:
+                continue
+            start, end = self.index(column).span(operator, value)
+            if column in spans:
+                start, end = max(start, spans[column][0]), min(end, spans[column][1])
+            spans[column] = (start, end)
+
+        driving_column = min(spans, key=lambda column: spans[column][1] - spans[column][0], default=None)
+        if driving_column is None:
+            candidates = self.rows.keys()
+        else:
+            start, end = spans[driving_column]
+            if end <= start:
+                return []
+            candidates = sorted(self.indexes[driving_column].row_ids[start:end])
+
+        remaining = [item for item in filters if item[0] != driving_column or item[1] not in INDEXABLE_OPERATORS or _index_key(item[2]) is None]
+        matched = []
+        for row_id in candidates:
+            row = self.rows[row_id]
+            if all(_matches(row, column, operator, value) for column, operator, value in remaining):
+                matched.append(row_id)
+                if limit is not None and len(matched) >= limit:
+                    break
+        return matched
+
+    def ordered_row_ids(self, filters: List[Tuple[str, str, Any]], column: str, limit: int) -> List[int]:
+        """Return ids of up to `limit` rows matching every filter, in ascending `column` order with nulls last
+
+        Walks the column's index instead of sorting every match, starting at
+        the bounds of range filters on the same column, so a keyset page
+        (`gt(column, last).order(column).limit(n)`) costs about n rows.
+        """
+        index = self.index(column)
+        start, end = 0, len(index.row_ids)
+        bounded = False
+        for filter_column, operator, value in filters:
+            if filter_column == column and operator in INDEXABLE_OPERATORS and _index_key(value) is not None:
+                span_start, span_end = index.span(operator, value)
+                start, end = max(start, span_start), min(end, span_end)
+                bounded = True
+
+        matched = []
+        for position in range(start, end):
+            row_id = index.row_ids[position]
+            if all(_matches(self.rows[row_id], *item) for item in filters):
+                matched.append(row_id)
+                if len(matched) >= limit:
+                    return matched
+        # A range filter on the column never matches nulls; skip the scan for them on the last page
+        if bounded:
+            return matched
+        for row_id, row in self.rows.items():
+            if row.get(column) is None and all(_matches(row, *item) for item in filters):
+                matched.append(row_id)
+                if len(matched) >= limit:
+                    break
+        return matched
+
+
+class MockDatabase:
+    """Set of in-memory tables shared by every query of a MockSupabaseClient"""
+
+    def __init__(self):
+        self.tables: Dict[str, MockTableData] = {}
+        self.lock = threading.RLock()
+
+    def table(self, name: str) -> MockTableData:
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = MockTableData(name)
+        return table
+
+    def seed(self, table_name: str, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows into a table, build its indexes and return how many rows were inserted"""
+        with self.lock:
+            table = self.table(table_name)
+            # Insert without index maintenance, then sort every index once
+            indexed = set(table.indexes) | set(INDEXED_COLUMNS.get(table_name, ()))
+            table.indexes = {}
+            for row in rows:
+                table.insert(row)
+            table.build_indexes(indexed)
+        logger.info("Seeded mock table %s with %s rows", table_name, len(rows))
+        return len(rows)
+
+    def load_fixture(self, path: str, table_name: Optional[str] = None) -> int:
+        """Seed a table from a JSON array, NDJSON or CSV file; the table name defaults to the file name"""
+        table_name = table_name or os.path.splitext(os.path.basename(path))[0]
+        with open(path, newline="") as f:
+            if path.endswith(".csv"):
+                column_types = CSV_COLUMN_TYPES.get(table_name, {})
+                rows = [{column: _parse_csv_value(value, column_types.get(column)) for column, value in row.items()} for row in csv.DictReader(f)]
+            elif path.endswith((".ndjson", ".jsonl")):
+                rows = [json.loads(line) for line in f if line.strip()]
+            else:
+                rows = json.load(f)
+        return self.seed(table_name, rows)
+
+
+def _parse_csv_value(value: Optional[str], cast=None):
+    if value is None or value == "":
+        return None
+    return cast(value) if cast else value
+
+
+class MockTable:
+    def __init__(self, database: MockDatabase, table_name):
+        self.database = database
+        self.table_name = table_name
+    
+    def select(self, columns="*"):
+        logger.debug("Selecting columns: %s", columns)
+        return MockQuery(self.database, self.table_name, "select", columns=columns)
+    
+    def insert(self, data):
+        logger.debug("Inserting data into %s", self.table_name)
+        return MockQuery(self.database, self.table_name, "insert", payload=data)
     
-except Exception as e:
-    logger.warning(f"Failed to initialize real Supabase client: {str(e)}")
-    logger.info("Falling back to mock Supabase client")
+    def update(self, data):
+        logger.debug("Updating data in %s", self.table_name)
+        return MockQuery(self.database, self.table_name, "update", payload=data)
+
+    def delete(self):
+        logger.debug("Deleting data from %s", self.table_name)
+        return MockQuery(self.database, self.table_name, "delete")
+
+class MockQuery:
+    def __init__(self, database: MockDatabase, table_name, operation, columns="*", payload=None):
+        self.database = database
+        self.table_name = table_name
+        self.operation = operation
+        self.columns = columns
+        self.payload = payload
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.order_by: List[Tuple[str, bool]] = []
+        self.row_limit: Optional[int] = None
     
-    # Mock Supabase client for fallback
-    class MockSupabaseClient:
-        def __init__(self, url, key):
-            self.url = url
-            self.key = key
-            logger.debug("Initialized MockSupabaseClient")
-        
-        def table(self, table_name):
-            logger.debug(f"Accessing table: {table_name}")
-            return MockTable(table_name)
-
-    class MockTable:
-        def __init__(self, table_name):
-            self.table_name = table_name
-            logger.debug(f"Initialized MockTable for: {table_name}")
-        
-        def select(self, columns="*"):
-            logger.debug(f"Selecting columns: {columns}")
-            return MockQuery(self.table_name, columns)
-        
-        def insert(self, data):
-            logger.debug(f"Inserting data into {self.table_name}: {data}")
-            return self
-        
-        def update(self, data):
-            logger.debug(f"Updating data in {self.table_name}: {data}")
-            return self
-        
-        def eq(self, column, value):
-            logger.debug(f"Adding equality filter: {column} = {value}")
-            return self
-        
-        def gte(self, column, value):
-            logger.debug(f"Adding greater than or equal filter: {column} >= {value}")
-            return self
-        
-        def lte(self, column, value):
-            logger.debug(f"Adding less than or equal filter: {column} <= {value}")
-            return self
-        
-        def limit(self, count):
-            logger.debug(f"Adding limit: {count}")
-            return self
-        
-        def order(self, column, desc=False):
-            logger.debug(f"Adding order: {column} {'DESC' if desc else 'ASC'}")
-            return self
-        
-        def execute(self):
-            logger.debug("Executing mock query")
-            return MockResult()
-
-    class MockQuery:
-        def __init__(self, table_name, columns):
-            self.table_name = table_name
-            self.columns = columns
-            logger.debug(f"Initialized MockQuery for table: {table_name}, columns: {columns}")
-        
-        def eq(self, column, value):
-            logger.debug(f"Adding equality filter: {column} = {value}")
-            return self
-        
-        def gte(self, column, value):
-            logger.debug(f"Adding greater than or equal filter: {column} >= {value}")
-            return self
-        
-        def lte(self, column, value):
-            logger.debug(f"Adding less than or equal filter: {column} <= {value}")
-            return self
-        
-        def limit(self, count):
-            logger.debug(f"Adding limit: {count}")
-            return self
-        
-        def order(self, column, desc=False):
-            logger.debug(f"Adding order: {column} {'DESC' if desc else 'ASC'}")
-            return self
-        
-        def execute(self):
-            logger.debug("Executing mock query")
-            return MockResult()
-
-    class MockResult:
-        def __init__(self):
-            self.data = []
-            logger.debug("Initialized MockResult with empty data")
-
-    # Use mock client as fallback
-    supabase = MockSupabaseClient(SUPABASE_URL or "mock-url", SUPABASE_KEY or "mock-key")
-    logger.info("Mock Supabase client initialized as fallback")
+    def _filter(self, column, operator, value):
+        self.filters.append((column, operator, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "neq", value)
+    
+    def gte(self, column, value):
+        return self._filter(column, "gte", value)
+    
+    def lte(self, column, value):
+        return self._filter(column, "lte", value)
+    
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+    
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def in_(self, column, values):
+        return self._filter(column, "in", list(values))
+
+    def is_(self, column, value):
+        if value not in (None, "null"):
+            raise ValueError("Mock is_ filter only supports null")
+        return self._filter(column, "is", None)
+    
+    def limit(self, count):
+        self.row_limit = count
+        return self
+    
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self.columns.strip() == "*":
+            return dict(row)
+        return {column: row.get(column) for column in (name.strip() for name in self.columns.split(","))}
+    
+    def execute(self):
+        logger.debug("Executing mock %s on %s with %s filters", self.operation, self.table_name, len(self.filters))
+        with self.database.lock:
+            table = self.database.table(self.table_name)
+
+            if self.operation == "insert":
+                rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                return MockResult([table.insert(row) for row in rows])
+
+            # Single ascending order with a limit: walk the index of the order column
+            if self.operation == "select" and self.row_limit is not None and len(self.order_by) == 1 and not self.order_by[0][1]:
+                row_ids = table.ordered_row_ids(self.filters, self.order_by[0][0], self.row_limit)
+                return MockResult([self._project(table.rows[row_id]) for row_id in row_ids])
+
+            # Only stop early when the result does not need sorting
+            scan_limit = self.row_limit if self.operation == "select" and not self.order_by else None
+            row_ids = table.matching_row_ids(self.filters, scan_limit)
+
+            if self.operation == "update":
+                return MockResult([table.update(row_id, self.payload) for row_id in row_ids])
+            if self.operation == "delete":
+                return MockResult([table.delete(row_id) for row_id in row_ids])
+
+            rows = [table.rows[row_id] for row_id in row_ids]
+            for column, desc in reversed(self.order_by):
+                present = [row for row in rows if row.get(column) is not None]
+                missing = [row for row in rows if row.get(column) is None]
+                # Nulls sort last ascending and first descending, as in PostgreSQL
+                present.sort(key=lambda row: _index_key(row.get(column)), reverse=desc)
+                rows = missing + present if desc else present + missing
+            if self.row_limit is not None:
+                rows = rows[:self.row_limit]
+            return MockResult([self._project(row) for row in rows])
+
+class MockResult:
+    def __init__(self, data=None):
+        self.data = data if data is not None else []
+
+
+def create_database_client() -> DatabaseClient:
+    """Create the pooled async Supabase client, falling back to the mock client"""
+    try:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            logger.warning("Supabase URL or KEY not provided, using mock client")
+            raise ImportError("Supabase credentials not provided")
+
+        # Check the client library is installed without paying for its import here
+        if importlib.util.find_spec("postgrest") is None:
+            raise ImportError("postgrest is not installed")
+
+        client = PooledAsyncSupabaseClient(SUPABASE_URL, SUPABASE_KEY, settings.db_pool_size, settings.db_query_timeout)
+        logger.info("Real Supabase client initialized successfully")
+        return client
+
+    except Exception as e:
+        logger.warning("Failed to initialize real Supabase client: %s", str(e))
+        logger.info("Falling back to mock Supabase client")
+        client = MockSupabaseClient(SUPABASE_URL or "mock-url", SUPABASE_KEY or "mock-key", settings.db_pool_size, settings.db_query_timeout, settings.mock_db_latency_ms)
+        for fixture in filter(None, (path.strip() for path in settings.mock_db_fixtures.split(","))):
+            try:
+                client.database.load_fixture(fixture)
+            except (OSError, ValueError) as e:
+                logger.error("Error loading mock database fixture %s: %s", fixture, e)
+        logger.info("Mock Supabase client initialized as fallback")
+        return client
+
+
+# Global database client
+supabase = create_database_client()
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.config import settings
+from app.instrumentation import registry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Namespaces used by the app
+GEOCODE_NAMESPACE = "geocode"
+CARRIER_NAMESPACE = "carrier"
+
+
+class Cache(ABC):
+    """Namespaced key/value cache with per-entry TTL and a bounded size
+
+    Values must be JSON-serializable and not None; a None return from get()
+    means the key is missing, expired or could not be read in time. Errors
+    never propagate: a failed read is a miss and a failed write is dropped.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+
+    @abstractmethod
+    def _get(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def _set(self, namespace: str, key: str, value: Any, ttl: float):
+        ...
+
+    @abstractmethod
+    def clear(self, namespace: Optional[str] = None):
+        ...
+
+    async def _call(self, func, *args):
+        """Run a backend operation; blocking backends override this to leave the event loop"""
+        return func(*args)
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            value = await self._call(self._get, namespace, key)
+        except Exception as e:
+            logger.error("Cache read failed for %s:%s: %s", namespace, key, e)
+            value = None
+        registry.inc("cache_requests_total", (namespace, "miss" if value is None else "hit"))
+        return value
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        try:
+            await self._call(self._set, namespace, key, value, ttl)
+        except Exception as e:
+            logger.error("Cache write failed for %s:%s: %s", namespace, key, e)
+
+
+class NullCache(Cache):
+    """Cache that stores nothing (CACHE_BACKEND=none)"""
+
+    def _get(self, namespace: str, key: str) -> Optional[Any]:
+        return None
+
+    def _set(self, namespace: str, key: str, value: Any, ttl: float):
+        pass
+
+    def clear(self, namespace: Optional[str] = None):
+        pass
+
+
+class MemoryCache(Cache):
+    """Per-process LRU cache; every worker keeps its own copy"""
+
+    def __init__(self, max_entries: int):
+        super().__init__(max_entries)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def _set(self, namespace: str, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[(namespace, key)] = (time.time() + ttl, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self, namespace: Optional[str] = None):
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+            else:
+                for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == namespace]:
+                    del self._entries[entry_key]
+
+
+class SQLiteCache(Cache):
+    """Cache in a local SQLite file shared by all workers on the host
+
+    The database runs in WAL mode, so readers never block each other or the
+    single writer. Every operation runs in a thread off the event loop, and a
+    short busy timeout bounds how long it waits for another process's write
+    lock; a timed-out read counts as a miss and a timed-out write is dropped.
+    Each thread of each process uses its own connection.
+
+    A write that takes the table over `max_entries` evicts the oldest entries
+    in the same transaction, so the bound holds across workers. Expired entries
+    are removed by a sweep every `sweep_every` writes of a process.
+    """
+
+    def __init__(self, path: str, max_entries: int, busy_timeout: float = 0.1, sweep_every: int = 200):
+        super().__init__(max_entries)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.sweep_every = sweep_every
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._connection()
+
+    async def _call(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        # A forked worker must not reuse its parent's connection
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, stored_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, namespace: str, key: str, value: Any, ttl: float):
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl, now),
+            )
+            excess = connection.execute("SELECT count(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                connection.execute("DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY stored_at LIMIT ?)", (excess,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        with self._writes_lock:
+            self._writes += 1
+            sweep = self._writes % self.sweep_every == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """Delete expired entries"""
+        self._connection().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self, namespace: Optional[str] = None):
+        if namespace is None:
+            self._connection().execute("DELETE FROM cache")
+        else:
+            self._connection().execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+
+def create_cache() -> Cache:
+    """Create the cache backend selected by CACHE_BACKEND, falling back to the per-process cache"""
+    backend = settings.cache_backend.lower()
+    if backend == "none":
+        return NullCache(0)
+    if backend == "sqlite":
+        try:
+            cache = SQLiteCache(settings.cache_path, settings.cache_max_entries)
+            logger.info("Using shared SQLite cache at %s", settings.cache_path)
+            return cache
+        except (sqlite3.Error, OSError) as e:
+            logger.error("Could not open SQLite cache at %s, using per-process cache: %s", settings.cache_path, e)
+    elif backend != "memory":
+        logger.warning("Unknown CACHE_BACKEND %s, using per-process cache", settings.cache_backend)
+    return MemoryCache(settings.cache_max_entries)
+
+
+# Global cache for geocodes and carrier lookups
+cache = create_cache()
@@ -1,66 +1,139 @@
 import re
 import logging
-from app.supabase import supabase
+from app.repositories import carrier_repository
+from app.instrumentation import span
+from app.utils.utils_cache import CARRIER_NAMESPACE, cache
+from app.config import settings
+from app.utils.utils_sessions import CallSession
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+# Patrón regex para validar formato MC seguido de 6 dígitos (compilado una sola vez)
+MC_FORMAT_PATTERN = re.compile(r'^MC\s\d{6}$')
+MC_NON_DIGITS_PATTERN = re.compile(r'[^\d]')
+# Nombres de columna aceptados en la proyección del listado de carriers
+COLUMN_NAME_PATTERN = re.compile(r'^[a-z_][a-z0-9_]*$')
+
 def validate_mc_format(mc_number: str) -> bool:
     """Valida que el MC number siga el formato 'MC XXXXXX'"""
-    logger.debug(f"Validating MC format for: {mc_number}")
+    logger.debug("Validating MC format for: %s", mc_number)
     
     try:
-        # Patrón regex para validar formato MC seguido de 6 dígitos
-        pattern = r'^MC\s\d{6}$'
-        logger.debug(f"Using regex pattern: {pattern}")
-        
-        is_valid = bool(re.match(pattern, mc_number))
-        logger.debug(f"MC format validation result: {is_valid}")
+        is_valid = bool(MC_FORMAT_PATTERN.match(mc_number))
+        logger.debug("MC format validation result: %s", is_valid)
         
         if is_valid:
-            logger.debug(f"MC number {mc_number} matches required format")
+            logger.debug("MC number %s matches required format", mc_number)
         else:
-            logger.debug(f"MC number {mc_number} does not match required format 'MC XXXXXX'")
+            logger.debug("MC number %s does not match required format 'MC XXXXXX'", mc_number)
         
         return is_valid
         
     except Exception as e:
-        logger.error(f"Error validating MC format for {mc_number}: {str(e)}")
+        logger.error("Error validating MC format for %s: %s", mc_number, str(e))
         return False
 
 def extract_mc_digits(mc_number: str) -> str:
     """Extrae solo los dígitos del MC number (ej: 'MC 123456' -> '123456')"""
-    logger.debug(f"Extracting MC digits from: {mc_number}")
+    logger.debug("Extracting MC digits from: %s", mc_number)
     
     try:
         # Extraer solo los dígitos del MC number
-        digits = re.sub(r'[^\d]', '', mc_number)
-        logger.debug(f"Extracted MC digits: {digits}")
+        digits = MC_NON_DIGITS_PATTERN.sub('', mc_number)
+        logger.debug("Extracted MC digits: %s", digits)
         
         return digits
         
     except Exception as e:
-        logger.error(f"Error extracting MC digits from {mc_number}: {str(e)}")
+        logger.error("Error extracting MC digits from %s: %s", mc_number, str(e))
         return ""
 
-def check_carrier_exists(mc_digits: str) -> bool:
-    """Verifica si existe un carrier con el MC number en la base de datos"""
-    logger.debug(f"Checking if carrier exists with MC digits: {mc_digits}")
+async def check_carrier_exists(mc_digits: str, session: CallSession | None = None) -> bool:
+    """Verifica si existe un carrier con el MC number en la base de datos
+
+    Con una sesión de llamada, el resultado se recuerda durante la llamada.
+    """
+    logger.debug("Checking if carrier exists with MC digits: %s", mc_digits)
+
+    if session is not None:
+        remembered = session.lookup("carrier", session.carriers, mc_digits)
+        if remembered is not None:
+            return remembered
+
+    cached = await cache.get(CARRIER_NAMESPACE, mc_digits)
+    if cached is not None:
+        logger.debug("Using cached carrier exists result for MC %s: %s", mc_digits, cached)
+        if session is not None:
+            session.carriers[mc_digits] = cached
+        return cached
     
     try:
         # Query the carriers table for the MC number
-        result = supabase.table("carriers").select("mc_number").eq("mc_number", mc_digits).execute()
-        
-        exists = len(result.data) > 0 if result.data else False
-        logger.debug(f"Carrier exists check result: {exists}")
+        with span("check_carrier_exists"):
+            exists = await carrier_repository.exists(mc_digits)
+        logger.debug("Carrier exists check result: %s", exists)
+        await cache.set(CARRIER_NAMESPACE, mc_digits, exists, settings.carrier_cache_ttl)
+        if session is not None:
+            session.carriers[mc_digits] = exists
         
         if exists:
-            logger.info(f"Found carrier with MC number: {mc_digits}")
+            logger.info("Found carrier with MC number: %s", mc_digits)
         else:
-            logger.info(f"No carrier found with MC number: {mc_digits}")
+            logger.info("No carrier found with MC number: %s", mc_digits)
         
         return exists
         
     except Exception as e:
-        logger.error(f"Error checking carrier existence for MC {mc_digits}: {str(e)}")
-        return False
\ No newline at end of file
+        logger.error("Error checking carrier existence for MC %s: %s", mc_digits, str(e))
+        return False
+
+def parse_carrier_fields(fields: str | None) -> str:
+    """Convierte una lista de campos separada por comas en la proyección de select(), siempre con mc_number
+
+    Raises:
+        ValueError: Si algún nombre de campo no es un nombre de columna válido
+    """
+    if not fields:
+        return "*"
+    columns = ["mc_number"]
+    for name in (field.strip() for field in fields.split(",")):
+        if not COLUMN_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid field name: {name!r}")
+        if name not in columns:
+            columns.append(name)
+    return ",".join(columns)
+
+async def iter_carrier_pages(mc_prefix: str | None = None, after: str | None = None, columns: str = "*", page_size: int | None = None):
+    """Genera páginas de carriers ordenadas por mc_number con paginación keyset
+
+    Cada página se pide con `mc_number > último visto`, así que su costo no
+    depende de la profundidad y solo hay una página en memoria a la vez.
+    """
+    page_size = page_size or settings.export_page_size
+    cursor = after
+    pages = 0
+
+    while True:
+        with span("carriers.page"):
+            rows = await carrier_repository.page(cursor, page_size, mc_prefix, columns)
+        if not rows:
+            break
+
+        pages += 1
+        cursor = rows[-1].get("mc_number")
+        logger.debug("Fetched carriers page %s with %s rows, cursor=%s", pages, len(rows), cursor)
+        yield rows
+
+        if len(rows) < page_size or cursor is None:
+            break
+
+    logger.info("Carrier listing finished after %s pages", pages)
+
+async def get_carrier_page(mc_prefix: str | None, after: str | None, columns: str, limit: int) -> tuple[list, str | None]:
+    """Devuelve una página de carriers y el mc_number desde el que sigue la próxima (None en la última)"""
+    # Una fila extra indica si hay otra página
+    with span("carriers.page"):
+        rows = await carrier_repository.page(after, limit + 1, mc_prefix, columns)
+    next_after = rows[limit - 1]["mc_number"] if len(rows) > limit else None
+    return rows[:limit], next_after
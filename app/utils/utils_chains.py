@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.config import settings
+from app.repositories import load_repository
+from app.utils.utils_deadline import Deadline
+from app.utils.utils_singleflight import SingleFlight
+from app.utils.utils_snapshot import LoadSnapshot, SnapshotFile
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.0
+
+# (latitude, longitude)
+Point = Tuple[float, float]
+
+
+def haversine_miles(a: Point, b: Point) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(h)))
+
+
+def haversine_miles_array(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """haversine_miles between arrays (or an array and a point) of latitudes and longitudes"""
+    lat1, lng1, lat2, lng2 = np.radians(lat1), np.radians(lng1), np.radians(lat2), np.radians(lng2)
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.minimum(1.0, np.sqrt(h)))
+
+
+class ChainLoad:
+    """An open load reduced to what chaining needs; `finish` is when the truck is free again"""
+
+    __slots__ = ("snapshot", "index", "origin", "destination", "pickup", "finish", "loaded_miles", "rate")
+
+    def __init__(self, snapshot: LoadSnapshot, index: int, finish: float, loaded_miles: float):
+        columns = snapshot.columns
+        self.snapshot = snapshot
+        self.index = index
+        self.origin = (float(columns["origin_lat"][index]), float(columns["origin_lng"][index]))
+        self.destination = (float(columns["destination_lat"][index]), float(columns["destination_lng"][index]))
+        self.pickup = float(columns["pickup_epoch"][index])
+        self.finish = finish
+        self.loaded_miles = loaded_miles
+        rate = float(columns["loadboard_rate"][index])
+        self.rate = None if math.isnan(rate) else rate
+
+    @property
+    def row(self) -> Dict[str, Any]:
+        return self.snapshot.row(self.index)
+
+
+class LoadGraph:
+    """Open loads bucketed by (equipment type, grid cell of the origin)
+
+    Each bucket is a range of the load indices sorted by (equipment type,
+    cell, pickup time), so the candidates for the next leg are found by
+    looking at the few cells within the deadhead limit of the previous
+    drop-off and bisecting to the pickup window, with no database query per
+    leg. The graph only adds index arrays to its LoadSnapshot, which may be a
+    shared memory-mapped file. It is immutable once built; refreshes build a
+    new one and swap the reference.
+    """
+
+    def __init__(self, loads: Union[LoadSnapshot, List[Dict[str, Any]]], cell_miles: float, speed_mph: float):
+        self.snapshot = loads if isinstance(loads, LoadSnapshot) else LoadSnapshot.from_rows(loads)
+        self.built_at = self.snapshot.built_at
+        self.cell_degrees = cell_miles / MILES_PER_DEGREE
+        self.speed_mph = speed_mph
+
+        columns = self.snapshot.columns
+        origin_lat, origin_lng = columns["origin_lat"], columns["origin_lng"]
+        destination_lat, destination_lng = columns["destination_lat"], columns["destination_lng"]
+        pickup, delivery, miles = columns["pickup_epoch"], columns["delivery_epoch"], columns["miles"]
+        distance = haversine_miles_array(origin_lat, origin_lng, destination_lat, destination_lng)
+        self.loaded_miles = np.where(np.isnan(miles) | (miles == 0), distance, miles)
+        self.finish = np.where(delivery >= pickup, delivery, pickup + self.loaded_miles / speed_mph * 3600)
+
+        valid = ~(np.isnan(origin_lat) | np.isnan(origin_lng) | np.isnan(destination_lat) | np.isnan(destination_lng) | np.isnan(pickup))
+        indices = np.flatnonzero(valid & (columns["equipment_code"] >= 0))
+        equipment = columns["equipment_code"][indices]
+        cell_lat = np.floor(origin_lat[indices] / self.cell_degrees).astype(np.int64)
+        cell_lng = np.floor(origin_lng[indices] / self.cell_degrees).astype(np.int64)
+        order = np.lexsort((pickup[indices], cell_lng, cell_lat, equipment))
+        self.order = indices[order]
+        self.pickups = pickup[self.order]
+        self.size = len(self.order)
+
+        keys = np.stack((equipment[order], cell_lat[order], cell_lng[order]))
+        starts = np.flatnonzero(np.any(keys[:, 1:] != keys[:, :-1], axis=0)) + 1
+        starts = np.concatenate(([0], starts)) if self.size else starts
+        ends = np.append(starts[1:], self.size)
+        equipment_types = self.snapshot.equipment_types
+        self.buckets: Dict[Tuple[str, int, int], Tuple[int, int]] = {
+            (equipment_types[code], int(lat), int(lng)): (int(start), int(end))
+            for code, lat, lng, start, end in zip(keys[0, starts], keys[1, starts], keys[2, starts], starts, ends)
+        }
+
+    def _chain_load(self, index: int) -> ChainLoad:
+        return ChainLoad(self.snapshot, index, float(self.finish[index]), float(self.loaded_miles[index]))
+
+    def cell(self, point: Point) -> Tuple[int, int]:
+        return math.floor(point[0] / self.cell_degrees), math.floor(point[1] / self.cell_degrees)
+
+    def _nearby_cells(self, point: Point, radius_miles: float):
+        cell_lat, cell_lng = self.cell(point)
+        lat_rings = math.ceil(radius_miles / (self.cell_degrees * MILES_PER_DEGREE))
+        # Longitude degrees shrink with latitude; widen the ring so no cell within the radius is missed
+        lng_rings = math.ceil(radius_miles / (self.cell_degrees * MILES_PER_DEGREE * max(math.cos(math.radians(min(abs(point[0]) + radius_miles / MILES_PER_DEGREE, 89))), 0.01)))
+        for lat_offset in range(-lat_rings, lat_rings + 1):
+            for lng_offset in range(-lng_rings, lng_rings + 1):
+                yield cell_lat + lat_offset, cell_lng + lng_offset
+
+    def next_legs(self, equipment_type: str, position: Point, ready_at: float, exclude: set, max_deadhead: float, max_wait: float, branching: int, scan_limit: int) -> List[Tuple[float, ChainLoad]]:
+        """Up to `branching` loads reachable from `position` in time, fewest deadhead miles first; `exclude` holds load indices"""
+        ranges = []
+        for cell in self._nearby_cells(position, max_deadhead):
+            bucket = self.buckets.get((equipment_type,) + cell)
+            if bucket is None:
+                continue
+            first, last = bucket
+            pickups = self.pickups[first:last]
+            start = first + int(np.searchsorted(pickups, ready_at, "left"))
+            end = min(first + int(np.searchsorted(pickups, ready_at + max_wait, "right")), start + scan_limit)
+            if start < end:
+                ranges.append(self.order[start:end])
+        if not ranges:
+            return []
+
+        columns = self.snapshot.columns
+        indices = np.concatenate(ranges)
+        deadhead = haversine_miles_array(position[0], position[1], columns["origin_lat"][indices], columns["origin_lng"][indices])
+        # The truck has to reach the pickup in time driving empty
+        feasible = (deadhead <= max_deadhead) & (ready_at + deadhead / self.speed_mph * 3600 <= columns["pickup_epoch"][indices])
+        if exclude:
+            feasible &= ~np.isin(indices, list(exclude))
+        indices, deadhead = indices[feasible], deadhead[feasible]
+        nearest = np.argsort(deadhead, kind="stable")[:branching]
+        return [(float(deadhead[i]), self._chain_load(int(indices[i]))) for i in nearest]
+
+    def find_chains(self, equipment_type: str, origin: Point, home: Point, available_at: float, max_legs: int, deadline: Deadline, limit: int = 5) -> Tuple[List[Dict[str, Any]], bool]:
+        """Best chains of 1..max_legs loads from origin ending near home, by total deadhead miles
+
+        Depth-first over the `branching` nearest feasible next legs, so at most
+        branching + branching^2 + ... + branching^max_legs chains are scored.
+        Returns (chains, deadline_exceeded); once the deadline passes the
+        search stops and the chains found so far are ranked.
+        """
+        results = []
+        cut_short = False
+
+        def extend(chain: List[Tuple[float, ChainLoad]], position: Point, ready_at: float, deadhead_total: float):
+            nonlocal cut_short
+            if deadline.expired:
+                cut_short = True
+                return
+            exclude = {load.index for _, load in chain}
+            for deadhead, load in self.next_legs(equipment_type, position, ready_at, exclude, settings.chain_max_deadhead_miles, settings.chain_max_wait_hours * 3600, settings.chain_branching, settings.chain_scan_limit):
+                legs = chain + [(deadhead, load)]
+                return_deadhead = haversine_miles(load.destination, home)
+                total_rate = sum(leg.rate or 0 for _, leg in legs)
+                results.append((deadhead_total + deadhead + return_deadhead, -total_rate, len(results), legs, return_deadhead))
+                if len(legs) < max_legs:
+                    extend(legs, load.destination, load.finish, deadhead_total + deadhead)
+
+        extend([], origin, available_at, 0.0)
+        chains = []
+        for total_deadhead, negative_rate, _, legs, return_deadhead in heapq.nsmallest(limit, results):
+            chains.append({
+                "legs": [{"deadhead_miles": round(deadhead, 1), "load": load.row} for deadhead, load in legs],
+                "deadhead_miles": round(total_deadhead, 1),
+                "return_deadhead_miles": round(return_deadhead, 1),
+                "loaded_miles": round(sum(load.loaded_miles for _, load in legs), 1),
+                "total_rate": -negative_rate,
+            })
+        return chains, cut_short
+
+
+class LoadGraphStore:
+    """Current LoadGraph, rebuilt from the database every `refresh_interval` seconds
+
+    Built on first use (or during warm-up) and then in the background; a
+    request always uses the snapshot that was current when it started. With a
+    `snapshot_path` the open loads come from the snapshot file shared by all
+    workers, so a restarted worker maps it instead of reading every load
+    through the database, and only the worker that finds it stale rebuilds it.
+    """
+
+    def __init__(self, refresh_interval: float, page_size: int = 5000, snapshot_path: str = ""):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.snapshot_file = SnapshotFile(snapshot_path, refresh_interval) if snapshot_path else None
+        self.graph: Optional[LoadGraph] = None
+        self._flight = SingleFlight("load_graph")
+
+    async def _fetch_open_loads(self) -> List[Dict[str, Any]]:
+        rows, cursor = [], None
+        today = date.today()
+        while True:
+            page = await load_repository.list_open(cursor, self.page_size, today)
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            cursor = page[-1]["load_id"]
+
+    async def _build(self) -> LoadGraph:
+        start_time = time.perf_counter()
+        if self.snapshot_file is None:
+            snapshot = await asyncio.to_thread(LoadSnapshot.from_rows, await self._fetch_open_loads())
+        else:
+            snapshot = await self.snapshot_file.load(self._fetch_open_loads, self.graph.snapshot if self.graph else None)
+            if self.graph is not None and snapshot is self.graph.snapshot:
+                return self.graph
+        graph = await asyncio.to_thread(LoadGraph, snapshot, settings.chain_cell_miles, settings.chain_average_speed_mph)
+        self.graph = graph
+        logger.info("Built load graph with %s open loads in %s buckets in %.3fs", graph.size, len(graph.buckets), time.perf_counter() - start_time)
+        return graph
+
+    async def refresh(self) -> LoadGraph:
+        return await self._flight.do("build", self._build)
+
+    async def get(self) -> LoadGraph:
+        return self.graph or await self.refresh()
+
+    async def run_refresh_loop(self):
+        """Rebuild the snapshot every refresh_interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Error refreshing load graph: %s", e)
+
+
+# Global snapshot used by /loads/chains
+load_graph = LoadGraphStore(settings.chain_refresh_seconds, snapshot_path=settings.load_snapshot_path)
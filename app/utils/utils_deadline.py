@@ -0,0 +1,68 @@
+import asyncio
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """Time budget of one request, shared by the stages it runs
+
+    Created when the request arrives; each stage gets whatever is left via
+    `wait()`, which raises asyncio.TimeoutError once the budget is spent. A
+    budget of None or 0 means no limit.
+    """
+
+    def __init__(self, budget: Optional[float] = None, started: Optional[float] = None):
+        self.started = time.monotonic() if started is None else started
+        self.expires_at = self.started + budget if budget else None
+
+    @classmethod
+    def from_milliseconds(cls, budget_ms: Optional[float], started: Optional[float] = None) -> "Deadline":
+        return cls(budget_ms / 1000 if budget_ms and budget_ms > 0 else None, started)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a limit"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def allows(self, seconds: float) -> bool:
+        """Whether a stage expected to take `seconds` can still finish in time"""
+        remaining = self.remaining()
+        return remaining is None or remaining >= seconds
+
+    async def wait(self, awaitable: Awaitable[T]) -> T:
+        """Await within the remaining budget; raises asyncio.TimeoutError once it runs out"""
+        return await asyncio.wait_for(awaitable, timeout=self.remaining())
+
+
+class StageEstimate:
+    """Moving estimate of how long a stage takes, used to skip stages that cannot fit the budget
+
+    Tracks an exponentially weighted mean and mean absolute deviation of
+    observed durations; `value` is mean + 2 deviations, a cheap stand-in for a
+    high percentile.
+    """
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.mean: Optional[float] = None
+        self.deviation = 0.0
+
+    def observe(self, seconds: float):
+        if self.mean is None:
+            self.mean = seconds
+            return
+        self.deviation += self.alpha * (abs(seconds - self.mean) - self.deviation)
+        self.mean += self.alpha * (seconds - self.mean)
+
+    @property
+    def value(self) -> float:
+        if self.mean is None:
+            return 0.0
+        return self.mean + 2 * self.deviation
@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+import logging
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Columns of the metrics table in export order, with the Arrow type used for each one
+METRICS_EXPORT_COLUMNS = [
+    ("id", "int64"),
+    ("created_at", "string"),
+    ("run_id", "string"),
+    ("organization_id", "string"),
+    ("call_outcome", "string"),
+    ("carrier_sentiment", "string"),
+    ("call_status", "string"),
+    ("call_duration", "float64"),
+    ("load_loadboard_rate", "float64"),
+    ("carrier_initial_offer", "float64"),
+    ("load_agreed_rate", "float64"),
+    ("negotiation_attempts", "int64"),
+    ("negotiation_performance", "float64"),
+    ("rate_difference", "float64"),
+]
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what has been written since the last drain.
+
+    Arrow and Parquet writers expect a file; this one keeps only the bytes of the
+    current page in memory while still reporting the absolute position via tell().
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        written = self._buffer.write(data)
+        self._position += written
+        return written
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def readable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer = io.BytesIO()
+        return data
+
+
+def _coerce(value: Any, arrow_type: str):
+    """Coerce a raw Supabase value to the Python type expected by the export column"""
+    if value is None or value == "":
+        return None
+    try:
+        if arrow_type == "int64":
+            return int(value)
+        if arrow_type == "float64":
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+def _normalize_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {name: _coerce(row.get(name), arrow_type) for name, arrow_type in METRICS_EXPORT_COLUMNS}
+        for row in rows
+    ]
+
+
+def _load_pyarrow():
+    """Import pyarrow lazily; it is only needed for the columnar export formats"""
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("pyarrow is required for arrow and parquet exports") from e
+    return pyarrow
+
+
+def pyarrow_available() -> bool:
+    try:
+        _load_pyarrow()
+        return True
+    except RuntimeError:
+        return False
+
+
+async def stream_csv(pages: AsyncIterable[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encode pages of metrics rows as CSV, one chunk per page"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in METRICS_EXPORT_COLUMNS], extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue().encode("utf-8")
+
+    async for rows in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_normalize_rows(rows))
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def stream_ndjson(pages: AsyncIterable[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encode pages of rows as newline-delimited JSON, one chunk per page"""
+    async for rows in pages:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in rows).encode("utf-8")
+
+
+async def stream_columnar(pages: AsyncIterable[List[Dict[str, Any]]], export_format: str) -> AsyncIterator[bytes]:
+    """Encode pages of metrics rows as an Arrow IPC stream or a Parquet file, one record batch per page"""
+    pa = _load_pyarrow()
+    schema = pa.schema([(name, getattr(pa, arrow_type)()) for name, arrow_type in METRICS_EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    output = pa.PythonFile(sink, mode="w")
+
+    if export_format == "parquet":
+        writer = pa.parquet.ParquetWriter(output, schema)
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+
+    try:
+        async for rows in pages:
+            batch = pa.RecordBatch.from_pylist(_normalize_rows(rows), schema=schema)
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    except BaseException:
+        writer.close()
+        raise
+
+    # Closing writes the end-of-stream marker (Arrow) or the file footer (Parquet)
+    writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -0,0 +1,244 @@
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.repositories import load_repository
+from app.supabase import CSV_COLUMN_TYPES
+from app.utils.utils_loads import get_coordinates, normalize_location
+from app.utils.utils_negative_cache import empty_lanes
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Columns of the loads table accepted from import files; anything else is ignored
+LOAD_COLUMNS = (
+    "load_id", "origin_city", "origin_state", "destination_city", "destination_state",
+    "pickup_datetime", "delivery_datetime", "equipment_type", "loadboard_rate", "notes",
+    "weight", "commodity_type", "num_of_pieces", "miles", "dimensions",
+    "origin_lat", "origin_lng", "destination_lat", "destination_lng",
+)
+REQUIRED_LOAD_COLUMNS = ("origin_city", "destination_city", "equipment_type", "pickup_datetime")
+
+# Per-row errors returned in the report; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+# (city, state) of an origin or destination
+Place = Tuple[str, Optional[str]]
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the import goes on without it"""
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Decode UTF-8 byte chunks (BOM tolerated) into lines as they arrive"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_csv_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (line number, row or RowError) from a CSV stream with a header line
+
+    Records are assembled line by line until their quotes balance, so quoted
+    fields may contain newlines while only one record is held in memory.
+    """
+    header: Optional[List[str]] = None
+    record, record_line, line_number = "", 0, 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not record:
+            record_line = line_number
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, record = record.rstrip("\r"), ""
+        if not text.strip():
+            continue
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [field.strip() for field in fields]
+            continue
+        if len(fields) != len(header):
+            yield record_line, RowError(f"expected {len(header)} fields, got {len(fields)}")
+            continue
+        yield record_line, dict(zip(header, fields))
+    if record:
+        yield record_line, RowError("unterminated quoted field")
+
+
+async def iter_ndjson_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (line number, row or RowError) from a stream of JSON objects, one per line"""
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f"invalid JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else RowError("expected a JSON object")
+
+
+def normalize_load_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate and type one imported row; raises RowError"""
+    column_types = CSV_COLUMN_TYPES["loads"]
+    row: Dict[str, Any] = {}
+    for column in LOAD_COLUMNS:
+        value = raw.get(column)
+        if isinstance(value, str):
+            value = value.strip() or None
+        if value is not None and column in column_types:
+            try:
+                value = column_types[column](value)
+            except (TypeError, ValueError):
+                raise RowError(f"{column} is not a number: {value!r}") from None
+        row[column] = value
+
+    missing = [column for column in REQUIRED_LOAD_COLUMNS if row[column] is None]
+    if missing:
+        raise RowError(f"missing {', '.join(missing)}")
+
+    # Stored the way searches normalize it (see process_parameters)
+    row["equipment_type"] = str(row["equipment_type"]).lower().replace(" ", "")
+    for column in ("pickup_datetime", "delivery_datetime"):
+        if row[column] is not None:
+            try:
+                row[column] = datetime.fromisoformat(str(row[column])).isoformat()
+            except ValueError:
+                raise RowError(f"{column} is not an ISO datetime: {row[column]!r}") from None
+    row["load_id"] = str(row["load_id"]) if row["load_id"] is not None else str(uuid.uuid4())
+    return row
+
+
+def _place(city: str, state: Optional[str]) -> Place:
+    return normalize_location(city), normalize_location(state)
+
+
+class LoadImport:
+    """One streaming import of loads
+
+    Rows are parsed as they arrive and handled in chunks of `batch_size`. The
+    origin and destination places of a chunk that are not yet known are
+    geocoded concurrently, each unique place once per import (and through the
+    shared geocode cache, once across imports), then the chunk is inserted in
+    one batch. Rows that already carry coordinates are not geocoded. Bad rows,
+    unresolvable places and failed batches are reported per row without
+    stopping the import.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, geocode_concurrency: Optional[int] = None):
+        self.batch_size = batch_size or settings.import_batch_size
+        self._geocode_slots = asyncio.Semaphore(geocode_concurrency or settings.nominatim_max_concurrency)
+        self._places: Dict[Place, Tuple[Optional[float], Optional[float]]] = {}
+        self.rows_read = 0
+        self.inserted = 0
+        self.failed = 0
+        self.places_geocoded = 0
+        self.places_unresolved = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def _error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    async def _geocode(self, place: Place, city: str, state: Optional[str]):
+        async with self._geocode_slots:
+            coordinates = await get_coordinates(city, state)
+        self._places[place] = coordinates
+        if coordinates[0] is None:
+            self.places_unresolved += 1
+        else:
+            self.places_geocoded += 1
+
+    async def _resolve_places(self, rows: List[Tuple[int, Dict[str, Any]]]):
+        pending: Dict[Place, Tuple[str, Optional[str]]] = {}
+        for _, row in rows:
+            for prefix in ("origin", "destination"):
+                if row[f"{prefix}_lat"] is not None and row[f"{prefix}_lng"] is not None:
+                    continue
+                place = _place(row[f"{prefix}_city"], row[f"{prefix}_state"])
+                if place not in self._places:
+                    pending.setdefault(place, (row[f"{prefix}_city"], row[f"{prefix}_state"]))
+        if pending:
+            await asyncio.gather(*(self._geocode(place, city, state) for place, (city, state) in pending.items()))
+
+    async def _flush(self, rows: List[Tuple[int, Dict[str, Any]]]):
+        await self._resolve_places(rows)
+        batch, lines = [], []
+        for line, row in rows:
+            for prefix in ("origin", "destination"):
+                if row[f"{prefix}_lat"] is None or row[f"{prefix}_lng"] is None:
+                    row[f"{prefix}_lat"], row[f"{prefix}_lng"] = self._places[_place(row[f"{prefix}_city"], row[f"{prefix}_state"])]
+            unresolved = [prefix for prefix in ("origin", "destination") if row[f"{prefix}_lat"] is None]
+            if unresolved:
+                self._error(line, f"could not geocode {' and '.join(unresolved)}")
+                continue
+            batch.append(row)
+            lines.append(line)
+        if not batch:
+            return
+        try:
+            await load_repository.insert_many(batch)
+            self.inserted += len(batch)
+            # Searches around the new loads must not be answered from the empty-lane cache
+            empty_lanes.invalidate(batch)
+        except Exception as e:
+            logger.error("Error inserting import batch of %s loads: %s", len(batch), e)
+            for line in lines:
+                self._error(line, f"insert failed: {e}")
+
+    async def run(self, rows: AsyncIterable[Tuple[int, Any]]) -> Dict[str, Any]:
+        """Import (line number, raw row or RowError) pairs and return the report"""
+        start_time = time.perf_counter()
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+        async for line, raw in rows:
+            self.rows_read += 1
+            try:
+                if isinstance(raw, RowError):
+                    raise raw
+                chunk.append((line, normalize_load_row(raw)))
+            except RowError as e:
+                self._error(line, str(e))
+            if len(chunk) >= self.batch_size:
+                await self._flush(chunk)
+                chunk = []
+        if chunk:
+            await self._flush(chunk)
+
+        seconds = time.perf_counter() - start_time
+        logger.info("Load import finished in %.3fs - read: %s, inserted: %s, failed: %s, places geocoded: %s", seconds, self.rows_read, self.inserted, self.failed, self.places_geocoded)
+        return {
+            "rows_read": self.rows_read,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "places_geocoded": self.places_geocoded,
+            "places_unresolved": self.places_unresolved,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+        }
+
+
+async def import_loads(chunks: AsyncIterable[bytes], format: str = "csv", batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Stream-import a CSV or NDJSON load file given as byte chunks"""
+    rows = iter_csv_rows(chunks) if format == "csv" else iter_ndjson_rows(chunks)
+    return await LoadImport(batch_size).run(rows)
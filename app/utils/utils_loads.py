@@ -1,37 +1,161 @@
-from geopy.geocoders import Nominatim
-import geopy.geocoders
 from math import radians, cos
-from app.supabase import supabase
-from datetime import datetime, date
+from app.repositories import BoundingBox, LoadSearch, load_repository, pickup_distance
+from app.instrumentation import span
+from app.utils.utils_singleflight import SingleFlight
+from app.utils.utils_cache import GEOCODE_NAMESPACE, cache
+from app.utils.utils_traffic import recent_origins
+from app.utils.utils_resilience import CircuitOpenError, nominatim
+from app.utils.utils_deadline import Deadline, StageEstimate
+from app.utils.utils_sessions import CallSession
+from app.utils.utils_negative_cache import Lane, empty_lanes, lane_cell
+from app.utils.utils_reservations import reservations
+from app.config import settings
+from datetime import datetime, date, timedelta, timezone
 
+import asyncio
 import logging
+import time
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
-geopy.geocoders.options.default_timeout = 3
-geolocator = Nominatim(user_agent="load-matcher")
-logger.debug("Initialized Nominatim geolocator for load matching")
+# Created on first use by get_geolocator(); importing geopy is a large share of app import time
+geolocator = None
 
-def get_coordinates(city: str, state: str | None = None):
-    """Get latitude and longitude coordinates for a city"""
+def get_geolocator():
+    """Return the Nominatim geolocator, importing geopy and creating it on first use"""
+    global geolocator
+    if geolocator is None:
+        import geopy.geocoders
+        from geopy.geocoders import Nominatim
+
+        geopy.geocoders.options.default_timeout = 3
+        geolocator = Nominatim(user_agent="load-matcher")
+        logger.debug("Initialized Nominatim geolocator for load matching")
+    return geolocator
+
+def normalize_location(location: str | None) -> str | None:
+    """Case- and whitespace-insensitive form of a location used in cache and coalescing keys"""
+    if location is None:
+        return None
+    return " ".join(location.lower().replace(",", ", ").split()) or None
+
+async def _geocode(query: str, cache_key: str):
+    """Geocode through Nominatim and cache the result; (None, None) when the place is unknown"""
+    with span("get_coordinates"):
+        # geopy is blocking: run it in a thread, behind the Nominatim breaker and bulkhead
+        location = await nominatim.call(lambda: asyncio.to_thread(get_geolocator().geocode, query), idempotent=True)
+    if not location:
+        return None, None
+    await cache.set(GEOCODE_NAMESPACE, cache_key, [location.latitude, location.longitude], settings.geocode_cache_ttl)
+    return location.latitude, location.longitude
+
+def _retrieve_exception(task: asyncio.Task):
+    # Geocodes abandoned at a deadline finish in the background; their errors were already logged or counted
+    if not task.cancelled():
+        task.exception()
+
+async def get_coordinates(city: str, state: str | None = None, deadline: Deadline | None = None, session: CallSession | None = None):
+    """Get latitude and longitude coordinates for a city
+
+    With a deadline, the lookup is abandoned once the budget runs out and
+    (None, None) is returned; the geocode itself keeps running and caches its
+    result, so a retry of the same search finds it. With a call session,
+    places the call already resolved are answered from the session.
+    """
     query = f"{city}, {state}" if state else city
-    logger.debug(f"Getting coordinates for: {query}")
+    logger.debug("Getting coordinates for: %s", query)
+
+    cache_key = normalize_location(query)
+    if session is not None:
+        remembered = session.lookup("geocode", session.geocodes, cache_key)
+        if remembered is not None:
+            return remembered
+    cached = await cache.get(GEOCODE_NAMESPACE, cache_key)
+    if cached is not None:
+        logger.debug("Using cached coordinates for %s: lat=%s, lng=%s", query, cached[0], cached[1])
+        if session is not None:
+            session.geocodes[cache_key] = (cached[0], cached[1])
+        return cached[0], cached[1]
     
     try:
-        location = geolocator.geocode(query)
-        if location:
-            logger.debug(f"Found coordinates for {query}: lat={location.latitude}, lng={location.longitude}")
-            return location.latitude, location.longitude
+        if deadline is None or deadline.remaining() is None:
+            latitude, longitude = await _geocode(query, cache_key)
         else:
-            logger.warning(f"No coordinates found for: {query}")
-            return None, None
+            task = asyncio.ensure_future(_geocode(query, cache_key))
+            task.add_done_callback(_retrieve_exception)
+            latitude, longitude = await deadline.wait(asyncio.shield(task))
+        if latitude is not None:
+            logger.debug("Found coordinates for %s: lat=%s, lng=%s", query, latitude, longitude)
+            if session is not None:
+                session.geocodes[cache_key] = (latitude, longitude)
+        else:
+            logger.warning("No coordinates found for: %s", query)
+        return latitude, longitude
             
+    except asyncio.TimeoutError:
+        logger.warning("Deadline reached while geocoding %s", query)
+        return None, None
+    except CircuitOpenError as e:
+        logger.warning("Skipping geocode of %s: %s", query, e)
+        return None, None
     except Exception as e:
-        logger.error(f"Error getting coordinates for {query}: {str(e)}")
+        logger.error("Error getting coordinates for %s: %s", query, str(e))
         return None, None
 
-def generate_query(equipment_type: str, origin_min_lat: float, origin_max_lat: float, origin_min_lng: float, origin_max_lng: float, destination_min_lat: float | None = None, destination_max_lat: float | None = None, destination_min_lng: float | None = None, destination_max_lng: float | None = None, pickup_datetime: datetime | None = None):
+# Pickup windows other than a number of hours either side of the requested time
+PICKUP_WINDOW_MODES = ("same_day", "exact")
+
+def parse_pickup_window(value: str | None = None) -> str | float:
+    """Validate a pickup window: "same_day", "exact" or hours either side; defaults to PICKUP_WINDOW"""
+    value = (value or settings.pickup_window).strip().lower()
+    if value in PICKUP_WINDOW_MODES:
+        return value
+    try:
+        hours = float(value)
+    except ValueError:
+        raise ValueError(f"Invalid pickup window: {value}") from None
+    if hours < 0:
+        raise ValueError(f"Invalid pickup window: {value}")
+    return hours
+
+def _as_utc(value: datetime) -> datetime:
+    """Naive UTC form of a datetime, so offset-aware and naive pickup times compare"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def pickup_window_bounds(pickup_datetime: datetime, pickup_window: str | float) -> tuple[datetime, datetime]:
+    """[start, end] pickup times matched for a requested pickup; same_day is the requested calendar day"""
+    if pickup_window == "same_day":
+        start = pickup_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
+        return _as_utc(start), _as_utc(start + timedelta(days=1) - timedelta(microseconds=1))
+    hours = 0.0 if pickup_window == "exact" else pickup_window
+    pickup = _as_utc(pickup_datetime)
+    return pickup - timedelta(hours=hours), pickup + timedelta(hours=hours)
+
+def pickup_offset_hours(load: dict, pickup_datetime: datetime) -> float | None:
+    """Hours between a load's pickup and the requested pickup (positive when the load is later)"""
+    value = load.get("pickup_datetime")
+    if not value:
+        return None
+    try:
+        load_pickup = _as_utc(datetime.fromisoformat(str(value)))
+    except ValueError:
+        return None
+    return round((load_pickup - _as_utc(pickup_datetime)).total_seconds() / 3600, 2)
+
+def _with_pickup_offsets(loads_data: list, pickup_datetime: datetime | None, limit: int | None = None) -> list:
+    """Annotate loads with pickup_offset_hours; with a limit, keep the `limit` closest to the requested pickup"""
+    if pickup_datetime is None:
+        return loads_data
+    loads_data = [{**load, "pickup_offset_hours": pickup_offset_hours(load, pickup_datetime)} for load in loads_data]
+    if limit is not None:
+        loads_data.sort(key=lambda load: abs(load["pickup_offset_hours"]) if load["pickup_offset_hours"] is not None else float("inf"))
+        loads_data = loads_data[:limit]
+    return loads_data
+
+def generate_query(equipment_type: str, origin_min_lat: float, origin_max_lat: float, origin_min_lng: float, origin_max_lng: float, destination_min_lat: float | None = None, destination_max_lat: float | None = None, destination_min_lng: float | None = None, destination_max_lng: float | None = None, pickup_datetime: datetime | None = None, pickup_window: str | float | None = None) -> LoadSearch | None:
     """Generate a query based on the parameters"""
     # Determine what parameters are actually available
     has_destination = destination_min_lat is not None and destination_max_lat is not None and destination_min_lng is not None and destination_max_lng is not None
@@ -39,97 +163,37 @@ def generate_query(equipment_type: str, origin_min_lat: float, origin_max_lat: f
     if isinstance(pickup_datetime, str) and pickup_datetime.strip() == "":
         pickup_datetime = None
     has_pickup_datetime = pickup_datetime is not None
-    logger.debug(f"Has Destination: {has_destination}, Has Pickup Datetime: {has_pickup_datetime}")
+    logger.debug("Has Destination: %s, Has Pickup Datetime: %s", has_destination, has_pickup_datetime)
     
     # Always filter out loads with pickup_datetime < today
     today = date.today()
-    logger.debug(f"Filtering loads with pickup_datetime >= {today}")
-    
-    # if only equipment_type, origin_lat and origin_lng are provided
-    if has_destination and has_pickup_datetime:
-        # All parameters - check if specific pickup_datetime is >= today
-        if isinstance(pickup_datetime, datetime):
-            pickup_date = pickup_datetime.date()
-        elif isinstance(pickup_datetime, str):
-            pickup_date = datetime.fromisoformat(pickup_datetime).date()
-        else:
-            pickup_date = pickup_datetime
+    logger.debug("Filtering loads with pickup_datetime >= %s", today)
     
-        
-        # All parameters
-        query = (
-            supabase.table("loads")
-            .select("*")
-            .eq("equipment_type", equipment_type)
-            .gte("origin_lat", origin_min_lat)
-            .lte("origin_lat", origin_max_lat)
-            .gte("origin_lng", origin_min_lng)
-            .lte("origin_lng", origin_max_lng)
-            .gte("destination_lat", destination_min_lat)
-            .lte("destination_lat", destination_max_lat)
-            .gte("destination_lng", destination_min_lng)
-            .lte("destination_lng", destination_max_lng)
-            .eq("pickup_datetime", pickup_datetime)
-            .gte("pickup_datetime", today)
-            .limit(3)
-        )
-    elif has_destination and not has_pickup_datetime:
-        # Equipment + Origin + Destination
-        query = (
-            supabase.table("loads")
-            .select("*")
-            .eq("equipment_type", equipment_type)
-            .gte("origin_lat", origin_min_lat)
-            .lte("origin_lat", origin_max_lat)
-            .gte("origin_lng", origin_min_lng)
-            .lte("origin_lng", origin_max_lng)
-            .gte("destination_lat", destination_min_lat)
-            .lte("destination_lat", destination_max_lat)
-            .gte("destination_lng", destination_min_lng)
-            .lte("destination_lng", destination_max_lng)
-            .gte("pickup_datetime", today)
-            .limit(3)
-        )
-    elif not has_destination and has_pickup_datetime:
-        # Equipment + Origin + pickup_datetime - check if specific pickup_datetime is >= today
-        if isinstance(pickup_datetime, datetime):
-            pickup_date = pickup_datetime.date()
-        elif isinstance(pickup_datetime, str):
-            pickup_date = datetime.fromisoformat(pickup_datetime).date()
-        else:
-            pickup_date = pickup_datetime
-        
-        if pickup_date < today:
-            logger.debug(f"Specific pickup_datetime {pickup_datetime} is in the past, returning empty results")
+    pickup_bounds = None
+    if has_pickup_datetime:
+        if isinstance(pickup_datetime, str):
+            pickup_datetime = datetime.fromisoformat(pickup_datetime)
+        elif not isinstance(pickup_datetime, datetime):
+            pickup_datetime = datetime.combine(pickup_datetime, datetime.min.time())
+        # Match a window around the requested pickup instead of the exact timestamp
+        pickup_bounds = pickup_window_bounds(pickup_datetime, parse_pickup_window() if pickup_window is None else pickup_window)
+
+        # Check if the pickup window ends on or after today
+        if pickup_bounds[1].date() < today:
+            logger.debug("Pickup window of %s is in the past, returning empty results", pickup_datetime)
             return None  # Return None to indicate no query should be executed
-        
-        # Equipment + Origin + pickup_datetime
-        query = (
-            supabase.table("loads")
-            .select("*")
-            .eq("equipment_type", equipment_type)
-            .gte("origin_lat", origin_min_lat)
-            .lte("origin_lat", origin_max_lat)
-            .gte("origin_lng", origin_min_lng)
-            .lte("origin_lng", origin_max_lng)
-            .eq("pickup_datetime", pickup_datetime)
-            .gte("pickup_datetime", today)
-            .limit(3)
-        )
-    else:
-        # Equipment + Origin only
-        query = (
-            supabase.table("loads")
-            .select("*")
-            .eq("equipment_type", equipment_type)
-            .gte("origin_lat", origin_min_lat)
-            .lte("origin_lat", origin_max_lat)
-            .gte("origin_lng", origin_min_lng)
-            .lte("origin_lng", origin_max_lng)
-            .gte("pickup_datetime", today)
-            .limit(3)
-        )
-    logger.debug(f"Generated query: {query}")    
+    
+    query = LoadSearch(
+        equipment_type=equipment_type,
+        origin_box=(origin_min_lat, origin_max_lat, origin_min_lng, origin_max_lng),
+        destination_box=(destination_min_lat, destination_max_lat, destination_min_lng, destination_max_lng) if has_destination else None,
+        pickup_window=pickup_bounds,
+        pickup_target=_as_utc(pickup_datetime) if has_pickup_datetime else None,
+        min_pickup_date=today,
+        # Extra loads from the window are ranked by distance from the requested time and cut to 3
+        limit=settings.pickup_window_candidates if has_pickup_datetime else 3,
+    )
+    logger.debug("Generated query: %s", query)    
     return query
 
 def get_bounding_box(lat: float, lng: float, radius: float) -> tuple[float, float, float, float]:
@@ -140,54 +204,191 @@ def get_bounding_box(lat: float, lng: float, radius: float) -> tuple[float, floa
     lng_delta = radius / (cos(radians(lat)) * 69)
     return lat - lat_delta, lat + lat_delta, lng - lng_delta, lng + lng_delta
 
-def find_loads_within_radius(equipment_type: str, origin: str, destination: str | None = None, pickup_datetime: str | None = None):
+class PrefetchedLoads:
+    """Every open load of one equipment type in one origin box, searched in memory
+
+    Serves the same LoadSearch filters as the loads repository for searches
+    with that equipment type and origin box, so a call's later searches
+    (other destinations or pickup times) need no database round trip.
+    """
+
+    def __init__(self, equipment_type: str, origin_box: BoundingBox, loads: list):
+        self.equipment_type = equipment_type
+        self.origin_box = origin_box
+        self.loads = loads
+
+    def covers(self, search: LoadSearch) -> bool:
+        return search.equipment_type == self.equipment_type and search.origin_box == self.origin_box
+
+    async def search(self, search: LoadSearch) -> list:
+        matched = []
+        for load in self.loads:
+            if load.get("booking_id"):
+                continue
+            if search.destination_box is not None:
+                min_lat, max_lat, min_lng, max_lng = search.destination_box
+                lat, lng = load.get("destination_lat"), load.get("destination_lng")
+                if lat is None or lng is None or not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                    continue
+            if search.pickup_window is not None or search.min_pickup_date is not None:
+                try:
+                    pickup = _as_utc(datetime.fromisoformat(str(load.get("pickup_datetime"))))
+                except ValueError:
+                    continue
+                if search.pickup_window is not None and not search.pickup_window[0] <= pickup <= search.pickup_window[1]:
+                    continue
+                if search.min_pickup_date is not None and pickup.date() < search.min_pickup_date:
+                    continue
+            matched.append(load)
+            if len(matched) >= search.limit and search.pickup_target is None:
+                break
+        if search.pickup_target is not None:
+            matched.sort(key=lambda load: pickup_distance(load, search.pickup_target))
+        return matched[:search.limit]
+
+async def _prefetch_origin(equipment_type: str, origin_box: BoundingBox) -> PrefetchedLoads | None:
+    """Fetch the open loads of an origin box for a call session; None when there are more than SESSION_PREFETCH_LIMIT"""
+    limit = settings.session_prefetch_limit
+    with span("find_loads.prefetch"):
+        loads = await load_repository.search(LoadSearch(equipment_type=equipment_type, origin_box=origin_box, min_pickup_date=date.today(), limit=limit + 1))
+    logger.debug("Prefetched %s loads for %s", len(loads), equipment_type)
+    # A truncated set could miss loads the database would return
+    return PrefetchedLoads(equipment_type, origin_box, loads) if len(loads) <= limit else None
+
+# Duration of one search attempt, used to skip relaxation attempts that cannot finish within the deadline
+search_attempt_estimate = StageEstimate()
+
+def _attempt_lanes(equipment_type: str, origin: tuple[float, float], destination: tuple[float, float] | None, pickup_datetime: datetime | None, pickup_window: str | float | None) -> dict[str, Lane]:
+    """Empty-lane cache keys of the search attempts a search will run, by attempt name
+
+    Origin and destination are the geocoded (lat, lng) of the search.
+    """
+    today = date.today()
+    origin_key, destination_key = lane_cell(*origin), lane_cell(*destination) if destination is not None else None
+    pickup_bounds = None
+    if pickup_datetime is not None:
+        if not isinstance(pickup_datetime, datetime):
+            pickup_datetime = datetime.combine(pickup_datetime, datetime.min.time())
+        pickup_bounds = pickup_window_bounds(pickup_datetime, parse_pickup_window() if pickup_window is None else pickup_window)
+    lanes = {"attempt_1": (today, equipment_type, origin_key, destination_key, pickup_bounds)}
+    if pickup_bounds is not None:
+        lanes["attempt_2"] = (today, equipment_type, origin_key, destination_key, None)
+    if destination_key is not None:
+        lanes["attempt_3"] = (today, equipment_type, origin_key, None, None)
+    return lanes
+
+async def _search_attempt(name: str, query: LoadSearch | None, deadline: Deadline, prefetched: PrefetchedLoads | None = None, lane: Lane | None = None, known_empty: bool = False):
+    """Run one search attempt within the deadline; None if it was skipped or cut short
+
+    Attempts covered by the call's prefetched loads are answered from memory.
+    An attempt the empty-lane cache knows to find nothing (known_empty) is
+    skipped, and with a lane one that finds nothing is recorded there.
+    """
+    if query is None:
+        logger.debug("%s: Query returned None (specific pickup_datetime is in the past)", name)
+        return []
+    if known_empty:
+        logger.debug("%s skipped - lane recently found no loads", name)
+        return []
+    generation = empty_lanes.generation
+    if prefetched is not None and prefetched.covers(query):
+        loads_data = await prefetched.search(query)
+        logger.debug("%s returned %s prefetched loads", name, len(loads_data))
+        if not loads_data and lane is not None:
+            empty_lanes.record(lane, query.origin_box, generation)
+        return loads_data
+    if not deadline.allows(search_attempt_estimate.value):
+        logger.info("%s skipped - %.3fs left, attempts take ~%.3fs", name, deadline.remaining(), search_attempt_estimate.value)
+        return None
+    start_time = time.perf_counter()
+    try:
+        with span(f"find_loads.{name}"):
+            loads_data = await deadline.wait(load_repository.search(query))
+    except asyncio.TimeoutError:
+        logger.info("%s cut short by the deadline", name)
+        return None
+    search_attempt_estimate.observe(time.perf_counter() - start_time)
+    logger.debug("%s returned %s loads", name, len(loads_data))
+    if not loads_data and lane is not None:
+        empty_lanes.record(lane, query.origin_box, generation)
+    return loads_data
+
+async def find_loads_within_radius(equipment_type: str, origin: str, destination: str | None = None, pickup_datetime: datetime | str | None = None, deadline: Deadline | None = None, pickup_window: str | float | None = None, session: CallSession | None = None):
     """Find loads within a specified radius of the origin location
 
-    Returns a tuple: (loads_data, omitted_parameters)
+    Returns a tuple: (loads_data, omitted_parameters, deadline_exceeded)
     omitted_parameters lists which provided filters were dropped in the successful attempt.
+    With a pickup_datetime, the first attempt matches loads picked up within
+    pickup_window (default PICKUP_WINDOW) of it, closest first, and every
+    load carries pickup_offset_hours from the requested time.
+    deadline_exceeded is True when geocoding or attempts were skipped or cut
+    short because the request's time budget ran out.
+    With a call session, geocodes come from the session when the call already
+    resolved them, and once the origin is known every open load around it is
+    prefetched so the call's later searches from that origin run in memory.
     """
-    logger.debug(f"Starting load search - Equipment: {equipment_type}, Origin: {origin}")
-    logger.debug(f"Optional parameters - Destination: {destination}, Pickup: {pickup_datetime}")
+    deadline = deadline or Deadline()
+    logger.debug("Starting load search - Equipment: %s, Origin: %s", equipment_type, origin)
+    logger.debug("Optional parameters - Destination: %s, Pickup: %s", destination, pickup_datetime)
     
     try:
+        # Defensive: treat empty-string-like pickup as absent
+        if isinstance(pickup_datetime, str):
+            pickup_datetime = datetime.fromisoformat(pickup_datetime) if pickup_datetime.strip() else None
+
         # Get coordinates for origin
-        logger.debug(f"Getting coordinates for origin: {origin}")
-        origin_lat, origin_lng = get_coordinates(origin)
+        logger.debug("Getting coordinates for origin: %s", origin)
+        origin_lat, origin_lng = await get_coordinates(origin, deadline=deadline, session=session)
         
         if not origin_lat or not origin_lng:
-            logger.warning(f"Could not get coordinates for origin: {origin}")
+            logger.warning("Could not get coordinates for origin: %s", origin)
             logger.debug("Returning empty loads list due to coordinate lookup failure")
-            return [], []
+            return [], [], deadline.expired
         
-        logger.debug(f"Origin coordinates: lat={origin_lat}, lng={origin_lng}")
+        logger.debug("Origin coordinates: lat=%s, lng=%s", origin_lat, origin_lng)
         
         # Default radius in miles
         DEFAULT_RADIUS_MILES = 100  
-        logger.debug(f"Using search radius: {DEFAULT_RADIUS_MILES} miles")
+        logger.debug("Using search radius: %s miles", DEFAULT_RADIUS_MILES)
         
         # get origin bounding box
         origin_min_lat, origin_max_lat, origin_min_lng, origin_max_lng = get_bounding_box(origin_lat, origin_lng, DEFAULT_RADIUS_MILES)
         
-        logger.debug(f"Search bounding box - Lat: {origin_min_lat:.4f} to {origin_max_lat:.4f}")
-        logger.debug(f"Search bounding box - Lng: {origin_min_lng:.4f} to {origin_max_lng:.4f}")
+        logger.debug("Search bounding box - Lat: %.4f to %.4f", origin_min_lat, origin_max_lat)
+        logger.debug("Search bounding box - Lng: %.4f to %.4f", origin_min_lng, origin_max_lng)
+
         # ger coordinates for destination
         if destination:
-            destination_lat, destination_lng = get_coordinates(destination)
+            destination_lat, destination_lng = await get_coordinates(destination, deadline=deadline, session=session)
             if not destination_lat or not destination_lng:
-                logger.warning(f"Could not get coordinates for destination: {destination}")
+                logger.warning("Could not get coordinates for destination: %s", destination)
                 logger.debug("Returning empty loads list due to coordinate lookup failure")
-                return [], []
-            logger.debug(f"Destination coordinates: lat={destination_lat}, lng={destination_lng}")
+                return [], [], deadline.expired
+            logger.debug("Destination coordinates: lat=%s, lng=%s", destination_lat, destination_lng)
             # get destination bounding box
             destination_min_lat, destination_max_lat, destination_min_lng, destination_max_lng = get_bounding_box(destination_lat, destination_lng, DEFAULT_RADIUS_MILES)
-            logger.debug(f"Search bounding box - Lat: {destination_min_lat:.4f} to {destination_max_lat:.4f}")
-            logger.debug(f"Search bounding box - Lng: {destination_min_lng:.4f} to {destination_max_lng:.4f}")
+            logger.debug("Search bounding box - Lat: %.4f to %.4f", destination_min_lat, destination_max_lat)
+            logger.debug("Search bounding box - Lng: %.4f to %.4f", destination_min_lng, destination_max_lng)
         else:
             destination_min_lat = None
             destination_max_lat = None
             destination_min_lng = None
             destination_max_lng = None
 
+        # A search whose every attempt recently found nothing needs no queries
+        lanes = _attempt_lanes(equipment_type, (origin_lat, origin_lng), (destination_lat, destination_lng) if destination else None, pickup_datetime, pickup_window)
+        empty_attempts = empty_lanes.empty_attempts(lanes)
+        if len(empty_attempts) == len(lanes):
+            logger.info("No loads for %s near %s - every attempt recently found none", equipment_type, origin)
+            return [], [], False
+
+        # Later searches of the call from this origin are served from the prefetched loads
+        prefetched = None
+        if session is not None and settings.session_prefetch_limit > 0:
+            prefetch_key = (equipment_type, (origin_min_lat, origin_max_lat, origin_min_lng, origin_max_lng))
+            prefetched = session.prefetched(prefetch_key)
+            session.prefetch(prefetch_key, lambda: _prefetch_origin(*prefetch_key))
+
         logger.debug("Querying Supabase for matching loads")
         
         # Retry logic with progressive parameter removal
@@ -196,9 +397,6 @@ def find_loads_within_radius(equipment_type: str, origin: str, destination: str
         # 3. Try with equipment + origin only
         # Determine what parameters we actually have
         has_destination = destination_min_lat is not None and destination_max_lat is not None and destination_min_lng is not None and destination_max_lng is not None
-        # Defensive: treat empty-string-like pickup as absent
-        if isinstance(pickup_datetime, str) and pickup_datetime.strip() == "":
-            pickup_datetime = None
         has_pickup_datetime = pickup_datetime is not None
         originally_provided_destination = has_destination
         originally_provided_pickup = has_pickup_datetime
@@ -216,19 +414,15 @@ def find_loads_within_radius(equipment_type: str, origin: str, destination: str
                                 destination_max_lat,
                                 destination_min_lng,
                                 destination_max_lng,
-                                pickup_datetime)
-        
-        if query is None:
-            logger.debug("Attempt 1: Query returned None (specific pickup_datetime is in the past)")
-            loads_data = []
-        else:
-            result = query.execute()
-            loads_data = result.data if result.data else []
-        logger.debug(f"Attempt 1 returned {len(loads_data)} loads")
+                                pickup_datetime,
+                                pickup_window)
+        loads_data = await _search_attempt("attempt_1", query, deadline, prefetched, lanes["attempt_1"], "attempt_1" in empty_attempts)
+        if loads_data is None:
+            return [], [], True
         
         if loads_data:
-            logger.info(f"Found {len(loads_data)} loads for {equipment_type} near {origin} with all parameters")
-            return loads_data, []
+            logger.info("Found %s loads for %s near %s with all parameters", len(loads_data), equipment_type, origin)
+            return _with_pickup_offsets(loads_data, pickup_datetime, limit=3), [], False
         
         # Attempt 2: Only if pickup_datetime was provided, retry without it
         if has_pickup_datetime:
@@ -243,17 +437,16 @@ def find_loads_within_radius(equipment_type: str, origin: str, destination: str
                                     destination_min_lng,
                                     destination_max_lng,
                                     None)  # No pickup_datetime
-            
-            result = query.execute()
-            loads_data = result.data if result.data else []
-            logger.debug(f"Attempt 2 returned {len(loads_data)} loads")
+            loads_data = await _search_attempt("attempt_2", query, deadline, prefetched, lanes.get("attempt_2"), "attempt_2" in empty_attempts)
+            if loads_data is None:
+                return [], [], True
             
             if loads_data:
-                logger.info(f"Found {len(loads_data)} loads for {equipment_type} near {origin} with equipment + origin + destination")
+                logger.info("Found %s loads for %s near %s with equipment + origin + destination", len(loads_data), equipment_type, origin)
                 omitted_parameters: list[str] = []
                 if originally_provided_pickup:
                     omitted_parameters.append("pickup_datetime")
-                return loads_data, omitted_parameters
+                return _with_pickup_offsets(loads_data, pickup_datetime), omitted_parameters, False
         
         # Attempt 3: Only if destination was provided, retry without destination
         if has_destination:
@@ -268,31 +461,90 @@ def find_loads_within_radius(equipment_type: str, origin: str, destination: str
                                     None,
                                     None,
                                     None)  # No pickup_datetime
-            
-            result = query.execute()
-            loads_data = result.data if result.data else []
-            logger.debug(f"Attempt 3 returned {len(loads_data)} loads")
+            loads_data = await _search_attempt("attempt_3", query, deadline, prefetched, lanes.get("attempt_3"), "attempt_3" in empty_attempts)
+            if loads_data is None:
+                return [], [], True
             
             if loads_data:
-                logger.info(f"Found {len(loads_data)} loads for {equipment_type} near {origin} with equipment + origin only")
+                logger.info("Found %s loads for %s near %s with equipment + origin only", len(loads_data), equipment_type, origin)
                 omitted_parameters: list[str] = []
                 if originally_provided_destination:
                     omitted_parameters.append("destination")
                 if originally_provided_pickup:
                     omitted_parameters.append("pickup_datetime")
-                return loads_data, omitted_parameters
-        else:
-            logger.info(f"No loads found for {equipment_type} near {origin} after all retry attempts")
-            return [], []
+                return _with_pickup_offsets(loads_data, pickup_datetime), omitted_parameters, False
+
+        logger.info("No loads found for %s near %s after all retry attempts", equipment_type, origin)
+        return [], [], False
 
     except Exception as e:
-        logger.error(f"Error in find_loads_within_radius: {str(e)}")
+        logger.error("Error in find_loads_within_radius: %s", str(e))
         logger.debug("Returning empty loads list due to error")
-        return [], []
+        return [], [], False
+
+def _available(result: tuple, session: CallSession | None) -> tuple:
+    """A search result without the loads another call is negotiating on this worker
+
+    Coalesced and remembered results are shared, so holds are checked for
+    every caller when the result is returned rather than when it was found.
+    """
+    loads_data, omitted_parameters, deadline_exceeded = result
+    carrier_mcs = session.carriers if session is not None else ()
+    available = [load for load in loads_data if not reservations.held_by_others(load.get("load_id"), carrier_mcs)]
+    if len(available) == len(loads_data):
+        return result
+    logger.debug("Dropped %s loads held by other calls", len(loads_data) - len(available))
+    return available, omitted_parameters, deadline_exceeded
+
+# Identical searches running at the same time share one geocode + query sequence
+load_search_flight = SingleFlight("load_search")
+
+async def find_loads_within_radius_coalesced(equipment_type: str, origin: str, destination: str | None = None, pickup_datetime: datetime | str | None = None, deadline: Deadline | None = None, pickup_window: str | float | None = None, session: CallSession | None = None):
+    """find_loads_within_radius, coalescing concurrent identical searches
+
+    Searches are keyed on the normalized (equipment_type, origin, destination,
+    pickup_datetime, pickup_window); callers with the same key while a search is running
+    await it and get the same (loads_data, omitted_parameters,
+    deadline_exceeded) result. The search runs under the first caller's
+    deadline and call session; every caller stops waiting when its own
+    deadline runs out. A caller that joined a search cut short by the first
+    caller's deadline runs the search again under its own deadline and
+    session while it has time left.
+    A call session answers a repeat of one of its earlier searches directly.
+    Loads held by a carrier other than the call's are left out.
+    """
+    deadline = deadline or Deadline()
+    pickup_key = pickup_datetime.isoformat() if isinstance(pickup_datetime, datetime) else (pickup_datetime or None)
+    key = (equipment_type, normalize_location(origin), normalize_location(destination), pickup_key, pickup_window)
+    # Popular origins are pre-geocoded by the next warm-up
+    recent_origins.record(key[1])
+    if session is not None:
+        remembered = session.lookup("search", session.searches, key)
+        if remembered is not None:
+            return _available(remembered, session)
+    try:
+        led = False
+
+        async def lead():
+            nonlocal led
+            led = True
+            return await find_loads_within_radius(equipment_type, origin, destination, pickup_datetime, deadline, pickup_window, session)
+
+        result = await deadline.wait(load_search_flight.do(key, lead))
+        if result[2] and not led and not deadline.expired:
+            logger.info("Coalesced search from %s was cut short by another caller's deadline - searching again", origin)
+            result = await deadline.wait(find_loads_within_radius(equipment_type, origin, destination, pickup_datetime, deadline, pickup_window, session))
+        # Only complete results are worth repeating
+        if session is not None and not result[2]:
+            session.remember_search(key, result)
+        return _available(result, session)
+    except asyncio.TimeoutError:
+        logger.info("Deadline reached while waiting for a coalesced search from %s", origin)
+        return [], [], True
 
 def process_parameters(equipment_type: str, pickup_datetime: str | None = None) -> str:
     """Process the parameters and return the processed values"""
-    logger.debug(f"Processing parameters - Equipment: {equipment_type}, Pickup: {pickup_datetime}")
+    logger.debug("Processing parameters - Equipment: %s, Pickup: %s", equipment_type, pickup_datetime)
     # normalize the equipment type (lower and remove spaces)
     equipment_type = equipment_type.lower()
     equipment_type = equipment_type.replace(" ", "")
@@ -305,7 +557,7 @@ def process_parameters(equipment_type: str, pickup_datetime: str | None = None)
         try:
             pickup_datetime = datetime.fromisoformat(pickup_datetime)
         except ValueError:
-            logger.error(f"Invalid pickup datetime: {pickup_datetime}")
+            logger.error("Invalid pickup datetime: %s", pickup_datetime)
             raise ValueError("Invalid pickup datetime")
 
     return equipment_type, pickup_datetime
\ No newline at end of file
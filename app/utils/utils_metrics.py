@@ -1,19 +1,71 @@
-from app.supabase import supabase
+from app.repositories import metrics_repository
 from app.schemas.schemas import MetricsRequest
 from app.config import settings
+from app.utils.utils_sketches import metric_sketches
+from app.instrumentation import span
+from app.utils.utils_resilience import CircuitOpenError, happyrobot
+from app.utils.utils_runs import RunDataParser
 import logging
-import httpx
+from datetime import datetime
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+# Shared HappyRobot HTTP client, created on first use so connections are reused across calls
+_http_client = None
+
+def get_http_client():
+    """Return the shared HappyRobot httpx client, importing httpx and creating it on first use"""
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        limits = httpx.Limits(max_connections=settings.happyrobot_max_concurrency, max_keepalive_connections=settings.happyrobot_max_concurrency)
+        _http_client = httpx.AsyncClient(timeout=10.0, limits=limits)
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 def get_metrics_from_supabase():
     """Get metrics from supabase"""
-    # metrics = supabase.table("metrics").select("*").execute()
+    # metrics = await metrics_repository.page(None, settings.export_page_size)
     return []
 
+async def iter_metrics_pages(start_date: datetime | None = None, end_date: datetime | None = None, organization_id: str | None = None, after_id: int | None = None, page_size: int | None = None):
+    """Yield pages of metrics rows ordered by id using keyset pagination
+
+    Each page is fetched with `id > last_seen_id`, so the cost of a page does not
+    depend on how deep into the table it is and only one page is held in memory.
+    Passing `after_id` resumes an interrupted export right after that row.
+    """
+    page_size = page_size or settings.export_page_size
+    cursor = after_id
+    pages = 0
+
+    while True:
+        rows = await metrics_repository.page(cursor, page_size, organization_id, start_date, end_date)
+        if not rows:
+            break
+
+        pages += 1
+        cursor = rows[-1].get("id")
+        logger.debug("Fetched metrics export page %s with %s rows, cursor=%s", pages, len(rows), cursor)
+        yield rows
+
+        if len(rows) < page_size or cursor is None:
+            break
+
+    logger.info("Metrics export finished after %s pages", pages)
+
 async def fetch_run_data_from_happyrobot(run_id: str, organization_id: str):
     """Fetch run data from HappyRobot API asynchronously"""
+    # Imported on first use (or during warm-up) to keep app import fast
+    import httpx
+
     try:
         if not settings.happyrobot_bearer_token:
             logger.warning("HappyRobot bearer token not configured, skipping API call")
@@ -25,39 +77,44 @@ async def fetch_run_data_from_happyrobot(run_id: str, organization_id: str):
             "x-organization-id": organization_id
         }
         
-        logger.info(f"Fetching run data from HappyRobot API: {url}")
-        
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
-
-            status = data.get("status")
-            duration = ""
-            events = data.get("events", [])
-            for event in events:
-                if event.get("type") == "session":
-                    duration = event.get("duration")
-                    break
-            
-            logger.info(f"Successfully fetched run data - duration: {duration}, status: {status}")
-            return duration, status
+        logger.info("Fetching run data from HappyRobot API: %s", url)
+
+        async def get_run():
+            # The body is parsed as it arrives; leaving the stream early closes the connection
+            # instead of downloading the rest of the event transcripts
+            parser = RunDataParser()
+            async with get_http_client().stream("GET", url, headers=headers) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    if parser.feed(chunk):
+                        break
+            return parser
+
+        with span("fetch_run_data_from_happyrobot"):
+            parser = await happyrobot.call(get_run, idempotent=True)
+
+        duration, status = parser.duration, parser.status
+
+        logger.info("Successfully fetched run data - duration: %s, status: %s", duration, status)
+        return duration, status
         
+    except CircuitOpenError as e:
+        logger.warning("Skipping HappyRobot call for run %s: %s", run_id, e)
+        return None, None
     except httpx.TimeoutException:
         logger.error("Timeout fetching run data from HappyRobot API")
         return None, None
     except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP error fetching run data from HappyRobot API: {str(e)}")
+        logger.error("HTTP error fetching run data from HappyRobot API: %s", str(e))
         return None, None
     except Exception as e:
-        logger.error(f"Unexpected error fetching run data: {str(e)}")
+        logger.error("Unexpected error fetching run data: %s", str(e))
         return None, None
 
 
 async def store_metrics_in_supabase(metrics: MetricsRequest):
     """Store metrics in supabase with calculated fields"""
-    logger.info(f"Storing metrics: {metrics}")
+    logger.info("Storing metrics: %s", metrics)
     
     # Convert Pydantic model to dictionary
     metrics_dict = metrics.model_dump()
@@ -72,54 +129,61 @@ async def store_metrics_in_supabase(metrics: MetricsRequest):
     negotiation_performance = None
     if metrics.carrier_initial_offer is not None and metrics.load_agreed_rate is not None:
         negotiation_performance = float(metrics.carrier_initial_offer) - float(metrics.load_agreed_rate)
-        logger.info(f"Calculated negotiation_performance: {negotiation_performance}")
+        logger.info("Calculated negotiation_performance: %s", negotiation_performance)
     
     # Calculate rate_difference: difference between agreed rate and loadboard rate
     # Positive value means we got more than the loadboard rate
     rate_difference = None
     if metrics.load_loadboard_rate is not None and metrics.load_agreed_rate is not None:
         rate_difference = float(metrics.load_agreed_rate) - float(metrics.load_loadboard_rate)
-        logger.info(f"Calculated rate_difference: {rate_difference}")
+        logger.info("Calculated rate_difference: %s", rate_difference)
     
     # Add calculated fields to the metrics dictionary
     metrics_dict['negotiation_performance'] = negotiation_performance
     metrics_dict['rate_difference'] = rate_difference
     
-    logger.debug(f"Final metrics to store: {metrics_dict}")
+    logger.debug("Final metrics to store: %s", metrics_dict)
     
     # Insert into Supabase
     try:
-        result = supabase.table("metrics").insert(metrics_dict).execute()
-        logger.info(f"Successfully stored metrics in Supabase")
-        return True
+        await metrics_repository.insert(metrics_dict)
+        logger.info("Successfully stored metrics in Supabase")
     except Exception as e:
-        logger.error(f"Error storing metrics in Supabase: {str(e)}")
+        logger.error("Error storing metrics in Supabase: %s", str(e))
         raise e
 
+    # Update quantile sketches; a running call's duration is recorded when it is reconciled
+    if status != "running":
+        metric_sketches.record("call_duration", duration)
+    metric_sketches.record("negotiation_attempts", metrics.negotiation_attempts)
+    metric_sketches.record("negotiation_performance", negotiation_performance)
+    metric_sketches.record("rate_difference", rate_difference)
+    return True
+
 async def update_metrics_in_supabase():
     """Update metrics in supabase by fetching rows where call_status is 'running' and updating them with HappyRobot data"""
     logger.info("Starting metrics update process")
     
     try:
         # Fetch rows from the metrics table where call_status is "running"
-        result = supabase.table("metrics").select("id, organization_id, run_id").eq("call_status", "running").execute()
+        rows = await metrics_repository.list_running()
         
-        if not result.data:
+        if not rows:
             logger.info("No metrics found to update")
             return {"updated_count": 0, "message": "No metrics found to update"}
         
-        logger.info(f"Found {len(result.data)} metrics to update")
+        logger.info("Found %s metrics to update", len(rows))
         
         updated_count = 0
         failed_count = 0
         
         # Process each row
-        for row in result.data:
+        for row in rows:
             row_id = row.get("id")
             organization_id = row.get("organization_id")
             run_id = row.get("run_id")
             
-            logger.info(f"Processing metric row {row_id} for run_id: {run_id}, organization_id: {organization_id}")
+            logger.info("Processing metric row %s for run_id: %s, organization_id: %s", row_id, run_id, organization_id)
             
             # Fetch run data from HappyRobot API
             duration, status = await fetch_run_data_from_happyrobot(run_id, organization_id)
@@ -131,14 +195,16 @@ async def update_metrics_in_supabase():
             }
             
             try:
-                supabase.table("metrics").update(update_data).eq("id", row_id).execute()
-                logger.info(f"Successfully updated metric row {row_id} with duration: {duration}, status: {status}")
+                await metrics_repository.update(row_id, update_data)
+                logger.info("Successfully updated metric row %s with duration: %s, status: %s", row_id, duration, status)
                 updated_count += 1
+                if status != "running":
+                    metric_sketches.record("call_duration", duration)
             except Exception as e:
-                logger.error(f"Error updating metric row {row_id}: {str(e)}")
+                logger.error("Error updating metric row %s: %s", row_id, str(e))
                 failed_count += 1
         
-        logger.info(f"Metrics update complete. Updated: {updated_count}, Failed: {failed_count}")
+        logger.info("Metrics update complete. Updated: %s, Failed: %s", updated_count, failed_count)
         return {
             "updated_count": updated_count,
             "failed_count": failed_count,
@@ -146,5 +212,5 @@ async def update_metrics_in_supabase():
         }
         
     except Exception as e:
-        logger.error(f"Error in update_metrics_in_supabase: {str(e)}")
+        logger.error("Error in update_metrics_in_supabase: %s", str(e))
         raise e
\ No newline at end of file
@@ -0,0 +1,161 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from app.config import settings
+from app.instrumentation import registry
+from app.repositories import BoundingBox
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Size in degrees of the grid cells that index entries by the origin area they cover
+CELL_DEGREES = 1.0
+
+# Size in degrees of the cells geocoded places are keyed on, so spellings of one place share their lanes
+LANE_CELL_DEGREES = 0.01
+
+Cell = Tuple[int, int]
+# (search day, equipment_type, origin cell, destination cell, pickup window bounds) of one search attempt;
+# destination and pickup window are None for the attempts that relaxed them
+Lane = Tuple[date, str, Cell, Optional[Cell], Optional[Tuple[datetime, datetime]]]
+
+
+def _cell(lat: float, lng: float) -> Cell:
+    return math.floor(lat / CELL_DEGREES), math.floor(lng / CELL_DEGREES)
+
+
+def lane_cell(lat: float, lng: float) -> Cell:
+    """Cell of a geocoded place in a lane"""
+    return math.floor(lat / LANE_CELL_DEGREES), math.floor(lng / LANE_CELL_DEGREES)
+
+
+def _box_cells(box: BoundingBox) -> Iterator[Cell]:
+    min_lat, max_lat, min_lng, max_lng = box
+    (first_lat, first_lng), (last_lat, last_lng) = _cell(min_lat, min_lng), _cell(max_lat, max_lng)
+    for lat_cell in range(first_lat, last_lat + 1):
+        for lng_cell in range(first_lng, last_lng + 1):
+            yield lat_cell, lng_cell
+
+
+def _relaxations(lane: Lane) -> Iterator[Lane]:
+    """The lane and the wider lanes whose emptiness implies it: without its destination and/or pickup window"""
+    day, equipment_type, origin, destination, pickup_bounds = lane
+    for relaxed_destination in {destination, None}:
+        for relaxed_pickup in {pickup_bounds, None}:
+            yield day, equipment_type, origin, relaxed_destination, relaxed_pickup
+
+
+class _Entry:
+    __slots__ = ("expires_at", "origin_box", "cells")
+
+    def __init__(self, expires_at: float, origin_box: BoundingBox):
+        self.expires_at = expires_at
+        self.origin_box = origin_box
+        self.cells = list(_box_cells(origin_box))
+
+
+class NegativeResultCache:
+    """Search attempts that found no loads, remembered for `ttl` seconds
+
+    A lane is one relaxation tier of a search: the full search, the search
+    without its pickup window, and the search without its destination.
+    When a tier comes back empty it is recorded, and later searches skip every
+    tier that an empty lane covers (a lane with no loads leaves none for the
+    narrower ones either), so a known-dead search returns at once and a
+    partly dead one goes straight to the tiers that can still match.
+
+    Lanes key the origin and destination on their geocoded cells rather than
+    on the text of the request, so "Dallas, TX" and "Dallas TX" share them.
+    Entries are indexed by the grid cells their origin box covers; inserting a
+    load drops the entries whose origin box contains it. The cache is per
+    worker, so loads added by other workers or directly in the database are
+    only picked up when the short TTL runs out.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # All entries live for ttl seconds, so insertion order is expiry order
+        self._entries: "OrderedDict[Lane, _Entry]" = OrderedDict()
+        self._cells: Dict[Cell, Set[Lane]] = {}
+        # Bumped by every invalidation; a search that started before one may have missed the new loads
+        self.generation = 0
+
+    def _drop(self, lane: Lane):
+        entry = self._entries.pop(lane)
+        for cell in entry.cells:
+            lanes = self._cells[cell]
+            lanes.discard(lane)
+            if not lanes:
+                del self._cells[cell]
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            lane, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._drop(lane)
+
+    def is_empty(self, lane: Lane) -> bool:
+        """True when this lane, or a wider lane covering it, recently found no loads"""
+        if self.ttl <= 0:
+            return False
+        self._expire()
+        return any(relaxed in self._entries for relaxed in _relaxations(lane))
+
+    def empty_attempts(self, lanes: Dict[str, Lane]) -> Set[str]:
+        """Names of the attempts of one search whose lanes recently found no loads
+
+        Counted once per search: a hit when at least one attempt is skipped.
+        """
+        if self.ttl <= 0:
+            return set()
+        empty = {name for name, lane in lanes.items() if self.is_empty(lane)}
+        registry.inc("cache_requests_total", ("empty_lanes", "hit" if empty else "miss"))
+        return empty
+
+    def record(self, lane: Lane, origin_box: BoundingBox, generation: int):
+        """Remember that a search attempt of this lane within origin_box found no loads
+
+        `generation` is the value of self.generation when the attempt started;
+        nothing is recorded if loads were inserted while it ran.
+        """
+        if self.ttl <= 0 or generation != self.generation:
+            return
+        if lane in self._entries:
+            self._drop(lane)
+        self._expire()
+        while len(self._entries) >= self.max_entries:
+            self._drop(next(iter(self._entries)))
+        entry = self._entries[lane] = _Entry(time.monotonic() + self.ttl, origin_box)
+        for cell in entry.cells:
+            self._cells.setdefault(cell, set()).add(lane)
+
+    def invalidate(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Drop the entries whose origin box contains an inserted load's origin; returns how many were dropped"""
+        self.generation += 1
+        dropped = 0
+        for row in rows:
+            lat, lng = row.get("origin_lat"), row.get("origin_lng")
+            if lat is None or lng is None or not self._entries:
+                continue
+            for lane in list(self._cells.get(_cell(lat, lng), ())):
+                min_lat, max_lat, min_lng, max_lng = self._entries[lane].origin_box
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                    self._drop(lane)
+                    dropped += 1
+        if dropped:
+            logger.debug("Invalidated %s empty-lane entries after inserting loads", dropped)
+        return dropped
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global cache of empty search lanes, invalidated by load imports
+empty_lanes = NegativeResultCache(settings.negative_cache_ttl, settings.negative_cache_max_entries)
@@ -0,0 +1,194 @@
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from app.config import settings
+from app.instrumentation import registry, span
+from app.repositories import load_repository
+from app.utils.utils_sessions import call_sessions
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+class Hold:
+    """A carrier's lease on a load while it is being negotiated"""
+
+    def __init__(self, carrier_mc: str, expires_at: float):
+        self.carrier_mc = carrier_mc
+        self.negotiation_id = uuid.uuid4().hex
+        self.expires_at = expires_at
+
+
+class ReservationTable:
+    """Per-load leases of the carriers negotiating on this worker
+
+    Acquiring, renewing and releasing a hold run without awaiting, so they are
+    atomic on the event loop and only calls about the same load contend.
+    Holds all last `lease_seconds` from their last renewal, so keeping them in
+    renewal order puts the expired ones at the front. Holds are per worker:
+    across workers only the compare-and-set booking in the database decides.
+    """
+
+    def __init__(self, lease_seconds: float):
+        self.lease_seconds = lease_seconds
+        self._holds: "OrderedDict[str, Hold]" = OrderedDict()
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._holds:
+            load_id, hold = next(iter(self._holds.items()))
+            if hold.expires_at > now:
+                break
+            del self._holds[load_id]
+
+    def holder(self, load_id: str) -> Optional[Hold]:
+        self._expire()
+        return self._holds.get(load_id)
+
+    def held_by_others(self, load_id: str, carrier_mcs: Iterable[str] = ()) -> bool:
+        """Whether a carrier other than `carrier_mcs` (the carriers of the asking call) holds the load"""
+        hold = self.holder(load_id)
+        return hold is not None and hold.carrier_mc not in carrier_mcs
+
+    def acquire(self, load_id: str, carrier_mc: str) -> Optional[Hold]:
+        """Take or renew the hold on a load for a carrier; None while another carrier holds it"""
+        self._expire()
+        hold = self._holds.get(load_id)
+        if hold is not None and hold.carrier_mc != carrier_mc:
+            return None
+        if hold is None:
+            hold = self._holds[load_id] = Hold(carrier_mc, 0.0)
+        hold.expires_at = time.monotonic() + self.lease_seconds
+        self._holds.move_to_end(load_id)
+        return hold
+
+    def release(self, load_id: str, carrier_mc: str):
+        hold = self._holds.get(load_id)
+        if hold is not None and hold.carrier_mc == carrier_mc:
+            del self._holds[load_id]
+
+
+def max_rate(load: Dict[str, Any]) -> Optional[float]:
+    """Highest rate we agree to for a load, NEGOTIATION_MAX_MARKUP above its loadboard rate"""
+    if load.get("loadboard_rate") is None:
+        return None
+    return round(float(load["loadboard_rate"]) * (1 + settings.negotiation_max_markup), 2)
+
+
+def booking_reference(booking_id: str) -> str:
+    return f"BK-{booking_id[:8].upper()}"
+
+
+def _confirmation(load: Dict[str, Any], status: str, message: str, carrier_mc: str, final_rate: float) -> Dict[str, Any]:
+    booking_id = load.get("booking_id") if status == "booked" else None
+    registry.inc("load_bookings_total", (status,))
+    return {
+        "confirmation_id": booking_id or "",
+        "load_id": load["load_id"],
+        "carrier_mc": carrier_mc,
+        "final_rate": float(load["booked_rate"]) if status == "booked" else final_rate,
+        "status": status,
+        "booking_reference": booking_reference(booking_id) if booking_id else "",
+        "message": message,
+    }
+
+
+def _booked_result(load: Dict[str, Any], carrier_mc: str, final_rate: float) -> Dict[str, Any]:
+    """Confirmation for a load that is already booked: the carrier's own booking is returned again"""
+    if load.get("booked_carrier_mc") == carrier_mc:
+        return _confirmation(load, "booked", f"Load {load['load_id']} is booked for MC {carrier_mc}", carrier_mc, final_rate)
+    return _confirmation(load, "unavailable", f"Load {load['load_id']} has already been booked by another carrier", carrier_mc, final_rate)
+
+
+async def negotiate_load(load_id: str, carrier_mc: str, proposed_rate: float) -> Dict[str, Any]:
+    """Answer a carrier's rate offer and hold the load for them while they negotiate
+
+    Offers up to NEGOTIATION_MAX_MARKUP above the loadboard rate are
+    accepted; higher ones are countered with that maximum. A load that is
+    booked or held by another carrier is rejected.
+
+    Raises:
+        LookupError: If there is no load with this load_id
+    """
+    with span("negotiate.get_load"):
+        load = await load_repository.get(load_id)
+    if load is None:
+        raise LookupError(load_id)
+
+    result = {"negotiation_id": "", "load_id": load_id, "carrier_mc": carrier_mc, "proposed_rate": proposed_rate, "counter_rate": None}
+    if load.get("booking_id"):
+        return {**result, "status": "rejected", "message": f"Load {load_id} has already been booked"}
+    ceiling = max_rate(load)
+    if ceiling is None:
+        return {**result, "status": "rejected", "message": f"Load {load_id} has no loadboard rate to negotiate on"}
+
+    hold = reservations.acquire(load_id, carrier_mc)
+    if hold is None:
+        logger.info("Negotiation for load %s by MC %s rejected - held by another carrier", load_id, carrier_mc)
+        return {**result, "status": "rejected", "message": f"Load {load_id} is being negotiated with another carrier"}
+
+    result["negotiation_id"] = hold.negotiation_id
+    if proposed_rate <= ceiling:
+        return {**result, "status": "accepted", "message": f"Rate {proposed_rate:.2f} accepted for load {load_id}"}
+    return {**result, "status": "countered", "counter_rate": ceiling, "message": f"We can offer {ceiling:.2f} for load {load_id}"}
+
+
+async def confirm_load(load_id: str, carrier_mc: str, final_rate: float) -> Dict[str, Any]:
+    """Book a load for a carrier; of concurrent confirmations of one load exactly one is booked
+
+    Confirmations on this worker first take the load's hold, so while one is
+    writing the booking the others are turned away without a query. The
+    booking itself is a compare-and-set on the load's booking_id, which also
+    settles races between workers. Confirming a load already booked for the
+    same carrier returns that booking again.
+
+    Raises:
+        LookupError: If there is no load with this load_id
+    """
+    if reservations.acquire(load_id, carrier_mc) is None:
+        return _confirmation({"load_id": load_id}, "unavailable", f"Load {load_id} is held by another carrier", carrier_mc, final_rate)
+
+    # The hold is kept when the confirmation fails, so the carrier can retry; it is released once the load is booked
+    with span("confirm.get_load"):
+        load = await load_repository.get(load_id)
+    if load is None:
+        reservations.release(load_id, carrier_mc)
+        raise LookupError(load_id)
+    if load.get("booking_id"):
+        reservations.release(load_id, carrier_mc)
+        call_sessions.forget_load(load_id)
+        return _booked_result(load, carrier_mc, final_rate)
+    ceiling = max_rate(load)
+    if ceiling is not None and final_rate > ceiling:
+        return _confirmation(load, "rejected", f"Rate {final_rate:.2f} is above the maximum of {ceiling:.2f} for load {load_id}", carrier_mc, final_rate)
+
+    booking = {
+        "booking_id": uuid.uuid4().hex,
+        "booked_carrier_mc": carrier_mc,
+        "booked_rate": final_rate,
+        "booked_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with span("confirm.book"):
+        booked = await load_repository.book(load_id, booking)
+    reservations.release(load_id, carrier_mc)
+    if booked is None:
+        # Lost the compare-and-set to a booking made on another worker
+        with span("confirm.get_load"):
+            load = await load_repository.get(load_id)
+        if load is None:
+            raise LookupError(load_id)
+        call_sessions.forget_load(load_id)
+        return _booked_result(load, carrier_mc, final_rate)
+
+    logger.info("Load %s booked for MC %s at %.2f", load_id, carrier_mc, final_rate)
+    # Searches and prefetched loads the calls on this worker remembered must not offer it again
+    call_sessions.forget_load(load_id)
+    return _confirmation(booked, "booked", f"Load {load_id} is booked for MC {carrier_mc}", carrier_mc, final_rate)
+
+
+# Global reservation table shared by the negotiate and confirm endpoints
+reservations = ReservationTable(settings.reservation_lease_seconds)
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.config import settings
+from app.instrumentation import registry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+
+class BulkheadFullError(Exception):
+    """Raised when a dependency's concurrency limit stays exhausted for too long"""
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker
+
+    Outcomes of the last `window` seconds are kept; once at least `min_calls`
+    were seen and the share of failures reaches `error_rate` the breaker opens
+    and calls fail immediately. After `open_seconds` it goes half-open and lets
+    a single probe through: success closes it, failure opens it again. State
+    is per worker process.
+    """
+
+    def __init__(self, name: str, window: float, min_calls: int, error_rate: float, open_seconds: float):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._outcomes: deque = deque()
+        self._failures = 0
+        self._probing = False
+
+    def _prune(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def _transition(self, state: str):
+        logger.warning("Circuit breaker %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.opened_count += 1
+        else:
+            self._outcomes.clear()
+            self._failures = 0
+
+    def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpenError; returns True if the call is the half-open probe"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+
+    def record(self, ok: bool, probe: bool):
+        if probe:
+            self._probing = False
+            self._transition(CLOSED if ok else OPEN)
+            return
+        if self.state != CLOSED:
+            # Late outcome of a call admitted before the breaker opened
+            return
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        if not ok:
+            self._failures += 1
+        self._prune(now)
+        if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.error_rate:
+            self._transition(OPEN)
+
+    def release(self, probe: bool):
+        """Give up a probe slot without an outcome (cancelled or rejected by the bulkhead)"""
+        if probe:
+            self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._prune(time.monotonic())
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_error_rate": round(self._failures / calls, 4) if calls else 0.0,
+            "opened_count": self.opened_count,
+            "retry_in_seconds": round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 3) if self.state == OPEN else None,
+        }
+
+
+class Dependency:
+    """Circuit breaker, bulkhead and optional hedging around calls to one outbound dependency
+
+    `call(func)` runs the zero-argument coroutine factory `func`. At most
+    `max_concurrency` calls run at once; a call waits up to `max_wait` seconds
+    for a slot and then fails with BulkheadFullError. With `hedge` enabled, an
+    idempotent call that has not finished after the p95 of recent successful
+    latencies (at least `hedge_min_delay`) is started a second time if a slot
+    is free, and whichever attempt succeeds first wins.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_wait: float, breaker: CircuitBreaker, hedge: bool = False, hedge_min_delay: float = 0.05, is_failure: Callable[[BaseException], bool] = lambda e: True):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.is_failure = is_failure
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._latencies: deque = deque(maxlen=200)
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent successful latencies, or None until there are enough samples"""
+        if len(self._latencies) < 20:
+            return None
+        latencies = sorted(self._latencies)
+        return max(self.hedge_min_delay, latencies[int(len(latencies) * 0.95) - 1])
+
+    async def _attempt(self, func: Callable[[], Awaitable[T]]) -> T:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            raise BulkheadFullError(f"{self.name} has {self.max_concurrency} calls in flight") from None
+        self.in_flight += 1
+        try:
+            start_time = time.perf_counter()
+            result = await func()
+            self._latencies.append(time.perf_counter() - start_time)
+            return result
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _hedged(self, func: Callable[[], Awaitable[T]]) -> T:
+        primary = asyncio.ensure_future(self._attempt(func))
+        delay = self.hedge_delay()
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or self._slots.locked():
+            return await primary
+
+        registry.inc("dependency_hedges_total", (self.name, "launched"))
+        hedge = asyncio.ensure_future(self._attempt(func))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            registry.inc("dependency_hedges_total", (self.name, "won"))
+                        return task.result()
+                    if error is None or task is primary:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, func: Callable[[], Awaitable[T]], idempotent: bool = False) -> T:
+        try:
+            probe = self.breaker.before_call()
+        except CircuitOpenError:
+            registry.inc("dependency_calls_total", (self.name, "circuit_open"))
+            raise
+
+        try:
+            if self.hedge and idempotent and not probe:
+                result = await self._hedged(func)
+            else:
+                result = await self._attempt(func)
+        except BulkheadFullError:
+            self.breaker.release(probe)
+            registry.inc("dependency_calls_total", (self.name, "bulkhead_full"))
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release(probe)
+            raise
+        except Exception as e:
+            failed = self.is_failure(e)
+            self.breaker.record(not failed, probe)
+            registry.inc("dependency_calls_total", (self.name, "failure" if failed else "success"))
+            raise
+
+        self.breaker.record(True, probe)
+        registry.inc("dependency_calls_total", (self.name, "success"))
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            "circuit": self.breaker.snapshot(),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "hedging": self.hedge,
+            "hedge_delay_seconds": round(delay, 4) if delay is not None else None,
+        }
+
+
+def _build_dependency(name: str, max_concurrency: int, is_failure: Callable[[BaseException], bool] = lambda e: True) -> Dependency:
+    breaker = CircuitBreaker(name, settings.breaker_window_seconds, settings.breaker_min_calls, settings.breaker_error_rate, settings.breaker_open_seconds)
+    hedged = {item.strip() for item in settings.hedge_dependencies.split(",") if item.strip()}
+    return Dependency(name, max_concurrency, settings.bulkhead_max_wait, breaker, name in hedged, settings.hedge_min_delay_ms / 1000, is_failure)
+
+
+def _is_happyrobot_failure(error: BaseException) -> bool:
+    # Client errors (unknown run id, bad token) say nothing about HappyRobot's health
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code is None or status_code >= 500 or status_code == 429
+
+
+# Global outbound dependencies, reported by /internal/dependencies
+nominatim = _build_dependency("nominatim", settings.nominatim_max_concurrency)
+happyrobot = _build_dependency("happyrobot", settings.happyrobot_max_concurrency, _is_happyrobot_failure)
+dependencies = {dependency.name: dependency for dependency in (nominatim, happyrobot)}
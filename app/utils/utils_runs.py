@@ -0,0 +1,207 @@
+import json
+import re
+from typing import Any, List, Optional
+
+import numpy as np
+
+# Next byte that is not JSON whitespace
+_NON_SPACE = re.compile(rb"[^ \t\r\n]")
+# Byte that ends a number, true, false or null
+_LITERAL_END = re.compile(rb"[ \t\r\n,\]}]")
+# Contents of a string up to its closing quote (or a trailing backslash whose escaped byte is still to come)
+_STRING_BODY = re.compile(rb'(?:[^"\\]++|\\.)*+', re.DOTALL)
+# Kind of each byte while skipping: 1 opens a container, -1 closes one, QUOTE starts or ends a string
+QUOTE = 2
+_BYTE_KINDS = np.zeros(256, dtype=np.int8)
+_BYTE_KINDS[[ord("{"), ord("[")]] = 1
+_BYTE_KINDS[[ord("}"), ord("]")]] = -1
+_BYTE_KINDS[ord('"')] = QUOTE
+# Bytes scanned at once when skipping, doubled until the skipped container ends
+SKIP_WINDOW = 4096
+
+# Containers the parser keeps track of; every other one is skipped by counting brackets
+ROOT, EVENTS, EVENT = "root", "events", "event"
+# Fields read from the run (ROOT) and from each of its events (EVENT)
+ROOT_FIELDS = ("status",)
+EVENT_FIELDS = ("type", "duration")
+
+
+class _Frame:
+    __slots__ = ("role", "key", "expecting_key", "fields")
+
+    def __init__(self, role: str):
+        self.role = role
+        self.key: Optional[str] = None
+        self.expecting_key = role != EVENTS
+        self.fields = {}
+
+
+class RunDataParser:
+    """Incremental parser of a HappyRobot run document for its status and call duration
+
+    Bytes are fed as they arrive. Only the run's `status` and the `type` and
+    `duration` of each element of its `events` array are decoded; every other
+    value, including the long transcripts of the events, is skipped with
+    regex scans and never kept, so memory stays bounded by the chunk size.
+    `feed` returns True once both fields are known (the duration is that of
+    the first "session" event, "" if the events end without one), after
+    which the rest of the body does not need to be read.
+
+    Raises ValueError from `feed` on a scalar that is not valid JSON.
+    """
+
+    def __init__(self):
+        self.status: Any = None
+        self.duration: Any = ""
+        self.status_found = False
+        self.duration_found = False
+        self.finished = False
+        self._stack: List[_Frame] = []
+        self._pending = b""
+        self._skip_depth = 0
+        self._in_string = False
+        # Raw bytes of the string being read, None when it is skipped
+        self._string: Optional[bytearray] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished or (self.status_found and self.duration_found)
+
+    def _wanted(self) -> bool:
+        """Whether the value starting now is a field that is read"""
+        if not self._stack:
+            return False
+        frame = self._stack[-1]
+        if frame.role == ROOT:
+            return frame.key in ROOT_FIELDS
+        return frame.role == EVENT and frame.key in EVENT_FIELDS
+
+    def _value(self, value: Any):
+        """A value at the top of the stack is complete (None for skipped ones)"""
+        if not self._stack:
+            self.finished = True
+            return
+        frame = self._stack[-1]
+        if frame.role == ROOT and frame.key == "status" and not self.status_found:
+            self.status, self.status_found = value, True
+        elif frame.role == EVENT and frame.key in EVENT_FIELDS:
+            frame.fields[frame.key] = value
+
+    def _open(self, bracket: int):
+        frame = self._stack[-1] if self._stack else None
+        if frame is None and bracket == ord("{"):
+            self._stack.append(_Frame(ROOT))
+        elif frame is not None and frame.role == ROOT and frame.key == "events" and bracket == ord("[") and not self.duration_found:
+            self._stack.append(_Frame(EVENTS))
+        elif frame is not None and frame.role == EVENTS and bracket == ord("{"):
+            self._stack.append(_Frame(EVENT))
+        else:
+            self._skip_depth = 1
+
+    def _close(self):
+        frame = self._stack.pop()
+        if frame.role == EVENT and frame.fields.get("type") == "session" and not self.duration_found:
+            self.duration, self.duration_found = frame.fields.get("duration"), True
+        elif frame.role == EVENTS:
+            # No session event: the duration stays ""
+            self.duration_found = True
+        self._value(None)
+
+    def _end_string(self, raw: Optional[bytes]):
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and frame.expecting_key:
+            frame.key, frame.expecting_key = json.loads(b'"' + raw + b'"'), False
+        else:
+            self._value(json.loads(b'"' + raw + b'"') if raw is not None else None)
+
+    def _skip(self, buffer: bytes, position: int) -> int:
+        """Scan the skipped containers with NumPy in growing windows; returns where to go on from
+
+        Escaped quotes are blanked out first, so quotes toggle between inside
+        and outside strings, and the depth is the running sum of the brackets
+        outside strings. Stops after the bracket that closes the outermost
+        skipped container, or at the end of the buffer (minus a trailing
+        backslash whose escaped byte is still to come).
+        """
+        window = SKIP_WINDOW
+        while position < len(buffer):
+            region = buffer[position:position + window]
+            trailing = len(region) - len(region.rstrip(b"\\"))
+            if trailing % 2:
+                region = region[:-1]
+                if not region:
+                    return position
+            # Escaped backslashes, then escaped quotes, become plain bytes; pairing left to right is how JSON reads them
+            codes = np.frombuffer(region.replace(b"\\\\", b"__").replace(b'\\"', b"__"), dtype=np.uint8)
+            offsets = np.flatnonzero(_BYTE_KINDS.take(codes))
+            kinds = _BYTE_KINDS.take(codes[offsets])
+            quotes = np.cumsum(kinds == QUOTE) + self._in_string
+            depth = self._skip_depth + np.cumsum(np.where((kinds != QUOTE) & (quotes % 2 == 0), kinds, 0))
+            closed = np.flatnonzero(depth == 0)
+            if closed.size:
+                self._skip_depth, self._in_string = 0, False
+                self._value(None)
+                return position + int(offsets[closed[0]]) + 1
+            if offsets.size:
+                self._skip_depth, self._in_string = int(depth[-1]), bool(quotes[-1] % 2)
+            position += len(region)
+            window *= 2
+        return position
+
+    def feed(self, data: bytes) -> bool:
+        """Parse the next chunk of the body; True once the fields are known"""
+        buffer = self._pending + data if self._pending else data
+        position, end = 0, len(buffer)
+        while position < end and not self.done:
+            if self._skip_depth:
+                position = self._skip(buffer, position)
+                if self._skip_depth:
+                    break
+            elif self._in_string:
+                stop = _STRING_BODY.match(buffer, position).end()
+                if self._string is not None:
+                    self._string += buffer[position:stop]
+                if stop == end:
+                    position = end
+                elif buffer[stop] == ord("\\"):
+                    # The escaped byte is in the next chunk
+                    position = stop
+                    break
+                else:
+                    self._in_string = False
+                    position = stop + 1
+                    self._end_string(bytes(self._string) if self._string is not None else None)
+            else:
+                match = _NON_SPACE.search(buffer, position)
+                if match is None:
+                    position = end
+                    break
+                position = match.start()
+                byte = buffer[position]
+                if byte == ord('"'):
+                    frame = self._stack[-1] if self._stack else None
+                    keep = (frame is not None and frame.expecting_key) or self._wanted()
+                    self._in_string, self._string = True, bytearray() if keep else None
+                    position += 1
+                elif byte in b"{[":
+                    self._open(byte)
+                    position += 1
+                elif byte in b"}]":
+                    self._close()
+                    position += 1
+                elif byte == ord(","):
+                    if self._stack and self._stack[-1].role != EVENTS:
+                        self._stack[-1].expecting_key = True
+                    position += 1
+                elif byte == ord(":"):
+                    position += 1
+                else:
+                    literal_end = _LITERAL_END.search(buffer, position)
+                    if literal_end is None:
+                        # The literal may go on in the next chunk
+                        break
+                    literal = buffer[position:literal_end.start()]
+                    self._value(json.loads(literal) if self._wanted() else None)
+                    position = literal_end.start()
+        self._pending = buffer[position:] if position < end and not self.done else b""
+        return self.done
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+from app.instrumentation import registry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Search results remembered per call; older ones are dropped first
+MAX_SEARCHES_PER_SESSION = 20
+
+
+class CallSession:
+    """What one call has already looked up: carriers, geocodes, searches and prefetched loads
+
+    An agent validates the carrier and then searches loads several times with
+    small changes; the session lets those requests reuse each other's work
+    instead of going back to Nominatim and the database.
+    """
+
+    def __init__(self, call_id: str):
+        self.call_id = call_id
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+        self.carriers: Dict[str, bool] = {}
+        self.geocodes: Dict[str, Tuple[float, float]] = {}
+        self.searches: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._prefetches: Dict[Hashable, asyncio.Task] = {}
+
+    def lookup(self, kind: str, values: Dict, key: Hashable) -> Optional[Any]:
+        """values[key], counted as a session hit or miss of this kind"""
+        value = values.get(key)
+        registry.inc("call_session_requests_total", (kind, "miss" if value is None else "hit"))
+        return value
+
+    def remember_search(self, key: Hashable, result: Any):
+        self.searches[key] = result
+        self.searches.move_to_end(key)
+        while len(self.searches) > MAX_SEARCHES_PER_SESSION:
+            self.searches.popitem(last=False)
+
+    def prefetch(self, key: Hashable, func: Callable[[], Awaitable[Any]]):
+        """Start func() in the background unless a prefetch for key was already started"""
+        if key in self._prefetches:
+            return
+        task = asyncio.ensure_future(func())
+        task.add_done_callback(lambda task, key=key: self._prefetch_done(key, task))
+        self._prefetches[key] = task
+
+    def _prefetch_done(self, key: Hashable, task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.warning("Prefetch %s for call %s failed: %s", key, self.call_id, task.exception())
+            # Let a later request try again
+            self._prefetches.pop(key, None)
+
+    def prefetched(self, key: Hashable) -> Optional[Any]:
+        """Result of a finished prefetch, or None while it is running or if it was never started"""
+        task = self._prefetches.get(key)
+        result = task.result() if task is not None and task.done() and not task.cancelled() and task.exception() is None else None
+        registry.inc("call_session_requests_total", ("prefetch", "miss" if result is None else "hit"))
+        return result
+
+    def forget_load(self, load_id: str):
+        """Drop a load that was booked from the session: searches that returned it are forgotten, prefetched loads lose it"""
+        for key, result in list(self.searches.items()):
+            if any(load.get("load_id") == load_id for load in result[0]):
+                del self.searches[key]
+        for task in self._prefetches.values():
+            prefetched = task.result() if task.done() and not task.cancelled() and task.exception() is None else None
+            if prefetched is not None:
+                prefetched.loads = [load for load in prefetched.loads if load.get("load_id") != load_id]
+
+    def close(self):
+        for task in self._prefetches.values():
+            task.cancel()
+        self._prefetches.clear()
+
+
+class CallSessionStore:
+    """Sessions of the calls this worker is serving, evicted after `idle_seconds` without a request
+
+    Sessions are per worker: requests of one call routed to another worker
+    start their own session there.
+    """
+
+    def __init__(self, idle_seconds: float, max_sessions: int):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, CallSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, call_id: str):
+        session = self._sessions.pop(call_id)
+        session.close()
+        logger.debug("Evicted session of call %s after %.0fs", call_id, time.monotonic() - session.created_at)
+
+    def get(self, call_id: Optional[str]) -> Optional[CallSession]:
+        """Session of the call, created on its first request; None without a call id or when sessions are disabled"""
+        if not call_id or self.idle_seconds <= 0:
+            return None
+        now = time.monotonic()
+        # Sessions are ordered by last request, so the idle ones are at the front
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_seen < self.idle_seconds:
+                break
+            self._evict(oldest_id)
+
+        session = self._sessions.get(call_id)
+        if session is None:
+            session = self._sessions[call_id] = CallSession(call_id)
+            while len(self._sessions) > self.max_sessions:
+                self._evict(next(iter(self._sessions)))
+        else:
+            self._sessions.move_to_end(call_id)
+        session.last_seen = now
+        return session
+
+    def forget_load(self, load_id: str):
+        """Drop a booked load from every session on this worker"""
+        for session in self._sessions.values():
+            session.forget_load(load_id)
+
+    def close(self):
+        for call_id in list(self._sessions):
+            self._evict(call_id)
+
+
+# Global session store used by the carrier and load routers
+call_sessions = CallSessionStore(settings.session_idle_seconds, settings.session_max)
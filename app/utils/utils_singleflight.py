@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.instrumentation import registry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one in-flight computation
+
+    The first caller for a key starts the computation as a task; callers that
+    arrive while it is running await the same task and receive the same result
+    or exception. Results are not cached: once the task finishes the next call
+    starts a new one.
+
+    A waiter that is cancelled (e.g. its client disconnected) only stops
+    waiting; the computation keeps running for the others and is cancelled
+    when its last waiter is gone, at which point the key is free again so a
+    new caller starts a fresh computation instead of joining the cancelled
+    one. If the computation itself is cancelled, every waiter gets
+    CancelledError.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, call: _Call, task: asyncio.Task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception as retrieved when every waiter left before it was raised
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of func(), sharing it with concurrent callers using the same key"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task, key=key, call=call: self._forget(key, call, task))
+            registry.inc("singleflight_calls_total", (self.name, "leader"))
+        else:
+            logger.debug("Joining in-flight %s call for %s", self.name, key)
+            registry.inc("singleflight_calls_total", (self.name, "follower"))
+
+        call.waiters += 1
+        try:
+            # Shield so one waiter's cancellation does not cancel the shared task
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                logger.debug("Cancelling %s call for %s - no waiters left", self.name, key)
+                # Forget the key now: the done callback only runs on a later loop iteration
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
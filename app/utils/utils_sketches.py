@@ -0,0 +1,295 @@
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from app.config import settings
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Metrics columns tracked with a quantile sketch
+SKETCHED_METRICS = ("call_duration", "negotiation_attempts", "negotiation_performance", "rate_difference")
+
+# Values closer to zero than this are counted as zero
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative-error guarantees (DDSketch)
+
+    Values are counted in logarithmic buckets, so any quantile is returned within
+    `relative_accuracy` of the true value. Negative values use a mirrored set of
+    buckets. When the number of buckets exceeds `max_buckets` the lowest buckets
+    are collapsed, which keeps memory bounded at the cost of accuracy for the
+    smallest magnitudes only.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def _collapse(self, store: Dict[int, int]):
+        """Merge the lowest buckets of a store until it fits within max_buckets"""
+        if len(store) <= self.max_buckets:
+            return
+        indexes = sorted(store)
+        overflow = indexes[:len(indexes) - self.max_buckets + 1]
+        target = overflow[-1]
+        store[target] = sum(store.pop(index) for index in overflow[:-1]) + store[target]
+
+    def add(self, value: float, weight: int = 1):
+        """Add a value to the sketch"""
+        value = float(value)
+        if math.isnan(value) or math.isinf(value):
+            return
+        if value > MIN_INDEXABLE_VALUE:
+            index = self._index(value)
+            self.positive[index] = self.positive.get(index, 0) + weight
+            self._collapse(self.positive)
+        elif value < -MIN_INDEXABLE_VALUE:
+            index = self._index(-value)
+            self.negative[index] = self.negative.get(index, 0) + weight
+            self._collapse(self.negative)
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.sum += value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "DDSketch"):
+        """Merge another sketch with the same relative accuracy into this one"""
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if other.count == 0:
+            return
+        for index, bucket_count in other.positive.items():
+            self.positive[index] = self.positive.get(index, 0) + bucket_count
+        for index, bucket_count in other.negative.items():
+            self.negative[index] = self.negative.get(index, 0) + bucket_count
+        self._collapse(self.positive)
+        self._collapse(self.negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the estimated value at quantile q (0 <= q <= 1), or None if the sketch is empty"""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = 0
+        # Walk from the most negative value to the most positive one
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return self._clamp(-self._value(index))
+        seen += self.zero_count
+        if seen > rank:
+            return self._clamp(0.0)
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._clamp(self._value(index))
+        return self.max
+
+    def _clamp(self, value: float) -> float:
+        """Keep bucket estimates within the exact observed range"""
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "positive": {str(index): bucket_count for index, bucket_count in self.positive.items()},
+            "negative": {str(index): bucket_count for index, bucket_count in self.negative.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DDSketch":
+        sketch = cls(data["relative_accuracy"], data.get("max_buckets", 2048))
+        sketch.positive = {int(index): bucket_count for index, bucket_count in data.get("positive", {}).items()}
+        sketch.negative = {int(index): bucket_count for index, bucket_count in data.get("negative", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+class SketchRegistry:
+    """Named DDSketches for this worker, persisted to a file shared by all workers
+
+    Values recorded by this worker are kept in a pending sketch per metric. A
+    flush merges the pending sketches into the state file under an exclusive
+    file lock and then clears them, so every worker contributes each value
+    exactly once and the file survives restarts. Flushes run from
+    `run_flush_loop` in a thread, never on the request path. Reads merge the
+    file with whatever this worker has not flushed yet; the parsed file is
+    reused until its modification time or size changes.
+    """
+
+    def __init__(self, names: Iterable[str], state_path: str = "", relative_accuracy: float = 0.01, max_buckets: int = 2048, flush_interval: float = 30.0):
+        self.names = tuple(names)
+        self.state_path = state_path
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = self._empty()
+        self._file_lock = threading.Lock()
+        self._state_cache: Optional[tuple] = None
+
+    def _empty(self) -> Dict[str, DDSketch]:
+        return {name: DDSketch(self.relative_accuracy, self.max_buckets) for name in self.names}
+
+    def record(self, name: str, value: Any):
+        """Record a value for a metric; None, empty and non-numeric values are ignored"""
+        if value is None or value == "" or isinstance(value, bool):
+            return
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            logger.debug("Ignoring non-numeric value for sketch %s: %r", name, value)
+            return
+        with self._lock:
+            self._pending[name].add(value)
+
+    def _read_state(self) -> Dict[str, DDSketch]:
+        sketches = self._empty()
+        if not self.state_path or not os.path.exists(self.state_path):
+            return sketches
+        try:
+            with open(self.state_path, "r") as f:
+                data = json.load(f)
+            for name, sketch_data in data.items():
+                if name in sketches:
+                    sketches[name] = DDSketch.from_dict(sketch_data)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Error reading sketch state from %s: %s", self.state_path, str(e))
+        return sketches
+
+    def _cached_state(self) -> Dict[str, DDSketch]:
+        """Return a copy of the state file's sketches, parsing the file only when it changed"""
+        try:
+            stat = os.stat(self.state_path) if self.state_path else None
+            version = (stat.st_mtime_ns, stat.st_size) if stat else None
+        except OSError:
+            version = None
+        cached = self._state_cache
+        if cached is None or cached[0] != version:
+            cached = self._state_cache = (version, self._read_state())
+        state = self._empty()
+        for name, sketch in cached[1].items():
+            state[name].merge(sketch)
+        return state
+
+    def flush(self):
+        """Merge pending sketches into the shared state file"""
+        if not self.state_path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, self._empty()
+        if not any(sketch.count for sketch in pending.values()):
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            with self._file_lock, open(f"{self.state_path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    state = self._read_state()
+                    for name, sketch in pending.items():
+                        state[name].merge(sketch)
+                    tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w") as f:
+                        json.dump({name: sketch.to_dict() for name, sketch in state.items()}, f)
+                    os.replace(tmp_path, self.state_path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            logger.debug("Flushed metric sketches to %s", self.state_path)
+        except OSError as e:
+            logger.error("Error flushing metric sketches to %s: %s", self.state_path, str(e))
+            # Keep the values so the next flush can retry
+            with self._lock:
+                for name, sketch in pending.items():
+                    self._pending[name].merge(sketch)
+
+    def snapshot(self) -> Dict[str, DDSketch]:
+        """Return merged sketches (persisted state plus this worker's pending values)"""
+        state = self._cached_state()
+        with self._lock:
+            for name, sketch in self._pending.items():
+                state[name].merge(sketch)
+        return state
+
+    async def run_flush_loop(self):
+        """Flush pending values every flush_interval seconds, off the event loop, until cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await asyncio.to_thread(self.flush)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.flush)
+            raise
+
+    def percentiles(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[str, Dict[str, Any]]:
+        """Summarize every sketch with count, min, max and the requested percentiles"""
+        quantiles = tuple(quantiles)
+        summary = {}
+        for name, sketch in self.snapshot().items():
+            entry = {
+                "count": sketch.count,
+                "min": sketch.min if sketch.count else None,
+                "max": sketch.max if sketch.count else None,
+            }
+            for q in quantiles:
+                entry[f"p{q * 100:g}"] = sketch.quantile(q)
+            summary[name] = entry
+        return summary
+
+
+# Global sketch registry for the metrics table
+metric_sketches = SketchRegistry(
+    SKETCHED_METRICS,
+    state_path=settings.sketch_state_path,
+    relative_accuracy=settings.sketch_relative_accuracy,
+    max_buckets=settings.sketch_max_buckets,
+    flush_interval=settings.sketch_flush_interval,
+)
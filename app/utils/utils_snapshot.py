@@ -0,0 +1,250 @@
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LOADSNP1"
+# Arrays start on 64-byte boundaries so every view is aligned for its dtype
+ALIGNMENT = 64
+
+# Fixed-width columns of a snapshot; missing values are NaN (and -1 for equipment_code)
+COLUMNS = {
+    "origin_lat": "<f8",
+    "origin_lng": "<f8",
+    "destination_lat": "<f8",
+    "destination_lng": "<f8",
+    "loadboard_rate": "<f8",
+    "miles": "<f8",
+    "pickup_epoch": "<f8",
+    "delivery_epoch": "<f8",
+    "equipment_code": "<i4",
+    # String table: row i is the JSON of the load in row_data[row_offsets[i]:row_offsets[i + 1]]
+    "row_offsets": "<i8",
+    "row_data": "u1",
+}
+
+# How often a worker with no snapshot retries the lock while another worker builds the file
+LOCK_RETRY_SECONDS = 0.05
+
+# (st_dev, st_ino, st_mtime_ns) of the file a snapshot was mapped from
+FileIdentity = Tuple[int, int, int]
+
+
+def epoch(value) -> Optional[float]:
+    """Unix time of a datetime or ISO string; naive values are UTC, like the rest of the load search"""
+    if value is None:
+        return None
+    try:
+        value = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return (value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _number(value) -> float:
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _identity(stat: os.stat_result) -> FileIdentity:
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns
+
+
+class LoadSnapshot:
+    """Open loads as columnar NumPy arrays, built from rows or memory-mapped from a snapshot file
+
+    The file is a header (magic, JSON length, JSON with the column offsets,
+    the equipment types and built_at) followed by the arrays of COLUMNS, so
+    mapping it is a few views and no parsing. Mappings are read-only and
+    shared: every worker that maps the same file reads the same page-cache
+    pages. Files are replaced atomically, and a mapping stays valid after its
+    file was replaced, so readers never see a half-written snapshot.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], equipment_types: List[str], built_at: float, identity: Optional[FileIdentity] = None):
+        self.columns = columns
+        self.equipment_types = equipment_types
+        self.built_at = built_at
+        self.identity = identity
+
+    def __len__(self) -> int:
+        return len(self.columns["row_offsets"]) - 1
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """The full load of row `index`, decoded from the string table"""
+        offsets = self.columns["row_offsets"]
+        return json.loads(self.columns["row_data"][offsets[index]:offsets[index + 1]].tobytes())
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "LoadSnapshot":
+        codes: Dict[str, int] = {}
+        values: Dict[str, List[float]] = {name: [] for name in ("origin_lat", "origin_lng", "destination_lat", "destination_lng", "loadboard_rate", "miles")}
+        pickups, deliveries, equipment, offsets, encoded = [], [], [], [0], []
+        for row in rows:
+            for name, column in values.items():
+                column.append(_number(row.get(name)))
+            pickup, delivery = epoch(row.get("pickup_datetime")), epoch(row.get("delivery_datetime"))
+            pickups.append(math.nan if pickup is None else pickup)
+            deliveries.append(math.nan if delivery is None else delivery)
+            equipment_type = row.get("equipment_type")
+            equipment.append(codes.setdefault(equipment_type, len(codes)) if equipment_type else -1)
+            data = json.dumps(row, default=str, separators=(",", ":")).encode()
+            encoded.append(data)
+            offsets.append(offsets[-1] + len(data))
+
+        columns = {name: np.array(column, dtype=COLUMNS[name]) for name, column in values.items()}
+        columns["pickup_epoch"] = np.array(pickups, dtype=COLUMNS["pickup_epoch"])
+        columns["delivery_epoch"] = np.array(deliveries, dtype=COLUMNS["delivery_epoch"])
+        columns["equipment_code"] = np.array(equipment, dtype=COLUMNS["equipment_code"])
+        columns["row_offsets"] = np.array(offsets, dtype=COLUMNS["row_offsets"])
+        columns["row_data"] = np.frombuffer(b"".join(encoded), dtype=COLUMNS["row_data"])
+        return cls(columns, list(codes), time.time())
+
+    def write(self, path: str):
+        """Write the snapshot to `path`, atomically replacing the previous file"""
+        layout, offset = {}, 0
+        for name in COLUMNS:
+            layout[name] = {"dtype": COLUMNS[name], "offset": offset, "length": len(self.columns[name])}
+            offset = _align(offset + self.columns[name].nbytes)
+        header = json.dumps({"built_at": self.built_at, "equipment_types": self.equipment_types, "columns": layout}).encode()
+        data_start = _align(len(MAGIC) + 8 + len(header))
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name in COLUMNS:
+                f.seek(data_start + layout[name]["offset"])
+                f.write(np.ascontiguousarray(self.columns[name], dtype=COLUMNS[name]).tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path: str) -> "LoadSnapshot":
+        """Map a snapshot file read-only
+
+        Raises:
+            OSError: If the file cannot be opened or mapped
+            ValueError: If the file is not a load snapshot
+        """
+        with open(path, "rb") as f:
+            identity = _identity(os.fstat(f.fileno()))
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a load snapshot")
+        (header_length,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(buffer[header_start:header_start + header_length])
+        data_start = _align(header_start + header_length)
+        columns = {
+            name: np.frombuffer(buffer, dtype=spec["dtype"], count=spec["length"], offset=data_start + spec["offset"])
+            for name, spec in header["columns"].items()
+        }
+        if set(columns) != set(COLUMNS):
+            raise ValueError(f"{path} has columns {sorted(columns)}, expected {sorted(COLUMNS)}")
+        return cls(columns, header["equipment_types"], header["built_at"], identity)
+
+
+def file_identity(path: str) -> Optional[FileIdentity]:
+    """Identity of the snapshot file currently at `path`, None if there is none"""
+    try:
+        return _identity(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+class SnapshotFile:
+    """Snapshot file at `path` shared by all workers, rebuilt once it is older than `max_age` seconds
+
+    The first worker to find the file missing or stale takes an exclusive
+    lock and rebuilds it from the database; the others keep using the file
+    they have mapped, or on a cold start with no file yet poll for the
+    lock (or the finished file) for up to `lock_timeout` seconds, so one
+    worker queries the database per refresh instead of all of them. A
+    worker that gives up waiting builds its own snapshot without writing it.
+    """
+
+    def __init__(self, path: str, max_age: float, lock_timeout: float = 30.0):
+        self.path = path
+        self.max_age = max_age
+        self.lock_timeout = lock_timeout
+
+    def _fresh(self, snapshot: Optional[LoadSnapshot]) -> bool:
+        return snapshot is not None and time.time() - snapshot.built_at < self.max_age
+
+    def _open(self) -> Optional[LoadSnapshot]:
+        try:
+            return LoadSnapshot.open(self.path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Could not map load snapshot %s: %s", self.path, e)
+            return None
+
+    async def load(self, fetch_rows: Callable[[], Awaitable[List[Dict[str, Any]]]], current: Optional[LoadSnapshot] = None) -> LoadSnapshot:
+        """The current snapshot: `current` if the file did not change since it was mapped, else the file, rebuilt if stale"""
+        identity = file_identity(self.path)
+        if identity is not None and current is not None and current.identity == identity and self._fresh(current):
+            return current
+        snapshot = self._open() if identity is not None else None
+        if self._fresh(snapshot):
+            return snapshot
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # The lock is only ever tried without blocking, so waiting for it never ties up a thread
+        with open(f"{self.path}.lock", "w") as lock_file:
+            give_up_at = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if snapshot is not None:
+                        # Another worker is rebuilding it; the stale snapshot serves until then
+                        return snapshot
+                if time.monotonic() >= give_up_at:
+                    logger.warning("Timed out after %.0fs waiting for the load snapshot lock - building without it", self.lock_timeout)
+                    return await asyncio.to_thread(LoadSnapshot.from_rows, await fetch_rows())
+                await asyncio.sleep(LOCK_RETRY_SECONDS)
+                # The worker holding the lock may have finished the file meanwhile
+                snapshot = self._open()
+                if self._fresh(snapshot):
+                    return snapshot
+                snapshot = None
+            try:
+                # The file may have been rebuilt while waiting for the lock
+                snapshot = self._open()
+                if self._fresh(snapshot):
+                    return snapshot
+                built = await asyncio.to_thread(LoadSnapshot.from_rows, await fetch_rows())
+                try:
+                    await asyncio.to_thread(built.write, self.path)
+                except OSError as e:
+                    logger.warning("Could not write load snapshot %s: %s", self.path, e)
+                    return built
+                logger.info("Wrote load snapshot %s with %s loads", self.path, len(built))
+                return self._open() or built
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,100 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+from app.config import settings
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+class RecentOrigins:
+    """Search origins seen recently by all workers, used to pre-geocode on warm-up
+
+    Each worker counts origins in memory; a flush merges the counts into a
+    JSON file shared by all workers (under an exclusive file lock, as the
+    sketch registry does) and drops origins not searched within `window`
+    seconds, so the file tracks recent traffic rather than all-time traffic.
+    """
+
+    def __init__(self, path: str, window: float, flush_interval: float = 60.0):
+        self.path = path
+        self.window = window
+        self.flush_interval = flush_interval
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, origin: str):
+        if not self.path or not origin:
+            return
+        with self._lock:
+            self._pending[origin] += 1
+
+    def _read(self) -> Dict[str, Dict[str, float]]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Error reading recent origins from %s: %s", self.path, e)
+            return {}
+
+    def flush(self):
+        """Merge this worker's counts into the shared file"""
+        if not self.path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return
+
+        now = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    origins = self._read()
+                    for origin, count in pending.items():
+                        entry = origins.setdefault(origin, {"count": 0, "last_seen": now})
+                        entry["count"] += count
+                        entry["last_seen"] = now
+                    origins = {origin: entry for origin, entry in origins.items() if now - entry["last_seen"] <= self.window}
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w") as f:
+                        json.dump(origins, f)
+                    os.replace(tmp_path, self.path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.error("Error flushing recent origins to %s: %s", self.path, e)
+
+    def top(self, limit: int) -> List[str]:
+        """Most searched origins within the window, most frequent first"""
+        now = time.time()
+        origins = {origin: entry["count"] for origin, entry in self._read().items() if now - entry["last_seen"] <= self.window}
+        with self._lock:
+            for origin, count in self._pending.items():
+                origins[origin] = origins.get(origin, 0) + count
+        return [origin for origin, _ in Counter(origins).most_common(limit)]
+
+    async def run_flush_loop(self):
+        """Flush every flush_interval seconds, off the event loop, until cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await asyncio.to_thread(self.flush)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.flush)
+            raise
+
+
+# Global tracker fed by load searches
+recent_origins = RecentOrigins(settings.recent_origins_path, settings.recent_origins_window_days * 86400)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Warm-up progress of this worker, reported by /ready"""
+
+    def __init__(self):
+        self.ready = False
+        self.import_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.time_to_ready_seconds: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        # Set by app.main before its imports start
+        self.process_started: float = time.perf_counter()
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "time_to_ready_seconds": self.time_to_ready_seconds,
+            "steps": self.steps,
+        }
+
+
+readiness = Readiness()
+
+
+async def _step(name: str, coroutine):
+    start_time = time.perf_counter()
+    try:
+        result = await coroutine
+        readiness.steps[name] = {"ok": True, "seconds": round(time.perf_counter() - start_time, 4)}
+        return result
+    except Exception as e:
+        logger.warning("Warm-up step %s failed: %s", name, e)
+        readiness.steps[name] = {"ok": False, "seconds": round(time.perf_counter() - start_time, 4), "error": str(e)}
+
+
+async def _preimport():
+    """Import the modules that are deferred at startup"""
+    def load():
+        import httpx  # noqa: F401 - used by the HappyRobot client
+        from app.utils.utils_loads import get_geolocator
+        get_geolocator()
+
+    await asyncio.to_thread(load)
+
+
+async def _pregeocode(limit: int) -> int:
+    """Geocode the most searched recent origins so their first searches hit the cache"""
+    from app.utils.utils_loads import get_coordinates
+    from app.utils.utils_traffic import recent_origins
+
+    origins = await asyncio.to_thread(recent_origins.top, limit)
+    for origin in origins:
+        await get_coordinates(origin)
+    logger.info("Pre-geocoded %s recent origins", len(origins))
+    return len(origins)
+
+
+async def warm_up():
+    """Open database connections, load deferred modules, build the load graph and pre-geocode popular origins
+
+    Each step is best effort: a failing dependency is logged and recorded, and
+    the worker still becomes ready once every step finished or WARMUP_TIMEOUT
+    passed, so an outage elsewhere cannot keep it out of rotation forever.
+    """
+    from app.supabase import supabase
+    from app.utils.utils_chains import load_graph
+
+    start_time = time.perf_counter()
+    steps = asyncio.gather(
+        _step("database_pool", supabase.warm_up(settings.warmup_connections)),
+        _step("imports", _preimport()),
+        _step("load_graph", load_graph.refresh()),
+    )
+    try:
+        await asyncio.wait_for(steps, timeout=settings.warmup_timeout)
+        remaining = settings.warmup_timeout - (time.perf_counter() - start_time)
+        if settings.warmup_top_origins and remaining > 0:
+            await asyncio.wait_for(_step("geocode_origins", _pregeocode(settings.warmup_top_origins)), timeout=remaining)
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up did not finish within %ss, marking ready anyway", settings.warmup_timeout)
+
+    readiness.warmup_seconds = time.perf_counter() - start_time
+    readiness.time_to_ready_seconds = time.perf_counter() - readiness.process_started
+    readiness.ready = True
+    logger.info("Warm-up finished in %.3fs - time to ready %.3fs", readiness.warmup_seconds, readiness.time_to_ready_seconds)
@@ -0,0 +1,125 @@
+"""
+Per-request logging overhead: the old eager, synchronous setup vs the queued pipeline.
+
+The "before" configuration reproduces what app/main.py used to do: basicConfig with a
+stdout-style stream handler plus app.log, app.utils forced to DEBUG and f-string messages
+built on every call. The "after" configuration uses app.logging_config.setup_logging with
+lazy %-style arguments, INFO level and per-logger sampling.
+
+Each simulated request emits the log calls made by verify_api_key, validate_mc_format,
+generate_query and find_loads_within_radius for one load search.
+
+Usage:
+    python -m benchmarks.bench_logging [--requests 20000]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from datetime import date
+
+from app.logging_config import setup_logging, shutdown_logging
+
+MC_PATTERN = r'^MC\s\d{6}$'
+
+SAMPLE_QUERY = {
+    "equipment_type": "dryvan",
+    "origin_box": (40.1, 42.9, -89.5, -85.7),
+    "destination_box": (33.1, 35.9, -120.0, -116.4),
+    "pickup_datetime": None,
+    "min_pickup_date": date.today(),
+}
+
+
+def request_before(auth, utils, routes, api_key, mc_number, origin):
+    """Log calls made by one request before the change (f-strings, eager formatting)"""
+    auth.debug("Starting API key verification")
+    auth.debug(f"API key provided: {api_key[:8]}...")
+    auth.debug("API key verification successful")
+    routes.info(f"Starting load search - Equipment: Dry Van, Origin: {origin}")
+    utils.debug(f"Validating MC format for: {mc_number}")
+    utils.debug(f"Using regex pattern: {MC_PATTERN}")
+    utils.debug(f"MC format validation result: {True}")
+    utils.debug(f"Starting load search - Equipment: dryvan, Origin: {origin}")
+    utils.debug(f"Getting coordinates for: {origin}")
+    utils.debug(f"Found coordinates for {origin}: lat={41.8781}, lng={-87.6298}")
+    for attempt in range(1, 4):
+        utils.debug(f"Has Destination: {True}, Has Pickup Datetime: {False}")
+        utils.debug(f"Filtering loads with pickup_datetime >= {date.today()}")
+        utils.debug(f"Generated query: {SAMPLE_QUERY}")
+        utils.debug(f"Attempt {attempt} returned {0} loads")
+    routes.info(f"Load search completed in {0.123:.3f}s")
+
+
+def request_after(auth, utils, routes, api_key, mc_number, origin):
+    """Log calls made by one request after the change (lazy arguments)"""
+    auth.debug("Starting API key verification")
+    auth.debug("API key provided: %s...", api_key[:8])
+    auth.debug("API key verification successful")
+    routes.info("Starting load search - Equipment: %s, Origin: %s", "Dry Van", origin)
+    utils.debug("Validating MC format for: %s", mc_number)
+    utils.debug("MC format validation result: %s", True)
+    utils.debug("Starting load search - Equipment: %s, Origin: %s", "dryvan", origin)
+    utils.debug("Getting coordinates for: %s", origin)
+    utils.debug("Found coordinates for %s: lat=%s, lng=%s", origin, 41.8781, -87.6298)
+    for attempt in range(1, 4):
+        utils.debug("Has Destination: %s, Has Pickup Datetime: %s", True, False)
+        utils.debug("Filtering loads with pickup_datetime >= %s", date.today())
+        utils.debug("Generated query: %s", SAMPLE_QUERY)
+        utils.debug("Attempt %s returned %s loads", attempt, 0)
+    routes.info("Load search completed in %.3fs", 0.123)
+
+
+def configure_before(log_path):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    stream = open(os.devnull, "w")
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(stream), logging.FileHandler(log_path, mode="a")],
+        force=True,
+    )
+    logging.getLogger("app.utils").setLevel(logging.DEBUG)
+    logging.getLogger("app.auth").setLevel(logging.INFO)
+    logging.getLogger("app.routers.loads").setLevel(logging.INFO)
+
+
+def configure_after(log_path):
+    for name in ("app.utils", "app.auth", "app.routers.loads"):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    setup_logging(level="INFO", log_format="json", log_file=log_path, sample_rates={"app.routers.loads": 0.1}, stream=open(os.devnull, "w"))
+
+
+def run(label, configure, emit, requests, log_path):
+    configure(log_path)
+    auth = logging.getLogger("app.auth")
+    utils = logging.getLogger("app.utils.utils_loads")
+    routes = logging.getLogger("app.routers.loads")
+
+    start = time.perf_counter()
+    for i in range(requests):
+        emit(auth, utils, routes, "test-api-key-12345", "MC 123456", f"City {i % 50}")
+    elapsed = time.perf_counter() - start
+    per_request_us = elapsed / requests * 1e6
+    print(f"{label:<8} {requests} requests in {elapsed:.3f}s -> {per_request_us:.1f} us/request on the request path")
+    return per_request_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run("before", configure_before, request_before, args.requests, os.path.join(tmp, "before.log"))
+        after = run("after", configure_after, request_after, args.requests, os.path.join(tmp, "after.log"))
+        shutdown_logging()
+
+    print(f"speedup  {before / after:.1f}x less logging time per request")
+
+
+if __name__ == "__main__":
+    main()
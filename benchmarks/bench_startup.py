@@ -0,0 +1,65 @@
+"""
+Measure app import time and time-to-ready.
+
+Each run starts a fresh interpreter that imports app.main, enters the app
+lifespan and waits until the warm-up marks the worker ready, then reports
+the import time, warm-up time and total time-to-ready as measured by the app
+itself (the same values /ready returns). Runs use the in-memory database and
+no pre-geocoding unless the environment says otherwise.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.main import app
+from app.warmup import readiness
+
+async def main():
+    async with app.router.lifespan_context(app):
+        while not readiness.ready:
+            await asyncio.sleep(0.001)
+        state = readiness.state()
+        state["wall_seconds"] = time.perf_counter() - started
+        print("RESULT " + json.dumps(state))
+
+asyncio.run(main())
+"""
+
+
+def run_once(env) -> dict:
+    output = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True).stdout
+    for line in output.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"No result in child output:\n{output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    env = {
+        **os.environ,
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "ERROR"),
+        "SUPABASE_URL": os.environ.get("SUPABASE_URL", ""),
+        "SKETCH_STATE_PATH": os.environ.get("SKETCH_STATE_PATH", ""),
+        "RECENT_ORIGINS_PATH": os.environ.get("RECENT_ORIGINS_PATH", ""),
+    }
+    results = [run_once(env) for _ in range(args.runs)]
+    for key in ("import_seconds", "warmup_seconds", "time_to_ready_seconds", "wall_seconds"):
+        values = [result[key] for result in results]
+        print(f"{key:<24} median {statistics.median(values) * 1000:8.1f} ms  min {min(values) * 1000:8.1f} ms  max {max(values) * 1000:8.1f} ms")
+    print("warm-up steps of last run:", json.dumps(results[-1]["steps"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Local stand-ins for the external services used by the API, for benchmarks.
+
+Each fake is a small Starlette app served by uvicorn on 127.0.0.1 in a background
+thread, so the API talks to it through its real client code (postgrest/httpx,
+geopy, httpx). Every fake takes a FaultConfig with added latency, jitter and an
+error rate.
+
+- FakePostgrest: PostgREST-compatible subset over in-memory tables
+  (select with eq/neq/gt/gte/lt/lte filters, order, limit, insert, update)
+- FakeNominatim: /search returning deterministic coordinates for known cities
+- FakeHappyRobot: /runs/{run_id} returning a run document with a session event
+"""
+import asyncio
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+CITIES = {
+    "Chicago, IL": (41.8781, -87.6298),
+    "Dallas, TX": (32.7767, -96.7970),
+    "Atlanta, GA": (33.7490, -84.3880),
+    "Los Angeles, CA": (34.0522, -118.2437),
+    "Houston, TX": (29.7604, -95.3698),
+    "Phoenix, AZ": (33.4484, -112.0740),
+    "Denver, CO": (39.7392, -104.9903),
+    "Memphis, TN": (35.1495, -90.0490),
+    "Columbus, OH": (39.9612, -82.9988),
+    "Kansas City, MO": (39.0997, -94.5786),
+    "Nashville, TN": (36.1627, -86.7816),
+    "Indianapolis, IN": (39.7684, -86.1581),
+    "Charlotte, NC": (35.2271, -80.8431),
+    "Seattle, WA": (47.6062, -122.3321),
+    "Salt Lake City, UT": (40.7608, -111.8910),
+    "Jacksonville, FL": (30.3322, -81.6557),
+}
+
+EQUIPMENT_TYPES = ["dryvan", "reefer", "flatbed"]
+
+
+@dataclass
+class FaultConfig:
+    """Latency and error injection for a fake service"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    async def apply(self) -> Optional[Response]:
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            return JSONResponse({"message": "injected failure"}, status_code=self.error_status)
+        return None
+
+
+def generate_loads(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Synthetic open loads between the known cities"""
+    rng = random.Random(seed)
+    cities = list(CITIES.items())
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    loads = []
+    for i in range(count):
+        (origin_name, (origin_lat, origin_lng)), (destination_name, (destination_lat, destination_lng)) = rng.sample(cities, 2)
+        pickup = now + timedelta(hours=rng.randint(1, 14 * 24))
+        loads.append({
+            "load_id": f"00000000-0000-0000-0000-{i:012d}",
+            "origin_city": origin_name.split(",")[0],
+            "origin_state": origin_name.split(", ")[1],
+            "destination_city": destination_name.split(",")[0],
+            "destination_state": destination_name.split(", ")[1],
+            "pickup_datetime": pickup.isoformat(),
+            "delivery_datetime": (pickup + timedelta(days=2)).isoformat(),
+            "equipment_type": rng.choice(EQUIPMENT_TYPES),
+            "loadboard_rate": round(rng.uniform(800, 4500), 2),
+            "notes": None,
+            "weight": float(rng.randint(5000, 45000)),
+            "commodity_type": "general",
+            "num_of_pieces": rng.randint(1, 30),
+            "miles": float(rng.randint(150, 2200)),
+            "dimensions": None,
+            "created_at": now.isoformat(),
+            "origin_lat": origin_lat + rng.uniform(-0.5, 0.5),
+            "origin_lng": origin_lng + rng.uniform(-0.5, 0.5),
+            "destination_lat": destination_lat + rng.uniform(-0.5, 0.5),
+            "destination_lng": destination_lng + rng.uniform(-0.5, 0.5),
+        })
+    return loads
+
+
+def generate_carriers(count: int) -> List[Dict[str, Any]]:
+    """Carriers with MC numbers 100000, 100001, ..."""
+    return [{"mc_number": str(100000 + i), "name": f"Carrier {i}"} for i in range(count)]
+
+
+def _parse_value(raw: str):
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+
+def _matches(row: Dict[str, Any], column: str, operator: str, raw: str) -> bool:
+    value = row.get(column)
+    if value is None:
+        return False
+    expected = _parse_value(raw)
+    if isinstance(value, (int, float)) and isinstance(expected, float):
+        actual = float(value)
+    else:
+        actual, expected = str(value), str(raw)
+    if operator == "eq":
+        return actual == expected
+    if operator == "neq":
+        return actual != expected
+    if operator == "gt":
+        return actual > expected
+    if operator == "gte":
+        return actual >= expected
+    if operator == "lt":
+        return actual < expected
+    if operator == "lte":
+        return actual <= expected
+    return False
+
+
+class FakePostgrest:
+    """PostgREST-compatible subset over in-memory tables"""
+
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], faults: Optional[FaultConfig] = None):
+        self.tables = tables
+        self.faults = faults or FaultConfig()
+        self._ids = itertools.count(1)
+        self.app = Starlette(routes=[Route("/rest/v1/{table}", self.handle, methods=["GET", "POST", "PATCH"])])
+
+    def _filtered(self, request: Request) -> List[Dict[str, Any]]:
+        rows = self.tables.setdefault(request.path_params["table"], [])
+        for column, condition in request.query_params.multi_items():
+            if column in ("select", "order", "limit", "offset") or "." not in condition:
+                continue
+            operator, raw = condition.split(".", 1)
+            rows = [row for row in rows if _matches(row, column, operator, raw)]
+        return rows
+
+    async def handle(self, request: Request) -> Response:
+        failure = await self.faults.apply()
+        if failure is not None:
+            return failure
+
+        table = request.path_params["table"]
+        if request.method == "POST":
+            body = json.loads(await request.body())
+            rows = body if isinstance(body, list) else [body]
+            for row in rows:
+                row.setdefault("id", next(self._ids))
+                row.setdefault("created_at", datetime.now().isoformat())
+            self.tables.setdefault(table, []).extend(rows)
+            return JSONResponse(rows, status_code=201)
+
+        rows = self._filtered(request)
+        if request.method == "PATCH":
+            changes = json.loads(await request.body())
+            for row in rows:
+                row.update(changes)
+            return JSONResponse(rows)
+
+        order = request.query_params.get("order")
+        if order:
+            column, _, direction = order.partition(".")
+            rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+        limit = request.query_params.get("limit")
+        if limit:
+            rows = rows[:int(limit)]
+        select = request.query_params.get("select", "*")
+        if select != "*":
+            columns = [column.strip() for column in select.split(",")]
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return JSONResponse(rows)
+
+
+class FakeNominatim:
+    """Nominatim /search stand-in returning coordinates for the known cities"""
+
+    def __init__(self, faults: Optional[FaultConfig] = None):
+        self.faults = faults or FaultConfig()
+        self.app = Starlette(routes=[Route("/search", self.search)])
+
+    async def search(self, request: Request) -> Response:
+        failure = await self.faults.apply()
+        if failure is not None:
+            return failure
+        query = request.query_params.get("q", "")
+        for name, (lat, lng) in CITIES.items():
+            if query.lower() in (name.lower(), name.split(",")[0].lower()):
+                return JSONResponse([{"lat": str(lat), "lon": str(lng), "display_name": name}])
+        return JSONResponse([])
+
+
+class FakeHappyRobot:
+    """HappyRobot /runs/{run_id} stand-in; `transcript_events` pads the document like long calls do"""
+
+    def __init__(self, faults: Optional[FaultConfig] = None, transcript_events: int = 50):
+        self.faults = faults or FaultConfig()
+        self.transcript_events = transcript_events
+        self.app = Starlette(routes=[Route("/runs/{run_id}", self.run)])
+
+    async def run(self, request: Request) -> Response:
+        failure = await self.faults.apply()
+        if failure is not None:
+            return failure
+        events = [{"type": "message", "role": "assistant", "content": "lorem ipsum " * 20} for _ in range(self.transcript_events)]
+        events.append({"type": "session", "duration": random.randint(30, 900)})
+        return JSONResponse({"id": request.path_params["run_id"], "status": "completed", "events": events})
+
+
+class ServerThread:
+    """Serve an ASGI app with uvicorn on 127.0.0.1 in a daemon thread"""
+
+    def __init__(self, app: Callable, port: Optional[int] = None):
+        self.port = port or _free_port()
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="error", access_log=False, lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "ServerThread":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Fake server on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,302 @@
+"""
+End-to-end load test of the API against local stand-ins for its dependencies.
+
+Boots the FastAPI app in-process (httpx ASGI transport) with its real clients
+pointed at local fakes for PostgREST/Supabase, Nominatim and the HappyRobot runs
+API (see benchmarks/fakes.py). Each fake has configurable latency, jitter and
+error rate. A weighted mix of /carriers/validate_carrier, /loads/find_matching_loads
+and /metrics/store_metrics is driven at each concurrency level, and throughput
+plus p50/p95/p99 latency are reported per endpoint.
+
+Results are written as JSON so two runs can be compared:
+
+    python -m benchmarks.load_test --output bench_before.json
+    ... change something ...
+    python -m benchmarks.load_test --output bench_after.json --compare bench_before.json
+
+With --compare, the exit status is 1 when any endpoint's p95 regressed by more
+than --max-regression (default 10%).
+
+With --db memory the app runs on its in-memory database engine
+(MockSupabaseClient) seeded with the same synthetic tables instead of going
+through the fake PostgREST server; --db-latency-ms then becomes its per-query
+delay.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from benchmarks.fakes import CITIES, FakeHappyRobot, FakeNominatim, FakePostgrest, FaultConfig, ServerThread, generate_carriers, generate_loads
+
+API_KEY = "bench-api-key"
+
+DEFAULT_MIX = {"validate_carrier": 0.4, "find_matching_loads": 0.45, "store_metrics": 0.15}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": (values[-1] * 1000) if values else 0.0,
+    }
+
+
+def build_request(kind: str, rng: random.Random, carrier_count: int):
+    """Return (method, path, params, json_body) for one request of the given kind"""
+    cities = list(CITIES)
+    if kind == "validate_carrier":
+        # Mostly known carriers, some unknown ones and some malformed numbers
+        roll = rng.random()
+        if roll < 0.8:
+            mc_number = f"MC {100000 + rng.randrange(carrier_count)}"
+        elif roll < 0.95:
+            mc_number = f"MC {900000 + rng.randrange(1000)}"
+        else:
+            mc_number = "MC12345"
+        return "GET", "/carriers/validate_carrier", {"mc_number": mc_number}, None
+    if kind == "find_matching_loads":
+        params = {"equipment_type": rng.choice(["Dry Van", "Reefer", "Flatbed"]), "origin": rng.choice(cities)}
+        if rng.random() < 0.5:
+            params["destination"] = rng.choice(cities)
+        if rng.random() < 0.3:
+            pickup = datetime.now() + timedelta(days=rng.randint(0, 10))
+            params["pickup_datetime"] = pickup.replace(minute=0, second=0, microsecond=0).isoformat()
+        return "GET", "/loads/find_matching_loads", params, None
+    body = {
+        "call_outcome": rng.choice(["Booked", "No Match", "Rejected"]),
+        "carrier_sentiment": rng.choice(["Positive", "Neutral", "Negative"]),
+        "load_loadboard_rate": 2000.0,
+        "carrier_initial_offer": float(rng.randint(2000, 2600)),
+        "load_agreed_rate": float(rng.randint(1900, 2300)),
+        "negotiation_attempts": rng.randint(0, 3),
+        "run_id": f"run-{rng.randrange(10**9)}",
+        "organization_id": "org-bench",
+    }
+    return "POST", "/metrics/store_metrics", None, body
+
+
+async def run_level(client, concurrency: int, total_requests: int, mix: Dict[str, float], seed: int, carrier_count: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=total_requests)
+    requests = [(kind, build_request(kind, rng, carrier_count)) for kind in kinds]
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in requests:
+        queue.put_nowait(item)
+
+    latencies: Dict[str, List[float]] = {kind: [] for kind in mix}
+    errors: Dict[str, int] = {kind: 0 for kind in mix}
+
+    async def worker():
+        while True:
+            try:
+                kind, (method, path, params, body) = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body, headers={"x-api-key": API_KEY})
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies[kind].append(time.perf_counter() - start)
+            errors[kind] += int(failed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "overall": summarize(all_latencies, sum(errors.values()), elapsed),
+        "endpoints": {kind: summarize(latencies[kind], errors[kind], elapsed) for kind in mix if latencies[kind]},
+    }
+
+
+def synthetic_tables(args) -> Dict[str, List[Dict[str, Any]]]:
+    return {
+        "loads": generate_loads(args.loads),
+        "carriers": generate_carriers(args.carriers),
+        "metrics": [],
+    }
+
+
+def start_fakes(args):
+    postgrest = None
+    if args.db == "postgrest":
+        postgrest = ServerThread(FakePostgrest(synthetic_tables(args), FaultConfig(args.db_latency_ms, args.db_jitter_ms, args.db_error_rate)).app).start()
+    nominatim = ServerThread(FakeNominatim(FaultConfig(args.geo_latency_ms, args.geo_jitter_ms, args.geo_error_rate)).app).start()
+    happyrobot = ServerThread(FakeHappyRobot(FaultConfig(args.hr_latency_ms, args.hr_jitter_ms, args.hr_error_rate), args.transcript_events).app).start()
+    return postgrest, nominatim, happyrobot
+
+
+def configure_environment(postgrest, happyrobot, state_dir: str, db_latency_ms: float = 0.0):
+    """Point the app's settings at the fakes; must run before app modules are imported
+
+    Without a PostgREST fake the Supabase credentials are cleared so the app
+    falls back to its in-memory database.
+    """
+    os.environ.update({
+        "API_KEY": API_KEY,
+        "SUPABASE_URL": postgrest.url if postgrest else "",
+        "SUPABASE_KEY": "bench-key" if postgrest else "",
+        "MOCK_DB_FIXTURES": "",
+        # Measure the app itself, not the admission limits
+        "RATE_LIMIT_PER_SECOND": os.environ.get("RATE_LIMIT_PER_SECOND", "0"),
+        "MAX_IN_FLIGHT_REQUESTS": os.environ.get("MAX_IN_FLIGHT_REQUESTS", "0"),
+        "MOCK_DB_LATENCY_MS": str(db_latency_ms),
+        "HAPPYROBOT_BEARER_TOKEN": "bench-token",
+        "HAPPYROBOT_API_BASE_URL": happyrobot.url,
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "ERROR"),
+        "SKETCH_STATE_PATH": "",
+        "RECENT_ORIGINS_PATH": "",
+        "INSTRUMENTATION_DIR": os.path.join(state_dir, "instrumentation"),
+    })
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> bool:
+    """Print per-endpoint deltas against a baseline; return True if nothing regressed"""
+    ok = True
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    print(f"\nComparison against {baseline.get('revision', '?')} ({baseline.get('timestamp', '?')})")
+    for level in current["levels"]:
+        previous = baseline_levels.get(level["concurrency"])
+        if previous is None:
+            continue
+        for name, stats in {"overall": level["overall"], **level["endpoints"]}.items():
+            before = previous["overall"] if name == "overall" else previous["endpoints"].get(name)
+            if not before or not before["p95_ms"]:
+                continue
+            change = stats["p95_ms"] / before["p95_ms"] - 1
+            throughput_change = stats["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+            flag = ""
+            if name != "overall" and change > max_regression:
+                flag = "  <-- REGRESSION"
+                ok = False
+            print(f"  c={level['concurrency']:<4} {name:<22} p95 {before['p95_ms']:8.1f} -> {stats['p95_ms']:8.1f} ms ({change:+.1%})  rps {throughput_change:+.1%}{flag}")
+    return ok
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    import httpx
+    from geopy.geocoders import Nominatim
+
+    from app.main import app
+    from app.utils import utils_loads
+    from app.warmup import readiness
+
+    utils_loads.geolocator = Nominatim(user_agent="load-matcher-bench", domain=args.nominatim_host, scheme="http")
+
+    if args.db == "memory":
+        from app.supabase import supabase
+
+        for table_name, rows in synthetic_tables(args).items():
+            supabase.database.seed(table_name, rows)
+
+    levels = []
+    async with app.router.lifespan_context(app):
+        while not readiness.ready:
+            await asyncio.sleep(0.01)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            if args.warmup:
+                await run_level(client, 4, args.warmup, args.mix, args.seed + 1, args.carriers)
+            for concurrency in args.concurrency:
+                result = await run_level(client, concurrency, args.requests, args.mix, args.seed, args.carriers)
+                overall = result["overall"]
+                print(f"c={concurrency:<4} {overall['requests']} req in {result['elapsed_s']:.2f}s  {overall['throughput_rps']:8.1f} rps  p50 {overall['p50_ms']:7.1f} ms  p95 {overall['p95_ms']:7.1f} ms  p99 {overall['p99_ms']:7.1f} ms  errors {overall['errors']}")
+                for name, stats in result["endpoints"].items():
+                    print(f"       {name:<22} p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms  errors {stats['errors']}")
+                levels.append(result)
+    return {"levels": levels}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels to run")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=50, help="Warm-up requests before measuring")
+    parser.add_argument("--mix", type=str, default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()), help="Traffic mix, e.g. validate_carrier=0.4,find_matching_loads=0.45,store_metrics=0.15")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--db", choices=["postgrest", "memory"], default="postgrest", help="Serve the database through the fake PostgREST server or the app's in-memory engine")
+    parser.add_argument("--loads", type=int, default=5000, help="Synthetic loads in the fake database")
+    parser.add_argument("--carriers", type=int, default=10000, help="Synthetic carriers in the fake database")
+    parser.add_argument("--transcript-events", type=int, default=50, help="Transcript events per fake HappyRobot run")
+    for prefix, name, latency in (("db", "PostgREST", 2.0), ("geo", "Nominatim", 20.0), ("hr", "HappyRobot", 30.0)):
+        parser.add_argument(f"--{prefix}-latency-ms", type=float, default=latency, help=f"Added latency of the fake {name}")
+        parser.add_argument(f"--{prefix}-jitter-ms", type=float, default=latency / 2, help=f"Random extra latency of the fake {name}")
+        parser.add_argument(f"--{prefix}-error-rate", type=float, default=0.0, help=f"Fraction of fake {name} calls that fail")
+    parser.add_argument("--output", type=str, default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", type=str, help="Baseline results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed relative p95 increase per endpoint when comparing")
+    args = parser.parse_args(argv)
+    args.mix = {kind: float(weight) for kind, weight in (item.split("=") for item in args.mix.split(","))}
+    unknown = set(args.mix) - set(DEFAULT_MIX)
+    if unknown:
+        parser.error(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    postgrest, nominatim, happyrobot = start_fakes(args)
+    args.nominatim_host = f"127.0.0.1:{nominatim.port}"
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        configure_environment(postgrest, happyrobot, state_dir, args.db_latency_ms)
+        try:
+            results = asyncio.run(run_benchmark(args))
+        finally:
+            for server in (postgrest, nominatim, happyrobot):
+                if server is not None:
+                    server.stop()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+        **results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
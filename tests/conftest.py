@@ -0,0 +1,20 @@
+from collections import Counter
+
+import pytest
+
+from app.utils.utils_chains import load_graph
+from app.utils.utils_sketches import metric_sketches
+from app.utils.utils_snapshot import SnapshotFile
+from app.utils.utils_traffic import recent_origins
+
+
+@pytest.fixture(autouse=True)
+def state_files(tmp_path, monkeypatch):
+    """Keep the state files the global singletons read and write inside each test's tmp_path"""
+    monkeypatch.setattr(recent_origins, "path", str(tmp_path / "recent_origins.json"))
+    # Origins searched by earlier tests are not flushed into this one's file
+    monkeypatch.setattr(recent_origins, "_pending", Counter())
+    monkeypatch.setattr(metric_sketches, "state_path", str(tmp_path / "metric_sketches.json"))
+    if load_graph.snapshot_file is not None:
+        monkeypatch.setattr(load_graph, "snapshot_file", SnapshotFile(str(tmp_path / "open_loads.snapshot"), load_graph.refresh_interval))
+    return tmp_path
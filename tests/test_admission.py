@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import auth
+from app.auth import AdmissionController, AdmissionMiddleware, TokenBucket, parse_api_keys, verify_api_key
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    # Partner gets 2 requests at once, refilled one every 4 seconds; ops is not limited
+    controller = AdmissionController(parse_api_keys("partner:partner-key:0.25:2,ops:ops-key:0", 10, 20), max_in_flight=2)
+    monkeypatch.setattr(auth, "admission", controller)
+    return controller
+
+
+def make_client():
+    app = FastAPI()
+
+    @app.get("/loads")
+    async def loads(api_key: str = Depends(verify_api_key)):
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    app.add_middleware(AdmissionMiddleware)
+    return TestClient(app)
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, burst=2)
+    assert bucket.try_acquire() == bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    assert bucket.time_until_token() == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.time_until_token() == 0 and bucket.try_acquire() == 0
+    assert TokenBucket(rate=0, burst=1).try_acquire() == 0
+
+
+def test_rate_limits_are_per_key(controller):
+    client = make_client()
+    partner, ops = {"x-api-key": "partner-key"}, {"x-api-key": "ops-key"}
+    assert [client.get("/loads", headers=partner).status_code for _ in range(2)] == [200, 200]
+    limited = client.get("/loads", headers=partner)
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "4"
+    # Another key's bucket is untouched
+    assert all(client.get("/loads", headers=ops).status_code == 200 for _ in range(10))
+    assert [(key["name"], key["allowed"], key["rejected"]) for key in controller.state()["keys"]] == [("partner", 2, 1), ("ops", 10, 0)]
+    assert client.get("/loads", headers={"x-api-key": "unknown"}).status_code == 401
+
+
+def test_requests_beyond_the_in_flight_cap_are_shed(controller, monkeypatch):
+    client = make_client()
+    monkeypatch.setattr(controller, "in_flight", 2)
+    shed = client.get("/loads", headers={"x-api-key": "ops-key"})
+    assert shed.status_code == 429 and shed.json() == {"detail": "Server is busy, retry later"}
+    assert shed.headers["retry-after"] == "1"
+    assert controller.shed == 1 and controller.in_flight == 2
+    # Health checks are never shed
+    assert client.get("/health").status_code == 200
+
+
+def test_shed_requests_retry_after_their_key_refills(controller, monkeypatch):
+    client = make_client()
+    partner = {"x-api-key": "partner-key"}
+    client.get("/loads", headers=partner)
+    client.get("/loads", headers=partner)
+    monkeypatch.setattr(controller, "in_flight", 2)
+    assert client.get("/loads", headers=partner).headers["retry-after"] == "4"
+    monkeypatch.setattr(controller, "in_flight", 1)
+    # The slot is freed again once the request is done
+    assert client.get("/loads", headers={"x-api-key": "ops-key"}).status_code == 200
+    assert controller.in_flight == 1
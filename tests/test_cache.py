@@ -0,0 +1,80 @@
+import asyncio
+import sqlite3
+import time
+
+from app.utils.utils_cache import SQLiteCache
+
+
+def test_entries_expire_after_their_ttl(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+
+    async def main():
+        await cache.set("geocode", "chicago", [41.88, -87.63], 0.05)
+        await cache.set("carrier", "123456", True, 60)
+        await cache.set("carrier", "654321", False, 0)
+        stored = await cache.get("geocode", "chicago")
+        await asyncio.sleep(0.1)
+        return stored, await cache.get("geocode", "chicago"), await cache.get("carrier", "123456"), await cache.get("carrier", "654321")
+
+    assert asyncio.run(main()) == ([41.88, -87.63], None, True, None)
+
+
+def test_oldest_entries_are_evicted_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    # Two instances stand in for two workers sharing the file
+    first, second = SQLiteCache(path, max_entries=3), SQLiteCache(path, max_entries=3)
+
+    async def main():
+        for index in range(5):
+            await (first if index % 2 else second).set("carrier", str(index), index, 60)
+        return [await first.get("carrier", str(index)) for index in range(5)]
+
+    assert asyncio.run(main()) == [None, None, 2, 3, 4]
+
+
+def test_expired_entries_are_swept(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache(path, max_entries=10, sweep_every=3)
+
+    def rows():
+        return sqlite3.connect(path).execute("SELECT key FROM cache ORDER BY key").fetchall()
+
+    async def main():
+        await cache.set("geocode", "expired", 1, 0.01)
+        await asyncio.sleep(0.05)
+        await cache.set("geocode", "kept", 2, 60)
+        before = rows()
+        # The third write of the process sweeps
+        await cache.set("geocode", "new", 3, 60)
+        return before, rows()
+
+    before, after = asyncio.run(main())
+    assert before == [("expired",), ("kept",)]
+    assert after == [("kept",), ("new",)]
+
+
+def test_busy_timeout_bounds_the_wait_for_another_writer(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache(path, max_entries=10, busy_timeout=0.1)
+    asyncio.run(cache.set("carrier", "123456", True, 60))
+
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.monotonic()
+        asyncio.run(cache.set("carrier", "654321", True, 60))
+        waited = time.monotonic() - started
+        # WAL readers are not blocked by the writer
+        assert asyncio.run(cache.get("carrier", "123456")) is True
+    finally:
+        other_worker.execute("ROLLBACK")
+
+    # The write was dropped after the busy timeout instead of failing the caller
+    assert 0.1 <= waited < 1
+    assert asyncio.run(cache.get("carrier", "654321")) is None
+
+
+def test_missing_state_directory_is_created(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "state" / "cache.sqlite3"), max_entries=10)
+    asyncio.run(cache.set("carrier", "123456", True, 60))
+    assert asyncio.run(cache.get("carrier", "123456")) is True
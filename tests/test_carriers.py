@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.repositories import SupabaseCarrierRepository, _digits_prefix_end
+from app.routers import carriers
+from app.supabase import MockDatabase, MockSupabaseClient
+from app.utils import utils_carriers
+
+
+@pytest.fixture
+def client(monkeypatch):
+    database = MockDatabase()
+    # Shuffled MC numbers: the listing order must come from mc_number, not insertion
+    numbers = [str(100000 + (number * 7919) % 3000) for number in range(3000)] + ["999000", "999999"]
+    database.seed("carriers", [{"mc_number": number, "name": f"Carrier {number}", "state": "IL"} for number in numbers])
+    monkeypatch.setattr(utils_carriers, "carrier_repository", SupabaseCarrierRepository(MockSupabaseClient("url", "key", database=database)))
+    monkeypatch.setattr(settings, "export_page_size", 250)
+    app = FastAPI()
+    app.include_router(carriers.router)
+    return TestClient(app, headers={"x-api-key": settings.api_key})
+
+
+def test_prefix_end():
+    assert _digits_prefix_end("129") == "13"
+    assert _digits_prefix_end("19") == "2"
+    assert _digits_prefix_end("99") is None
+
+
+def test_keyset_pages_walk_a_prefix_in_order(client):
+    seen, after = [], None
+    while True:
+        params = {"mc_prefix": "MC 101", "limit": 300, "fields": "name"}
+        if after:
+            params["after"] = after
+        page = client.get("/carriers/carriers", params=params).json()
+        seen.extend(page["carriers"])
+        after = page["next_after"]
+        if after is None:
+            break
+    assert [carrier["mc_number"] for carrier in seen] == [str(number) for number in range(101000, 102000)]
+    assert set(seen[0]) == {"mc_number", "name"}
+
+
+def test_ndjson_streams_every_match(client):
+    response = client.get("/carriers/carriers", params={"format": "ndjson", "mc_prefix": "999"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["mc_number"] for line in response.text.splitlines()] == ["999000", "999999"]
+
+    response = client.get("/carriers/carriers", params={"format": "ndjson", "after": "100499"})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 2502 and rows[0]["mc_number"] == "100500"
+
+
+def test_invalid_parameters(client):
+    assert client.get("/carriers/carriers", params={"fields": "name;drop"}).status_code == 400
+    assert client.get("/carriers/carriers", params={"mc_prefix": "MC"}).status_code == 400
+    assert client.get("/carriers/carriers", params={"format": "xml"}).status_code == 400
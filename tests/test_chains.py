@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from app.utils.utils_chains import LoadGraph, haversine_miles
+from app.utils.utils_deadline import Deadline
+from app.utils.utils_snapshot import epoch
+
+CHICAGO = (41.88, -87.63)
+DALLAS = (32.78, -96.80)
+DENVER = (39.74, -104.99)
+START = datetime(2030, 1, 1, 6, 0)
+
+
+def load(load_id, origin, destination, pickup_hours, equipment_type="dryvan", rate=1000.0):
+    pickup = START + timedelta(hours=pickup_hours)
+    return {
+        "load_id": load_id, "equipment_type": equipment_type, "loadboard_rate": rate,
+        "origin_lat": origin[0], "origin_lng": origin[1], "destination_lat": destination[0], "destination_lng": destination[1],
+        "pickup_datetime": pickup.isoformat(), "delivery_datetime": (pickup + timedelta(hours=20)).isoformat(),
+    }
+
+
+def near(point, miles_north):
+    return (point[0] + miles_north / 69.0, point[1])
+
+
+def find(rows, max_legs=2, origin=CHICAGO, home=CHICAGO):
+    graph = LoadGraph(rows, cell_miles=50, speed_mph=50)
+    chains, cut_short = graph.find_chains("dryvan", origin, home, epoch(START), max_legs, Deadline())
+    assert not cut_short
+    return [[leg["load"]["load_id"] for leg in chain["legs"]] for chain in chains], chains
+
+
+def test_haversine_miles():
+    assert 790 < haversine_miles(CHICAGO, DALLAS) < 810
+
+
+def test_backhaul_chain_ranks_first():
+    rows = [
+        load("out", near(CHICAGO, 10), DALLAS, 2),
+        load("back", near(DALLAS, 20), near(CHICAGO, 5), 30),
+        load("elsewhere", near(DALLAS, 5), DENVER, 30),
+    ]
+    ids, chains = find(rows)
+    assert ids[0] == ["out", "back"]
+    assert chains[0]["deadhead_miles"] < 40
+    assert chains[0]["total_rate"] == 2000.0
+    assert ["out"] in ids and ["out", "elsewhere"] in ids
+
+
+def test_legs_must_be_reachable_before_pickup():
+    rows = [
+        load("out", near(CHICAGO, 10), DALLAS, 2),
+        # Picked up before the first load is delivered
+        load("too_early", near(DALLAS, 5), CHICAGO, 10),
+        # 140 empty miles need ~3h, but pickup is 1h after delivery
+        load("too_far", near(DALLAS, 140), CHICAGO, 23),
+        load("other_equipment", near(DALLAS, 5), CHICAGO, 30, equipment_type="reefer"),
+    ]
+    ids, _ = find(rows)
+    assert ids == [["out"]]
+
+
+def test_max_legs_and_deadhead_limit():
+    rows = [
+        load("a", near(CHICAGO, 10), DALLAS, 2),
+        load("b", near(DALLAS, 10), DENVER, 30),
+        load("c", near(DENVER, 10), CHICAGO, 60),
+        load("remote", near(CHICAGO, 400), DALLAS, 2),
+    ]
+    ids, _ = find(rows, max_legs=3)
+    assert ids[0] == ["a", "b", "c"]
+    assert all("remote" not in chain for chain in ids)
+    ids, _ = find(rows, max_legs=2)
+    assert max(len(chain) for chain in ids) == 2
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils import utils_loads
+from app.utils.utils_cache import GEOCODE_NAMESPACE, cache
+from app.utils.utils_deadline import Deadline, StageEstimate
+
+
+class SlowLoadRepository:
+    def __init__(self, delay, results):
+        self.delay = delay
+        self.results = list(results)
+        self.calls = 0
+
+    async def search(self, search):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def geocoded(monkeypatch):
+    asyncio.run(cache.set(GEOCODE_NAMESPACE, "chicago, il", [41.88, -87.63], 60))
+    asyncio.run(cache.set(GEOCODE_NAMESPACE, "dallas, tx", [32.78, -96.8], 60))
+    monkeypatch.setattr(utils_loads, "search_attempt_estimate", StageEstimate())
+
+
+def search(deadline):
+    pickup = datetime.now() + timedelta(days=1)
+    return asyncio.run(utils_loads.find_loads_within_radius("dryvan", "Chicago, IL", "Dallas, TX", pickup, deadline))
+
+
+def test_deadline_without_budget_never_expires():
+    deadline = Deadline.from_milliseconds(0)
+    assert deadline.remaining() is None
+    assert not deadline.expired
+    assert deadline.allows(1e9)
+
+
+def test_stage_estimate_tracks_mean_plus_deviation():
+    estimate = StageEstimate(alpha=0.5)
+    assert estimate.value == 0.0
+    estimate.observe(0.1)
+    estimate.observe(0.3)
+    assert estimate.mean == pytest.approx(0.2)
+    assert estimate.value == pytest.approx(0.2 + 2 * 0.1)
+
+
+def test_relaxation_runs_within_budget(geocoded, monkeypatch):
+    repository = SlowLoadRepository(0.01, [[], [{"load_id": "a"}]])
+    monkeypatch.setattr(utils_loads, "load_repository", repository)
+    loads, omitted, deadline_exceeded = search(Deadline(5))
+    assert loads == [{"load_id": "a", "pickup_offset_hours": None}]
+    assert omitted == ["pickup_datetime"]
+    assert not deadline_exceeded
+
+
+def test_attempt_is_cut_short_when_budget_runs_out(geocoded, monkeypatch):
+    monkeypatch.setattr(utils_loads, "load_repository", SlowLoadRepository(1.0, [[]]))
+    loads, omitted, deadline_exceeded = search(Deadline(0.05))
+    assert loads == []
+    assert deadline_exceeded
+
+
+def test_attempts_that_cannot_fit_are_skipped(geocoded, monkeypatch):
+    repository = SlowLoadRepository(0.05, [[], [], []])
+    monkeypatch.setattr(utils_loads, "load_repository", repository)
+    utils_loads.search_attempt_estimate.observe(0.05)
+    loads, omitted, deadline_exceeded = search(Deadline(0.08))
+    assert loads == []
+    assert deadline_exceeded
+    assert repository.calls == 1
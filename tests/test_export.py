@@ -0,0 +1,92 @@
+import csv
+import io
+
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.repositories import SupabaseMetricsRepository
+from app.routers import metrics
+from app.supabase import MockDatabase, MockSupabaseClient
+from app.utils import utils_metrics
+from app.utils.utils_export import METRICS_EXPORT_COLUMNS
+
+HEADERS = {"x-api-key": settings.api_key}
+
+
+def metric(metric_id, organization_id="org_1", day=1, **values):
+    return {
+        "id": metric_id, "created_at": f"2030-01-{day:02d}T12:00:00+00:00", "run_id": f"run_{metric_id}", "organization_id": organization_id,
+        "call_outcome": "booked", "call_status": "completed", "call_duration": "312.5", "negotiation_attempts": 2, **values,
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    database = MockDatabase()
+    database.seed("metrics", [
+        metric(1),
+        metric(2, day=2, load_agreed_rate="", negotiation_attempts="not a number"),
+        metric(3, organization_id="org_2", day=3),
+        metric(4, day=4, carrier_sentiment="positive, mostly"),
+        metric(5, day=5),
+    ])
+    monkeypatch.setattr(utils_metrics, "metrics_repository", SupabaseMetricsRepository(MockSupabaseClient("url", "key", database=database)))
+    # Small pages so every export spans several of them
+    monkeypatch.setattr(settings, "export_page_size", 2)
+    app = FastAPI()
+    app.include_router(metrics.router)
+    return TestClient(app)
+
+
+def export(client, export_format, **params):
+    response = client.get("/metrics/export", params={"format": export_format, **params}, headers=HEADERS)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_csv_export_has_every_column_and_coerced_values(client):
+    response = export(client, "csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["x-export-order"] == "id"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == [name for name, _ in METRICS_EXPORT_COLUMNS]
+    assert [row["id"] for row in rows] == ["1", "2", "3", "4", "5"]
+    assert rows[0]["call_duration"] == "312.5" and rows[0]["carrier_sentiment"] == ""
+    # Values that do not fit their column are exported empty
+    assert rows[1]["load_agreed_rate"] == "" and rows[1]["negotiation_attempts"] == ""
+    assert rows[3]["carrier_sentiment"] == "positive, mostly"
+
+
+def test_arrow_and_parquet_exports_match_the_schema(client):
+    arrow = pyarrow.ipc.open_stream(export(client, "arrow").content).read_all()
+    parquet = pyarrow.parquet.read_table(io.BytesIO(export(client, "parquet").content))
+    for table in (arrow, parquet):
+        assert [(field.name, str(field.type)) for field in table.schema] == [(name, {"float64": "double"}.get(arrow_type, arrow_type)) for name, arrow_type in METRICS_EXPORT_COLUMNS]
+        assert table.column("id").to_pylist() == [1, 2, 3, 4, 5]
+        assert table.column("call_duration").to_pylist()[0] == 312.5
+        assert table.column("negotiation_attempts").to_pylist()[:2] == [2, None]
+
+
+def test_filters_and_resume(client):
+    def ids(**params):
+        return [row["id"] for row in csv.DictReader(io.StringIO(export(client, "csv", **params).text))]
+
+    assert ids(organization_id="org_1") == ["1", "2", "4", "5"]
+    assert ids(start_date="2030-01-02T00:00:00+00:00", end_date="2030-01-04T00:00:00+00:00") == ["2", "3"]
+    assert ids(after_id=3) == ["4", "5"]
+    assert ids(organization_id="org_1", after_id=4) == ["5"]
+    assert ids(after_id=5) == []
+
+
+def test_invalid_requests(client, monkeypatch):
+    assert client.get("/metrics/export", params={"format": "xlsx"}, headers=HEADERS).status_code == 400
+    params = {"start_date": "2030-01-03T00:00:00", "end_date": "2030-01-02T00:00:00"}
+    assert client.get("/metrics/export", params=params, headers=HEADERS).status_code == 400
+    monkeypatch.setattr(metrics, "pyarrow_available", lambda: False)
+    assert client.get("/metrics/export", params={"format": "parquet"}, headers=HEADERS).status_code == 501
+    # CSV needs no optional dependency
+    assert client.get("/metrics/export", params={"format": "csv"}, headers=HEADERS).status_code == 200
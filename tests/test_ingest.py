@@ -0,0 +1,84 @@
+import asyncio
+
+from app.utils import utils_ingest
+from app.utils.utils_ingest import LoadImport, iter_csv_rows, iter_ndjson_rows
+
+CSV = (
+    "load_id,origin_city,origin_state,destination_city,destination_state,pickup_datetime,equipment_type,loadboard_rate,notes\n"
+    'a,Chicago,IL,Dallas,TX,2030-01-01T08:00:00,Dry Van,1200,"fragile,\nhandle with care"\n'
+    "b,chicago,il,Nowhere,ZZ,2030-01-02T08:00:00,Reefer,900,\n"
+    "c,Dallas,TX,Chicago,IL,2030-01-03T08:00:00,Dry Van,abc,\n"
+    "d,Dallas,TX,Chicago,IL,2030-01-04T08:00:00,Dry Van,1500,\n"
+    "e,Dallas,TX\n"
+)
+
+
+class RecordingRepository:
+    def __init__(self):
+        self.batches = []
+
+    async def insert_many(self, rows):
+        self.batches.append(rows)
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+def run_import(monkeypatch, data, batch_size=2, rows=iter_csv_rows):
+    geocoded = []
+
+    async def fake_get_coordinates(city, state=None):
+        geocoded.append((city, state))
+        return (None, None) if city == "Nowhere" else (41.0, -87.0)
+
+    repository = RecordingRepository()
+    monkeypatch.setattr(utils_ingest, "get_coordinates", fake_get_coordinates)
+    monkeypatch.setattr(utils_ingest, "load_repository", repository)
+    report = asyncio.run(LoadImport(batch_size).run(rows(chunked(data, 7))))
+    return report, repository, geocoded
+
+
+def test_csv_rows_survive_chunk_boundaries_and_quoted_newlines():
+    rows = asyncio.run(collect(iter_csv_rows(chunked(CSV.encode(), 5))))
+    assert [line for line, _ in rows] == [2, 4, 5, 6, 7]
+    assert rows[0][1]["notes"] == "fragile,\nhandle with care"
+    assert isinstance(rows[-1][1], utils_ingest.RowError)
+
+
+def test_ndjson_rows_report_invalid_lines():
+    data = b'{"load_id": "a"}\nnot json\n\n[1]\n{"load_id": "b"}'
+    rows = asyncio.run(collect(iter_ndjson_rows(chunked(data, 4))))
+    assert [row["load_id"] for _, row in rows if isinstance(row, dict)] == ["a", "b"]
+    assert [line for line, row in rows if isinstance(row, utils_ingest.RowError)] == [2, 4]
+
+
+def test_import_geocodes_each_place_once_and_reports_row_errors(monkeypatch):
+    report, repository, geocoded = run_import(monkeypatch, CSV.encode())
+    assert sorted(geocoded) == sorted([("Chicago", "IL"), ("Dallas", "TX"), ("Nowhere", "ZZ")])
+    assert report["inserted"] == 2
+    assert report["failed"] == 3
+    assert report["places_unresolved"] == 1
+    assert {error["line"]: error["error"].split(":")[0] for error in report["errors"]} == {
+        4: "could not geocode destination",
+        5: "loadboard_rate is not a number",
+        7: "expected 9 fields, got 3",
+    }
+    inserted = [row for batch in repository.batches for row in batch]
+    assert [row["load_id"] for row in inserted] == ["a", "d"]
+    assert inserted[0]["equipment_type"] == "dryvan"
+    assert inserted[0]["loadboard_rate"] == 1200.0
+    assert (inserted[0]["origin_lat"], inserted[0]["destination_lng"]) == (41.0, -87.0)
+
+
+def test_rows_with_coordinates_are_not_geocoded(monkeypatch):
+    data = b'{"origin_city": "A", "destination_city": "B", "equipment_type": "Flatbed", "pickup_datetime": "2030-01-01", "origin_lat": 1, "origin_lng": 2, "destination_lat": 3, "destination_lng": 4}\n'
+    report, repository, geocoded = run_import(monkeypatch, data, rows=iter_ndjson_rows)
+    assert geocoded == []
+    assert report["inserted"] == 1
+    assert repository.batches[0][0]["load_id"]
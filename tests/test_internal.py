@@ -0,0 +1,56 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import AdmissionMiddleware, admission
+from app.config import settings
+from app.routers import internal
+
+
+def make_client():
+    app = FastAPI()
+    app.include_router(internal.router)
+    app.add_middleware(AdmissionMiddleware)
+    return TestClient(app)
+
+
+def test_without_a_token_internal_endpoints_require_an_api_key(monkeypatch):
+    monkeypatch.setattr(settings, "internal_metrics_token", "")
+    client = make_client()
+    for path in ("/internal/metrics", "/internal/limiter", "/internal/dependencies", "/internal/loop", "/internal/profiles"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers={"x-api-key": "wrong"}).status_code == 401
+    response = client.get("/internal/metrics", headers={"x-api-key": settings.api_key})
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.text
+
+
+def test_without_a_token_internal_endpoints_are_shed_like_the_rest(monkeypatch):
+    monkeypatch.setattr(settings, "internal_metrics_token", "")
+    monkeypatch.setattr(admission, "max_in_flight", 1)
+    monkeypatch.setattr(admission, "in_flight", 1)
+    assert make_client().get("/internal/limiter", headers={"x-api-key": settings.api_key}).status_code == 429
+
+
+def test_with_a_token_the_bearer_is_required(monkeypatch):
+    monkeypatch.setattr(settings, "internal_metrics_token", "secret")
+    monkeypatch.setattr(admission, "max_in_flight", 1)
+    monkeypatch.setattr(admission, "in_flight", 1)
+    client = make_client()
+    assert client.get("/internal/limiter", headers={"x-api-key": settings.api_key}).status_code == 401
+    assert client.get("/internal/limiter", headers={"authorization": "Bearer wrong"}).status_code == 401
+    # Exempt from shedding, so scrapes still work on an overloaded worker
+    assert client.get("/internal/limiter", headers={"authorization": "Bearer secret"}).status_code == 200
+
+
+def test_profiles_require_the_profile_token(monkeypatch):
+    monkeypatch.setattr(settings, "internal_metrics_token", "secret")
+    monkeypatch.setattr(settings, "profile_token", "")
+    client = make_client()
+    bearer = {"authorization": "Bearer secret"}
+    assert client.get("/internal/profiles", headers=bearer).status_code == 403
+
+    monkeypatch.setattr(settings, "profile_token", "profile-secret")
+    assert client.get("/internal/profiles", headers=bearer).status_code == 401
+    assert client.get("/internal/profiles", headers={**bearer, "x-profile": "wrong"}).status_code == 401
+    assert client.get("/internal/profiles/missing", headers={**bearer, "x-profile": "wrong"}).status_code == 401
+    assert client.get("/internal/profiles", headers={**bearer, "x-profile": "profile-secret"}).status_code == 200
@@ -0,0 +1,112 @@
+import io
+import json
+import logging
+import queue
+import threading
+
+import pytest
+
+from app.logging_config import DeferredQueueHandler, SamplingFilter, parse_logger_levels, parse_sample_rates, setup_logging, shutdown_logging
+
+
+class ThreadRecordingStream(io.StringIO):
+    """Stream that remembers which threads wrote to it"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def write(self, text):
+        self.threads.add(threading.get_ident())
+        return super().write(text)
+
+
+@pytest.fixture
+def stream():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    stream = ThreadRecordingStream()
+    yield stream
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def lines(stream):
+    # Stopping the listener flushes everything still queued
+    shutdown_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def record(msg, *args, exc_info=None):
+    return logging.LogRecord("app.test", logging.INFO, __file__, 1, msg, args, exc_info)
+
+
+def test_records_are_written_as_json_on_the_listener_thread(stream):
+    setup_logging(stream=stream)
+    logging.getLogger("app.test").info("Found %s loads for %s", 3, "dryvan", extra={"request_id": "req_1"})
+
+    [entry] = lines(stream)
+    assert entry["message"] == "Found 3 loads for dryvan" and entry["level"] == "INFO" and entry["logger"] == "app.test"
+    assert entry["request_id"] == "req_1"
+    assert threading.get_ident() not in stream.threads
+
+
+def test_mutable_arguments_are_logged_as_they_were_at_call_time(stream):
+    setup_logging(stream=stream)
+    metrics = {"call_outcome": "running"}
+    logging.getLogger("app.test").info("Metrics: %s", metrics)
+    metrics["call_outcome"] = "booked"
+
+    assert lines(stream)[0]["message"] == "Metrics: {'call_outcome': 'running'}"
+
+
+def test_only_immutable_arguments_are_left_for_the_writer():
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+
+    deferred = handler.prepare(record("Load %s at %s", "load_1", 1500.0))
+    assert deferred.msg == "Load %s at %s" and deferred.args == ("load_1", 1500.0)
+
+    merged = handler.prepare(record("Loads %s", ["load_1"]))
+    assert merged.msg == "Loads ['load_1']" and merged.args is None
+
+
+def test_exceptions_are_rendered_before_enqueueing(stream):
+    try:
+        raise ValueError("bad rate")
+    except ValueError as error:
+        exc_info = (type(error), error, error.__traceback__)
+    prepared = DeferredQueueHandler(queue.SimpleQueue()).prepare(record("Failed", exc_info=exc_info))
+    assert prepared.exc_info is None and "ValueError: bad rate" in prepared.exc_text
+
+    setup_logging(stream=stream)
+    try:
+        raise ValueError("bad rate")
+    except ValueError:
+        logging.getLogger("app.test").exception("Failed")
+    assert "ValueError: bad rate" in lines(stream)[0]["exception"]
+
+
+def test_sampling_drops_low_severity_lines_only(stream):
+    setup_logging(stream=stream, sample_rates={"app": 0.0, "app.routers": 1.0})
+    logging.getLogger("app.utils").info("dropped")
+    logging.getLogger("app.utils").warning("kept warning")
+    logging.getLogger("app.routers.loads").info("kept by the longer prefix")
+    logging.getLogger("other").info("kept without a rate")
+
+    assert [entry["message"] for entry in lines(stream)] == ["kept warning", "kept by the longer prefix", "kept without a rate"]
+
+
+def test_sampling_keeps_about_the_configured_fraction(monkeypatch):
+    sampling = SamplingFilter({"app": 0.25})
+    values = iter(index / 100 for index in range(100))
+    monkeypatch.setattr("app.logging_config.random.random", lambda: next(values))
+    assert sum(sampling.filter(record("line")) for _ in range(100)) == 25
+
+
+def test_parse_settings():
+    assert parse_sample_rates("app.routers.loads=0.1, app.utils=2,broken,app.x=nan?") == {"app.routers.loads": 0.1, "app.utils": 1.0}
+    assert parse_logger_levels("app.utils=debug,httpx = WARNING,broken") == {"app.utils": "DEBUG", "httpx": "WARNING"}
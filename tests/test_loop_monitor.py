@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from app.loop_monitor import LoopMonitor
+
+
+def block_the_loop():
+    time.sleep(0.2)
+
+
+def test_stall_is_charged_to_the_blocking_call_site():
+    monitor = LoopMonitor(interval=0.01, threshold=0.05)
+
+    async def main():
+        task = asyncio.ensure_future(monitor.run())
+        await asyncio.sleep(0.05)
+        block_the_loop()
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    report = monitor.report()
+    assert report["stalls"] == 1
+    offender = report["offenders"][0]
+    assert offender["site"].endswith("in block_the_loop")
+    assert 150 < offender["total_ms"] < 400
+    assert any("block_the_loop()" in line for line in offender["stack"])
+
+
+def test_short_pauses_are_not_stalls():
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+
+    async def main():
+        task = asyncio.ensure_future(monitor.run())
+        for _ in range(5):
+            time.sleep(0.01)
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert monitor.report()["stalls"] == 0
+    assert monitor.max_lag > 0
@@ -0,0 +1,87 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.instrumentation import InstrumentationMiddleware, registry
+from app.middleware import CompressionMiddleware, ConditionalGetMiddleware, negotiate_encoding
+
+BIG = {"loads": [{"load_id": str(i), "origin_city": "Chicago"} for i in range(200)]}
+
+
+def make_client():
+    app = FastAPI()
+
+    @app.get("/loads/big")
+    async def big():
+        return BIG
+
+    @app.get("/loads/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/metrics/stream")
+    async def stream():
+        async def lines():
+            for i in range(100):
+                yield f'{{"row": {i}}}\n'.encode()
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    app.add_middleware(ConditionalGetMiddleware)
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(InstrumentationMiddleware)
+    return TestClient(app)
+
+
+def test_negotiate_encoding_honours_q_values():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("*") in ("br", "gzip")
+
+
+def test_large_responses_are_compressed_and_small_ones_are_not():
+    client = make_client()
+    response = client.get("/loads/big", headers={"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == BIG
+
+    response = client.get("/loads/small", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_streamed_responses_are_compressed_without_etag():
+    client = make_client()
+    with client.stream("GET", "/metrics/stream", headers={"accept-encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == "gzip"
+    assert "etag" not in response.headers
+    assert gzip.decompress(raw).count(b"\n") == 100
+
+
+def test_if_none_match_returns_304_per_encoding():
+    client = make_client()
+    identity = client.get("/loads/big", headers={"accept-encoding": "identity"})
+    etag = identity.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert client.get("/loads/big", headers={"accept-encoding": "identity", "if-none-match": etag}).status_code == 304
+
+    encoded = client.get("/loads/big", headers={"accept-encoding": "gzip"})
+    assert encoded.headers["etag"] == etag[:-1] + '-gzip"'
+    not_modified = client.get("/loads/big", headers={"accept-encoding": "gzip", "if-none-match": encoded.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert client.get("/loads/big", headers={"accept-encoding": "identity", "if-none-match": '"other"'}).status_code == 200
+
+
+def test_encoded_requests_keep_their_route_label():
+    client = make_client()
+    requests = registry._counters["http_requests_total"]
+    before = {labels: requests.get(labels, 0.0) for labels in (("GET", "/loads/big", "200"), ("GET", "unmatched", "200"))}
+    for encoding in ("gzip", "identity"):
+        assert client.get("/loads/big", headers={"accept-encoding": encoding}).status_code == 200
+    assert requests.get(("GET", "/loads/big", "200"), 0.0) - before[("GET", "/loads/big", "200")] == 2
+    assert requests.get(("GET", "unmatched", "200"), 0.0) == before[("GET", "unmatched", "200")]
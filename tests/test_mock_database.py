@@ -0,0 +1,108 @@
+import asyncio
+
+from app.supabase import MockDatabase, MockSupabaseClient
+
+
+def make_database():
+    database = MockDatabase()
+    database.seed("loads", [
+        {"load_id": "a", "equipment_type": "dryvan", "origin_lat": 41.5, "loadboard_rate": 1200.0, "pickup_datetime": "2030-01-02T08:00:00"},
+        {"load_id": "b", "equipment_type": "reefer", "origin_lat": 42.5, "loadboard_rate": None, "pickup_datetime": "2030-01-03T08:00:00"},
+        {"load_id": "c", "equipment_type": "dryvan", "origin_lat": 43.5, "loadboard_rate": 900.0, "pickup_datetime": "2030-01-01T08:00:00"},
+        {"load_id": "d", "equipment_type": "flatbed", "origin_lat": 40.5, "loadboard_rate": 2000.0, "pickup_datetime": "2030-01-04T08:00:00"},
+    ])
+    return database
+
+
+def load_ids(query):
+    return [row["load_id"] for row in query.execute().data]
+
+
+def test_seed_builds_indexes_for_filtered_columns():
+    database = make_database()
+    assert {"equipment_type", "origin_lat", "pickup_datetime"} <= set(database.table("loads").indexes)
+
+
+def test_range_filters():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    assert load_ids(table.select("*").gte("origin_lat", 41.5).lt("origin_lat", 43.5)) == ["a", "b"]
+    assert load_ids(table.select("*").gt("origin_lat", 41.5).lte("origin_lat", 43.5)) == ["b", "c"]
+    assert load_ids(table.select("*").gte("pickup_datetime", "2030-01-03")) == ["b", "d"]
+
+
+def test_eq_neq_and_in_filters():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    assert load_ids(table.select("*").eq("equipment_type", "dryvan")) == ["a", "c"]
+    assert load_ids(table.select("*").neq("equipment_type", "dryvan")) == ["b", "d"]
+    assert load_ids(table.select("*").in_("load_id", ["d", "a", "x"])) == ["a", "d"]
+    assert load_ids(table.select("*").eq("equipment_type", "dryvan").gte("origin_lat", 42)) == ["c"]
+
+
+def test_numbers_and_strings_do_not_match_each_other():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    assert load_ids(table.select("*").eq("origin_lat", "41.5")) == []
+
+
+def test_order_puts_nulls_last_ascending_and_first_descending():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    assert load_ids(table.select("*").order("loadboard_rate")) == ["c", "a", "d", "b"]
+    assert load_ids(table.select("*").order("loadboard_rate", desc=True)) == ["b", "d", "a", "c"]
+
+
+def test_keyset_pages_walk_the_order_index():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    assert load_ids(table.select("*").order("loadboard_rate").limit(10)) == ["c", "a", "d", "b"]
+    assert load_ids(table.select("*").gt("load_id", "a").order("load_id").limit(2)) == ["b", "c"]
+    assert load_ids(table.select("*").gt("load_id", "c").order("load_id").limit(2)) == ["d"]
+    assert load_ids(table.select("*").neq("equipment_type", "reefer").order("load_id").limit(2)) == ["a", "c"]
+
+
+def test_limit_and_projection():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    assert load_ids(table.select("*").eq("equipment_type", "dryvan").limit(1)) == ["a"]
+    assert load_ids(table.select("*").order("origin_lat", desc=True).limit(2)) == ["c", "b"]
+    assert table.select("load_id, origin_lat").eq("load_id", "a").execute().data == [{"load_id": "a", "origin_lat": 41.5}]
+
+
+def test_insert_assigns_ids_and_is_visible_to_indexed_queries():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    inserted = table.insert({"load_id": "e", "equipment_type": "dryvan", "origin_lat": 41.6}).execute().data
+    assert inserted[0]["id"] == 5 and "created_at" in inserted[0]
+    assert load_ids(table.select("*").eq("equipment_type", "dryvan")) == ["a", "c", "e"]
+
+
+def test_update_keeps_indexes_in_sync():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    updated = table.update({"equipment_type": "reefer", "origin_lat": 45.0}).eq("load_id", "a").execute().data
+    assert [row["load_id"] for row in updated] == ["a"]
+    assert load_ids(table.select("*").eq("equipment_type", "dryvan")) == ["c"]
+    assert load_ids(table.select("*").eq("equipment_type", "reefer")) == ["a", "b"]
+    assert load_ids(table.select("*").gte("origin_lat", 44)) == ["a"]
+    assert load_ids(table.select("*").lt("origin_lat", 41.6)) == ["d"]
+
+
+def test_delete_removes_rows_from_indexes():
+    table = MockSupabaseClient("url", "key", database=make_database()).table("loads")
+    table.delete().eq("equipment_type", "dryvan").execute()
+    assert load_ids(table.select("*").eq("equipment_type", "dryvan")) == []
+    assert load_ids(table.select("*").gte("origin_lat", 0)) == ["b", "d"]
+
+
+def test_csv_fixture_keeps_text_columns_as_strings(tmp_path):
+    fixture = tmp_path / "carriers.csv"
+    fixture.write_text("mc_number,name\n012345,Acme\n123456,\n")
+    database = MockDatabase()
+    database.load_fixture(str(fixture))
+    client = MockSupabaseClient("url", "key", database=database)
+    rows = client.table("carriers").select("mc_number, name").execute().data
+    assert rows == [{"mc_number": "012345", "name": "Acme"}, {"mc_number": "123456", "name": None}]
+    result = asyncio.run(client.execute(client.table("carriers").select("mc_number").eq("mc_number", "123456")))
+    assert result.data == [{"mc_number": "123456"}]
+
+
+def test_csv_fixture_casts_known_numeric_columns(tmp_path):
+    fixture = tmp_path / "loads.csv"
+    fixture.write_text("load_id,origin_lat,num_of_pieces\n0001,41.5,3\n")
+    database = MockDatabase()
+    database.load_fixture(str(fixture))
+    assert database.table("loads").rows[0] == {"id": 1, "load_id": "0001", "origin_lat": 41.5, "num_of_pieces": 3, "created_at": database.table("loads").rows[0]["created_at"]}
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.repositories import SupabaseLoadRepository
+from app.instrumentation import registry
+from app.supabase import MockDatabase, MockSupabaseClient
+from app.utils import utils_ingest, utils_loads
+from app.utils.utils_cache import GEOCODE_NAMESPACE, cache
+from app.utils.utils_negative_cache import NegativeResultCache
+
+TOMORROW = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+PLACES = {"chicago, il": [41.88, -87.63], "dallas, tx": [32.78, -96.8], "denver, co": [39.74, -104.99], "fargo, nd": [46.88, -96.79]}
+
+
+def load(load_id, origin, destination, pickup):
+    return {
+        "load_id": load_id, "equipment_type": "flatbed", "origin_city": origin.split(",")[0], "destination_city": destination.split(",")[0],
+        "origin_lat": PLACES[origin][0], "origin_lng": PLACES[origin][1], "destination_lat": PLACES[destination][0], "destination_lng": PLACES[destination][1],
+        "pickup_datetime": pickup.isoformat(),
+    }
+
+
+class CountingRepository(SupabaseLoadRepository):
+    def __init__(self, client):
+        super().__init__(client)
+        self.searches = 0
+
+    async def search(self, search):
+        self.searches += 1
+        return await super().search(search)
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    database = MockDatabase()
+    # Chicago only has flatbed freight to Denver
+    database.seed("loads", [load("denver", "chicago, il", "denver, co", TOMORROW)])
+    repository = CountingRepository(MockSupabaseClient("url", "key", database=database))
+    lanes = NegativeResultCache(ttl=60, max_entries=100)
+    monkeypatch.setattr(utils_loads, "load_repository", repository)
+    monkeypatch.setattr(utils_loads, "empty_lanes", lanes)
+    monkeypatch.setattr(utils_ingest, "load_repository", repository)
+    monkeypatch.setattr(utils_ingest, "empty_lanes", lanes)
+    for place, coordinates in PLACES.items():
+        asyncio.run(cache.set(GEOCODE_NAMESPACE, place, coordinates, 60))
+    return repository
+
+
+def search(repository, origin, destination=None, pickup=None):
+    before = repository.searches
+    result = asyncio.run(utils_loads.find_loads_within_radius("flatbed", origin, destination, pickup))
+    return [item["load_id"] for item in result[0]], result[1], repository.searches - before
+
+
+def lane_counts():
+    counts = registry._counters["cache_requests_total"]
+    return counts.get(("empty_lanes", "hit"), 0), counts.get(("empty_lanes", "miss"), 0)
+
+
+def test_dead_lane_returns_without_queries(repository, monkeypatch):
+    hits, misses = lane_counts()
+    assert search(repository, "Fargo, ND", "Dallas, TX", TOMORROW) == ([], [], 3)
+    assert search(repository, "Fargo, ND", "Dallas, TX", TOMORROW) == ([], [], 0)
+    # The origin alone came back empty, so every search from it is dead
+    assert search(repository, "Fargo, ND", "Denver, CO", TOMORROW + timedelta(days=2)) == ([], [], 0)
+    # One lookup per search, not one per attempt
+    assert lane_counts() == (hits + 2, misses + 1)
+
+
+def test_lanes_are_keyed_on_the_geocoded_place(repository, monkeypatch):
+    async def geocode(query, cache_key):
+        return PLACES["fargo, nd"]
+
+    monkeypatch.setattr(utils_loads, "_geocode", geocode)
+    assert search(repository, "Fargo, ND", "Dallas, TX", TOMORROW)[2] == 3
+    # Another spelling of the same places is the same lane
+    assert search(repository, "Fargo ND", "dallas,tx", TOMORROW)[2] == 0
+
+
+def test_searches_skip_to_the_tiers_that_can_match(repository):
+    assert search(repository, "Chicago, IL", "Dallas, TX", TOMORROW) == (["denver"], ["destination", "pickup_datetime"], 3)
+    assert search(repository, "Chicago, IL", "Dallas, TX", TOMORROW) == (["denver"], ["destination", "pickup_datetime"], 1)
+    # Chicago to Dallas found nothing on any day, so another pickup time goes straight to the origin-only tier
+    assert search(repository, "Chicago, IL", "Dallas, TX", TOMORROW + timedelta(days=3)) == (["denver"], ["destination", "pickup_datetime"], 1)
+    # Other lanes from the same origin are unaffected
+    assert search(repository, "Chicago, IL", "Denver, CO", TOMORROW) == (["denver"], [], 1)
+
+
+def test_imported_loads_invalidate_covering_entries(repository):
+    assert search(repository, "Chicago, IL", "Dallas, TX", TOMORROW)[2] == 3
+    assert search(repository, "Fargo, ND", "Dallas, TX", TOMORROW)[2] == 3
+
+    row = {key: value for key, value in load("dallas", "chicago, il", "dallas, tx", TOMORROW).items() if key != "load_id"}
+    report = asyncio.run(utils_ingest.import_loads(_chunks(json.dumps(row).encode() + b"\n"), "ndjson"))
+    assert report["inserted"] == 1
+
+    loads, omitted, searches = search(repository, "Chicago, IL", "Dallas, TX", TOMORROW)
+    assert len(loads) == 1 and omitted == [] and searches == 1
+    # Fargo is far from the new load and stays dead
+    assert search(repository, "Fargo, ND", "Dallas, TX", TOMORROW)[2] == 0
+
+
+def test_results_of_searches_overlapping_an_insert_are_not_recorded():
+    lanes = NegativeResultCache(ttl=60, max_entries=2)
+    box = (41.0, 43.0, -88.0, -87.0)
+    generation = lanes.generation
+    lanes.invalidate([{"origin_lat": 30.0, "origin_lng": -90.0}])
+    lanes.record(("day", "flatbed", (4188, -8763), None, None), box, generation)
+    assert len(lanes) == 0
+
+    for number in range(3):
+        lanes.record(("day", "flatbed", (number, 0), None, None), box, lanes.generation)
+    assert len(lanes) == 2
+    assert not lanes.is_empty(("day", "flatbed", (0, 0), None, None))
+    assert lanes.is_empty(("day", "flatbed", (2, 0), (3278, -9680), None))
+
+
+async def _chunks(data):
+    yield data
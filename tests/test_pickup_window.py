@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config import settings
+from app.repositories import SupabaseLoadRepository
+from app.supabase import MockDatabase, MockSupabaseClient
+from app.utils import utils_loads
+from app.utils.utils_cache import GEOCODE_NAMESPACE, cache
+from app.utils.utils_loads import PrefetchedLoads, generate_query, parse_pickup_window, pickup_offset_hours, pickup_window_bounds
+
+PICKUP = datetime(2030, 1, 2, 10, 0)
+
+
+def chicago_load(load_id, pickup):
+    return {
+        "load_id": load_id, "equipment_type": "dryvan", "origin_city": "Chicago", "destination_city": "Dallas",
+        "origin_lat": 41.9, "origin_lng": -87.6, "destination_lat": 32.8, "destination_lng": -96.8, "pickup_datetime": pickup,
+    }
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    database = MockDatabase()
+    database.seed("loads", [
+        chicago_load("early", "2030-01-02T06:00:00"),
+        chicago_load("close", "2030-01-02T11:00:00Z"),
+        chicago_load("late", "2030-01-02T21:00:00"),
+        chicago_load("next_day", "2030-01-03T09:00:00"),
+    ])
+    repository = SupabaseLoadRepository(MockSupabaseClient("url", "key", database=database))
+    monkeypatch.setattr(utils_loads, "load_repository", repository)
+    asyncio.run(cache.set(GEOCODE_NAMESPACE, "chicago, il", [41.88, -87.63], 60))
+    return repository
+
+
+def search(pickup_window, pickup=PICKUP):
+    return asyncio.run(utils_loads.find_loads_within_radius("dryvan", "Chicago, IL", None, pickup, None, pickup_window))
+
+
+def test_parse_pickup_window():
+    assert parse_pickup_window("Same_Day") == "same_day"
+    assert parse_pickup_window("6") == 6.0
+    with pytest.raises(ValueError):
+        parse_pickup_window("soon")
+    with pytest.raises(ValueError):
+        parse_pickup_window("-1")
+
+
+def test_window_bounds_are_utc():
+    assert pickup_window_bounds(PICKUP, 2) == (datetime(2030, 1, 2, 8), datetime(2030, 1, 2, 12))
+    start, end = pickup_window_bounds(PICKUP.replace(tzinfo=timezone(timedelta(hours=-6))), "same_day")
+    assert (start, end.replace(microsecond=0)) == (datetime(2030, 1, 2, 6), datetime(2030, 1, 3, 5, 59, 59))
+    assert pickup_offset_hours({"pickup_datetime": "2030-01-02T11:30:00+00:00"}, PICKUP) == 1.5
+
+
+def test_same_day_window_ranks_by_offset(repository):
+    loads, omitted, _ = search("same_day")
+    assert [load["load_id"] for load in loads] == ["close", "early", "late"]
+    assert [load["pickup_offset_hours"] for load in loads] == [1.0, -4.0, 11.0]
+    assert omitted == []
+
+
+def test_hours_window_and_fallback(repository):
+    loads, omitted, _ = search(2)
+    assert [load["load_id"] for load in loads] == ["close"]
+    loads, omitted, _ = search(24)
+    assert "next_day" not in [load["load_id"] for load in loads]
+    # Nothing within the exact time: the pickup filter is dropped, offsets are still reported
+    loads, omitted, _ = search("exact")
+    assert omitted == ["pickup_datetime"]
+    assert all(load["pickup_offset_hours"] is not None for load in loads)
+
+
+def test_window_candidates_are_the_pickups_closest_to_the_requested_time(monkeypatch):
+    # Stored first, the early pickups would fill an unordered candidate limit
+    rows = [chicago_load(f"dawn_{hour}", f"2030-01-02T0{hour}:00:00") for hour in range(5)]
+    rows += [chicago_load("after", "2030-01-02T13:00:00"), chicago_load("close", "2030-01-02T09:30:00Z")]
+    database = MockDatabase()
+    database.seed("loads", rows)
+    repository = SupabaseLoadRepository(MockSupabaseClient("url", "key", database=database))
+    monkeypatch.setattr(settings, "pickup_window_candidates", 2)
+    query = generate_query("dryvan", 41, 43, -88, -87, pickup_datetime=PICKUP, pickup_window=12)
+
+    assert [load["load_id"] for load in asyncio.run(repository.search(query))] == ["close", "after"]
+    prefetched = PrefetchedLoads("dryvan", query.origin_box, rows)
+    assert [load["load_id"] for load in asyncio.run(prefetched.search(query))] == ["close", "after"]
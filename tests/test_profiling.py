@@ -0,0 +1,86 @@
+import asyncio
+import pstats
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.instrumentation import span
+from app.profiling import ProfilingMiddleware, profiler
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def spin_in_child_task():
+    spin(0.05)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "profile_token", "secret")
+    app = FastAPI()
+
+    @app.get("/loads/slow")
+    async def slow():
+        with span("slow.spin"):
+            spin(0.05)
+        with span("slow.child"):
+            await asyncio.ensure_future(spin_in_child_task())
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware)
+    return TestClient(app)
+
+
+def test_requests_without_the_token_are_not_profiled(client):
+    response = client.get("/loads/slow", headers={"x-profile": "wrong"})
+    assert "x-profile-id" not in response.headers
+
+
+def test_profile_has_samples_spans_and_exports(client, tmp_path):
+    response = client.get("/loads/slow", headers={"x-profile": "secret"})
+    profile = profiler.get(response.headers["x-profile-id"])
+    assert profile.status == 200
+    assert [entry["span"] for entry in profile.span_breakdown()] == ["slow.spin", "slow.child"]
+
+    collapsed = profile.collapsed()
+    assert "slow (test_profiling.py" in collapsed
+    # Work in a task started by the request is attributed to it
+    assert "spin_in_child_task (test_profiling.py" in collapsed
+    assert profile.top_functions()[0]["function"].startswith("spin (")
+
+    path = tmp_path / "profile.pstats"
+    path.write_bytes(profile.pstats())
+    stats = pstats.Stats(str(path))
+    spin_stats = next(value for key, value in stats.stats.items() if key[2] == "spin")
+    # About 100 ms of spinning, sampled every PROFILE_INTERVAL_MS
+    assert 0.05 < spin_stats[3] < 0.2
+
+
+def test_concurrent_profiles_only_sample_their_own_tasks():
+    async def main():
+        first = profiler.start("GET", "/first", "header")
+        # A second request's task, started outside the first request's context
+        second_task = asyncio.get_running_loop().create_task(second())
+        await asyncio.sleep(0)
+        spin(0.05)
+        profiler.finish(first, 200)
+        return first, await second_task
+
+    async def second():
+        profile = profiler.start("GET", "/second", "header")
+        await asyncio.sleep(0.1)
+        profiler.finish(profile, 200)
+        return profile
+
+    first, second_profile = asyncio.run(main())
+    assert "spin (" in first.collapsed()
+    # The second request only waited while the first one spun
+    assert "spin (" not in second_profile.collapsed()
+    assert not first.frames and not first.tasks
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.instrumentation import registry
+from app.repositories import SupabaseCarrierRepository, SupabaseLoadRepository
+from app.supabase import MockDatabase, MockSupabaseClient
+from app.utils import utils_carriers
+
+
+class FailingClient(MockSupabaseClient):
+    """Mock client whose queries raise instead of returning"""
+
+    async def _run(self, query):
+        raise ConnectionError("connection reset")
+
+
+class CountingClient(MockSupabaseClient):
+    """Mock client that records the most queries it ever ran at once"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = 0
+        self.most_running = 0
+
+    async def _run(self, query):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        try:
+            return await super()._run(query)
+        finally:
+            self.running -= 1
+
+
+def database():
+    database = MockDatabase()
+    database.seed("carriers", [{"mc_number": "123456"}])
+    database.seed("loads", [
+        {"load_id": "open", "equipment_type": "dryvan", "booking_id": None},
+        {"load_id": "booked", "equipment_type": "dryvan", "booking_id": "booking_1"},
+    ])
+    return database
+
+
+def errors(operation):
+    return registry._counters["db_query_errors_total"].get((operation,), 0)
+
+
+def test_query_errors_propagate_and_are_counted():
+    client = FailingClient("url", "key", database=database())
+    before = errors("loads.get")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(SupabaseLoadRepository(client).get("open"))
+    assert client.query_stats()["loads.get"]["errors"] == 1
+    assert errors("loads.get") == before + 1
+
+
+def test_slow_queries_time_out_and_are_counted():
+    client = MockSupabaseClient("url", "key", query_timeout=0.01, latency_ms=200, database=database())
+    before = errors("carriers.exists")
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(SupabaseCarrierRepository(client).exists("123456"))
+    stats = client.query_stats()["carriers.exists"]
+    assert stats["count"] == 1 and stats["errors"] == 1 and stats["max_seconds"] < 0.2
+    assert errors("carriers.exists") == before + 1
+
+
+def test_missing_and_booked_loads():
+    client = MockSupabaseClient("url", "key", database=database())
+    loads = SupabaseLoadRepository(client)
+
+    async def main():
+        return (
+            await loads.get("missing"),
+            await loads.book("missing", {"booking_id": "booking_2"}),
+            await loads.book("booked", {"booking_id": "booking_2"}),
+            await loads.get("booked"),
+        )
+
+    missing, book_missing, book_booked, booked = asyncio.run(main())
+    assert missing is None and book_missing is None and book_booked is None
+    # A failed booking leaves the existing one in place
+    assert booked["booking_id"] == "booking_1"
+    assert client.query_stats()["loads.book"]["errors"] == 0
+
+
+def test_pool_bounds_queries_in_flight():
+    client = CountingClient("url", "key", pool_size=2, latency_ms=10, database=database())
+    carriers = SupabaseCarrierRepository(client)
+
+    async def main():
+        return await asyncio.gather(*(carriers.exists("123456") for _ in range(8)))
+
+    assert asyncio.run(main()) == [True] * 8
+    assert client.most_running == 2
+
+
+def test_carrier_check_treats_database_errors_as_not_found(monkeypatch):
+    monkeypatch.setattr(utils_carriers, "carrier_repository", SupabaseCarrierRepository(FailingClient("url", "key", database=database())))
+    assert asyncio.run(utils_carriers.check_carrier_exists("999999")) is False
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.repositories import SupabaseLoadRepository
+from app.routers import loads
+from app.supabase import MockDatabase, MockSupabaseClient
+from app.utils import utils_reservations
+from app.utils.utils_reservations import ReservationTable, confirm_load, negotiate_load
+
+
+def load(load_id, rate=1000.0):
+    return {"load_id": load_id, "equipment_type": "dryvan", "origin_city": "Chicago", "destination_city": "Dallas", "loadboard_rate": rate}
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    database = MockDatabase()
+    database.seed("loads", [load(f"load_{number}") for number in range(20)])
+    # Latency lets the confirmations of a hot load interleave between their queries
+    repository = SupabaseLoadRepository(MockSupabaseClient("url", "key", latency_ms=5, database=database))
+    monkeypatch.setattr(utils_reservations, "load_repository", repository)
+    monkeypatch.setattr(utils_reservations, "reservations", ReservationTable(60))
+    return repository
+
+
+def test_one_confirmation_wins_per_hot_load(repository):
+    async def main():
+        confirmations = [confirm_load(f"load_{number % 5}", str(100000 + carrier), 1000.0) for number in range(5) for carrier in range(100)]
+        return await asyncio.gather(*confirmations)
+
+    results = asyncio.run(main())
+    for number in range(5):
+        load_results = [result for result in results if result["load_id"] == f"load_{number}"]
+        booked = [result for result in load_results if result["status"] == "booked"]
+        assert len(booked) == 1
+        assert {result["status"] for result in load_results} == {"booked", "unavailable"}
+        stored = asyncio.run(repository.get(f"load_{number}"))
+        assert stored["booked_carrier_mc"] == booked[0]["carrier_mc"]
+        assert stored["booking_id"] == booked[0]["confirmation_id"]
+
+
+def test_compare_and_set_settles_races_between_workers(repository, monkeypatch):
+    # A fresh reservation table per confirmation stands in for confirmations arriving on different workers
+    class PerWorkerReservations:
+        def acquire(self, load_id, carrier_mc):
+            return ReservationTable(60).acquire(load_id, carrier_mc)
+
+        def release(self, load_id, carrier_mc):
+            pass
+
+    monkeypatch.setattr(utils_reservations, "reservations", PerWorkerReservations())
+
+    async def main():
+        return await asyncio.gather(*(confirm_load("load_0", str(200000 + carrier), 900.0) for carrier in range(200)))
+
+    statuses = [result["status"] for result in asyncio.run(main())]
+    assert statuses.count("booked") == 1
+    assert statuses.count("unavailable") == 199
+
+
+def test_unrelated_loads_are_not_serialized(repository):
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(confirm_load(f"load_{number}", "123456", 1000.0) for number in range(20)))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+    assert all(result["status"] == "booked" for result in results)
+    # Two 5 ms queries per confirmation; one after another would take 200 ms
+    assert elapsed < 0.15
+
+
+def test_negotiation_holds_the_load_and_retries_are_idempotent(repository):
+    async def main():
+        accepted = await negotiate_load("load_0", "111111", 1050.0)
+        countered = await negotiate_load("load_0", "111111", 2000.0)
+        other_carrier = await negotiate_load("load_0", "222222", 1000.0)
+        blocked_confirm = await confirm_load("load_0", "222222", 1000.0)
+        too_high = await confirm_load("load_0", "111111", 1200.0)
+        booked = await confirm_load("load_0", "111111", 1100.0)
+        retried = await confirm_load("load_0", "111111", 1100.0)
+        after_booking = await negotiate_load("load_0", "222222", 1000.0)
+        return accepted, countered, other_carrier, blocked_confirm, too_high, booked, retried, after_booking
+
+    accepted, countered, other_carrier, blocked_confirm, too_high, booked, retried, after_booking = asyncio.run(main())
+    assert accepted["status"] == "accepted"
+    assert countered["status"] == "countered" and countered["counter_rate"] == pytest.approx(1000.0 * (1 + settings.negotiation_max_markup))
+    assert countered["negotiation_id"] == accepted["negotiation_id"]
+    assert other_carrier["status"] == "rejected"
+    assert blocked_confirm["status"] == "unavailable"
+    assert too_high["status"] == "rejected"
+    assert booked["status"] == "booked" and booked["booking_reference"].startswith("BK-")
+    assert retried["status"] == "booked" and retried["booking_reference"] == booked["booking_reference"]
+    assert after_booking["status"] == "rejected"
+
+
+def test_endpoints(repository):
+    app = FastAPI()
+    app.include_router(loads.router)
+    client = TestClient(app)
+    headers = {"x-api-key": settings.api_key}
+
+    response = client.post("/loads/confirm", json={"load_id": "missing", "carrier_mc": "MC 123456", "final_rate": 1000}, headers=headers)
+    assert response.status_code == 404
+    response = client.post("/loads/negotiate", json={"load_id": "load_1", "carrier_mc": "MC 123456", "proposed_rate": 990}, headers=headers)
+    assert response.json()["status"] == "accepted"
+    response = client.post("/loads/confirm", json={"load_id": "load_1", "carrier_mc": "MC 123456", "final_rate": 990}, headers=headers)
+    assert response.json()["status"] == "booked"
+    assert response.json()["carrier_mc"] == "123456"
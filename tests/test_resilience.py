@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.utils.utils_resilience import BulkheadFullError, CircuitBreaker, CircuitOpenError, Dependency
+
+
+def make_dependency(max_concurrency=4, max_wait=1.0, open_seconds=60.0, hedge=False, is_failure=lambda e: True):
+    breaker = CircuitBreaker("test", window=30, min_calls=4, error_rate=0.5, open_seconds=open_seconds)
+    return Dependency("test", max_concurrency, max_wait, breaker, hedge=hedge, hedge_min_delay=0.01, is_failure=is_failure)
+
+
+async def ok(value="ok", delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def fail():
+    raise RuntimeError("down")
+
+
+async def call_ignoring_errors(dependency, func):
+    try:
+        return await dependency.call(func)
+    except Exception as e:
+        return e
+
+
+def test_breaker_opens_after_error_rate_and_fails_fast():
+    async def scenario():
+        dependency = make_dependency()
+        for func in (ok, fail, fail, ok):
+            await call_ignoring_errors(dependency, func)
+        assert dependency.breaker.state == "open"
+        calls = []
+        with pytest.raises(CircuitOpenError):
+            await dependency.call(lambda: calls.append(1) or ok())
+        assert calls == []
+
+    asyncio.run(scenario())
+
+
+def test_half_open_probe_closes_or_reopens():
+    async def scenario():
+        dependency = make_dependency(open_seconds=0.0)
+        for _ in range(4):
+            await call_ignoring_errors(dependency, fail)
+        assert dependency.breaker.state == "open"
+
+        await call_ignoring_errors(dependency, fail)
+        assert dependency.breaker.state == "open"
+        assert await dependency.call(ok) == "ok"
+        assert dependency.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_errors_not_counted_as_failures_keep_breaker_closed():
+    async def scenario():
+        dependency = make_dependency(is_failure=lambda e: not isinstance(e, KeyError))
+
+        async def not_found():
+            raise KeyError("missing")
+
+        for _ in range(10):
+            await call_ignoring_errors(dependency, not_found)
+        assert dependency.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_bulkhead_rejects_when_full():
+    async def scenario():
+        dependency = make_dependency(max_concurrency=1, max_wait=0.01)
+        slow = asyncio.create_task(dependency.call(lambda: ok(delay=0.1)))
+        await asyncio.sleep(0)
+        with pytest.raises(BulkheadFullError):
+            await dependency.call(ok)
+        assert await slow == "ok"
+        assert dependency.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_hedge_wins_over_slow_primary():
+    async def scenario():
+        dependency = make_dependency(hedge=True)
+        for _ in range(20):
+            await dependency.call(ok, idempotent=True)
+
+        delays = [1.0, 0.0]
+        started = asyncio.get_running_loop().time()
+        result = await dependency.call(lambda: ok("done", delays.pop(0)), idempotent=True)
+        assert result == "done"
+        assert asyncio.get_running_loop().time() - started < 0.5
+        # The losing primary is cancelled and gives back its slot
+        await asyncio.sleep(0)
+        assert dependency.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.utils import utils_metrics
+from app.utils.utils_runs import RunDataParser
+
+TRANSCRIPT = [{"role": "user", "content": 'He said "MC 123456" \\ okay é {not [json \\'}] * 3
+
+
+def run(events, status="completed", status_last=False):
+    fields = [("id", "run_1"), ("events", events), ("metadata", {"nested": [1, {"status": "wrong"}]})]
+    fields.insert(len(fields) if status_last else 0, ("status", status))
+    return json.dumps(dict(fields), ensure_ascii=False).encode()
+
+
+def parse(body, chunk_size):
+    parser = RunDataParser()
+    for start in range(0, len(body), chunk_size):
+        if parser.feed(body[start:start + chunk_size]):
+            break
+    return parser.duration, parser.status
+
+
+@pytest.mark.parametrize("status_last", [False, True])
+def test_fields_survive_every_chunk_boundary(status_last):
+    events = [
+        {"type": "message", "transcript": TRANSCRIPT, "duration": 5},
+        {"duration": 312.5, "transcript": TRANSCRIPT, "type": "session"},
+        {"type": "session", "duration": 1},
+    ]
+    body = run(events, status="en \"progrès\"", status_last=status_last)
+    for chunk_size in range(1, 40):
+        assert parse(body, chunk_size) == (312.5, 'en "progrès"')
+
+
+def test_missing_fields():
+    assert parse(run([{"type": "message", "duration": 3}]), 7) == ("", "completed")
+    assert parse(json.dumps({"events": [{"type": "session", "duration": None}]}).encode(), 5) == (None, None)
+    assert parse(b"[]", 1) == ("", None)
+
+
+def test_parsing_stops_once_both_fields_are_known():
+    parser = RunDataParser()
+    head = b'{"status": "completed", "events": [{"type": "session", "duration": 42}, {"transcript": "'
+    assert parser.feed(head)
+    assert (parser.duration, parser.status) == (42, "completed")
+
+
+def test_fetch_closes_the_stream_early(monkeypatch):
+    sent = []
+
+    async def body():
+        yield b'{"status": "completed", "events": [{"type": "session", "duration": 42}'
+        for _ in range(100):
+            sent.append(1)
+            yield b', {"type": "message", "transcript": "' + b"x" * 10000 + b'"}'
+        yield b"]}"
+
+    def handler(request):
+        assert request.headers["x-organization-id"] == "org_1"
+        return httpx.Response(200, content=body())
+
+    monkeypatch.setattr(settings, "happyrobot_bearer_token", "token")
+    monkeypatch.setattr(utils_metrics, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    assert asyncio.run(utils_metrics.fetch_run_data_from_happyrobot("run_1", "org_1")) == (42, "completed")
+    assert len(sent) <= 1
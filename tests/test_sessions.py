@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.repositories import SupabaseLoadRepository
+from app.supabase import MockDatabase, MockSupabaseClient
+from app.utils import utils_loads, utils_reservations
+from app.utils.utils_cache import GEOCODE_NAMESPACE, cache
+from app.utils.utils_reservations import ReservationTable
+from app.utils.utils_sessions import CallSessionStore
+
+TOMORROW = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+PLACES = {"chicago, il": [41.88, -87.63], "dallas, tx": [32.78, -96.8], "denver, co": [39.74, -104.99]}
+
+
+def chicago_load(load_id, destination, pickup):
+    lat, lng = PLACES[destination]
+    return {
+        "load_id": load_id, "equipment_type": "dryvan", "origin_city": "Chicago", "destination_city": destination,
+        "origin_lat": 41.9, "origin_lng": -87.6, "destination_lat": lat, "destination_lng": lng, "pickup_datetime": pickup.isoformat(),
+    }
+
+
+class CountingRepository(SupabaseLoadRepository):
+    def __init__(self, client):
+        super().__init__(client)
+        self.searches = 0
+
+    async def search(self, search):
+        self.searches += 1
+        return await super().search(search)
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    database = MockDatabase()
+    database.seed("loads", [
+        chicago_load("dallas_1", "dallas, tx", TOMORROW),
+        chicago_load("dallas_2", "dallas, tx", TOMORROW + timedelta(days=1)),
+        chicago_load("denver", "denver, co", TOMORROW + timedelta(hours=3)),
+    ])
+    repository = CountingRepository(MockSupabaseClient("url", "key", database=database))
+    monkeypatch.setattr(utils_loads, "load_repository", repository)
+    for place, coordinates in PLACES.items():
+        asyncio.run(cache.set(GEOCODE_NAMESPACE, place, coordinates, 60))
+    return repository
+
+
+def ids(result):
+    return [load["load_id"] for load in result[0]]
+
+
+def test_idle_and_excess_sessions_are_evicted():
+    store = CallSessionStore(idle_seconds=60, max_sessions=2)
+    first = store.get("a")
+    assert store.get("a") is first
+    first.last_seen -= 61
+    store.get("b")
+    assert store.get("a") is not first
+    store.get("c")
+    assert len(store) == 2
+    assert store.get(None) is None
+
+
+def test_later_searches_of_a_call_are_served_from_the_session(repository, monkeypatch):
+    session = CallSessionStore(60, 10).get("run-1")
+    geocoded = []
+
+    async def call():
+        first = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", "Dallas, TX", TOMORROW, session=session)
+        # Let the origin prefetch finish
+        await asyncio.sleep(0.01)
+        searches_before = repository.searches
+
+        async def recording_geocode(query, cache_key):
+            geocoded.append(cache_key)
+            return PLACES[cache_key]
+
+        cache.clear(GEOCODE_NAMESPACE)
+        monkeypatch.setattr(utils_loads, "_geocode", recording_geocode)
+        repeat = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", "Dallas, TX", TOMORROW, session=session)
+        tweaked = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", "Denver, CO", TOMORROW, session=session)
+        relaxed = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", "Dallas, TX", TOMORROW + timedelta(days=5), session=session)
+        return first, repeat, tweaked, relaxed, repository.searches - searches_before
+
+    first, repeat, tweaked, relaxed, database_searches = asyncio.run(call())
+    assert ids(first) == ids(repeat) == ["dallas_1"]
+    assert ids(tweaked) == ["denver"]
+    assert tweaked[0][0]["pickup_offset_hours"] == 3.0
+    assert sorted(ids(relaxed)) == ["dallas_1", "dallas_2"] and relaxed[1] == ["pickup_datetime"]
+    assert database_searches == 0
+    # Only the place the call had not looked up yet
+    assert geocoded == ["denver, co"]
+
+
+def test_truncated_prefetch_is_not_used(repository, monkeypatch):
+    monkeypatch.setattr(settings, "session_prefetch_limit", 1)
+    session = CallSessionStore(60, 10).get("run-2")
+
+    async def call():
+        await utils_loads.find_loads_within_radius("dryvan", "Chicago, IL", "Dallas, TX", TOMORROW, session=session)
+        await asyncio.sleep(0.01)
+        searches_before = repository.searches
+        result = await utils_loads.find_loads_within_radius("dryvan", "Chicago, IL", "Denver, CO", TOMORROW, session=session)
+        return result, repository.searches - searches_before
+
+    result, database_searches = asyncio.run(call())
+    assert ids(result) == ["denver"]
+    assert database_searches == 1
+
+
+def test_booked_and_held_loads_are_not_offered_again(repository, monkeypatch):
+    store = CallSessionStore(60, 10)
+    table = ReservationTable(60)
+    monkeypatch.setattr(utils_reservations, "load_repository", repository)
+    monkeypatch.setattr(utils_reservations, "call_sessions", store)
+    monkeypatch.setattr(utils_reservations, "reservations", table)
+    monkeypatch.setattr(utils_loads, "reservations", table)
+    session = store.get("run-3")
+    session.carriers["123456"] = True
+    store.get("run-4").carriers["654321"] = True
+    relaxed_pickup = TOMORROW + timedelta(days=5)
+
+    async def call():
+        before = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", "Dallas, TX", relaxed_pickup, session=session)
+        await asyncio.sleep(0.01)
+        confirmation = await utils_reservations.confirm_load("dallas_1", "123456", 1000.0)
+        # Another call is negotiating the other Dallas load
+        table.acquire("dallas_2", "654321")
+        repeat = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", "Dallas, TX", relaxed_pickup, session=session)
+        prefetched = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", None, None, session=session)
+        fresh = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", None, None)
+        own = await utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", None, None, session=store.get("run-4"))
+        return before, confirmation, repeat, prefetched, fresh, own
+
+    before, confirmation, repeat, prefetched, fresh, own = asyncio.run(call())
+    assert sorted(ids(before)) == ["dallas_1", "dallas_2"]
+    assert confirmation["status"] == "booked"
+    assert ids(repeat) == []
+    assert ids(prefetched) == ids(fresh) == ["denver"]
+    # The negotiating carrier's own call still sees the load it holds
+    assert sorted(ids(own)) == ["dallas_2", "denver"]
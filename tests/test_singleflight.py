@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.utils import utils_loads
+from app.utils.utils_deadline import Deadline
+from app.utils.utils_singleflight import SingleFlight
+
+
+class Computation:
+    def __init__(self, delay=0.02, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.calls
+
+
+def test_followers_share_the_leaders_result():
+    flight, compute = SingleFlight("test"), Computation()
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+
+    assert asyncio.run(main()) == [1] * 5
+    assert compute.calls == 1 and flight.in_flight() == 0
+
+
+def test_exception_propagates_to_every_follower():
+    flight, compute = SingleFlight("test"), Computation(error=RuntimeError("boom"))
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("key", compute) for _ in range(3)), return_exceptions=True)
+        assert flight.in_flight() == 0
+        compute.error = None
+        return results, await flight.do("key", compute)
+
+    results, retry = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) and str(result) == "boom" for result in results)
+    # The failure is not cached: the next call runs again
+    assert retry == 2
+
+
+def test_cancelled_leader_leaves_the_computation_to_its_followers():
+    flight, compute = SingleFlight("test"), Computation()
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 1
+    assert compute.calls == 1 and compute.cancelled == 0
+
+
+def test_key_is_freed_as_soon_as_the_last_waiter_is_cancelled():
+    flight, compute = SingleFlight("test"), Computation()
+
+    async def main():
+        waiter = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # Before the cancelled task's done callback has run
+        assert flight.in_flight() == 0
+        return await flight.do("key", compute)
+
+    assert asyncio.run(main()) == 2
+    assert compute.calls == 2 and compute.cancelled == 1
+
+
+def test_follower_searches_again_when_the_leaders_deadline_cut_it_short(monkeypatch):
+    deadlines = []
+
+    async def find_loads_within_radius(equipment_type, origin, destination, pickup_datetime, deadline, pickup_window, session):
+        deadlines.append(deadline)
+        await asyncio.sleep(0.05)
+        return [{"load_id": "load_1"}], [], deadline.expired
+
+    monkeypatch.setattr(utils_loads, "find_loads_within_radius", find_loads_within_radius)
+    monkeypatch.setattr(utils_loads, "load_search_flight", SingleFlight("load_search"))
+    leader_deadline, follower_deadline = Deadline(0.02), Deadline(5)
+
+    async def main():
+        return await asyncio.gather(
+            utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", deadline=leader_deadline),
+            utils_loads.find_loads_within_radius_coalesced("dryvan", "Chicago, IL", deadline=follower_deadline),
+        )
+
+    leader, follower = asyncio.run(main())
+    assert leader == ([], [], True)
+    assert follower == ([{"load_id": "load_1"}], [], False)
+    assert deadlines == [leader_deadline, follower_deadline]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import random
+
+import numpy as np
+import pytest
+
+from app.utils.utils_sketches import DDSketch, SketchRegistry
+
+NAMES = ("call_duration", "rate_difference")
+
+
+def values(seed, size=2000):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(5, 1) for _ in range(size)] + [-rng.uniform(1, 100) for _ in range(size // 10)] + [0.0] * 10
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    data = values(1)
+    sketch = DDSketch(0.01)
+    for value in data:
+        sketch.add(value)
+    for q in (0.05, 0.5, 0.9, 0.99):
+        expected = float(np.quantile(data, q, method="lower"))
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.0201, abs=1e-9)
+    assert (sketch.quantile(0), sketch.quantile(1)) == (min(data), max(data))
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_merged_sketches_equal_one_sketch_of_all_values():
+    first, second, combined = DDSketch(), DDSketch(), DDSketch()
+    for value in values(2):
+        first.add(value)
+        combined.add(value)
+    for value in values(3):
+        second.add(value)
+        combined.add(value)
+    first.merge(DDSketch.from_dict(json.loads(json.dumps(second.to_dict()))))
+    merged, expected = first.to_dict(), combined.to_dict()
+    assert merged.pop("sum") == pytest.approx(expected.pop("sum"))
+    assert merged == expected
+    assert [first.quantile(q) for q in (0.5, 0.99)] == [combined.quantile(q) for q in (0.5, 0.99)]
+    with pytest.raises(ValueError):
+        first.merge(DDSketch(0.05))
+
+
+def test_collapsing_keeps_the_bucket_count_bounded():
+    sketch = DDSketch(0.01, max_buckets=50)
+    for exponent in range(-5, 10):
+        for step in range(100):
+            sketch.add(10 ** exponent * (1 + step / 100))
+    assert len(sketch.positive) <= 50 and sketch.count == 1500
+    # The top of the range keeps its accuracy; only the smallest values share a bucket
+    assert sketch.quantile(0.99) == pytest.approx(10 ** 9 * 1.84, rel=0.02)
+
+
+def test_workers_flush_into_one_state_file(tmp_path):
+    path = str(tmp_path / "state" / "sketches.json")
+    workers = [SketchRegistry(NAMES, state_path=path) for _ in range(3)]
+    for number, worker in enumerate(workers):
+        for value in range(1, 101):
+            worker.record("call_duration", value + 100 * number)
+        worker.record("rate_difference", "not a number")
+        worker.record("rate_difference", "")
+
+    # Pending values are visible to their own worker before any flush
+    assert workers[0].percentiles()["call_duration"]["count"] == 100
+    for worker in workers:
+        worker.flush()
+        # A second flush has nothing new to add
+        worker.flush()
+
+    reader = SketchRegistry(NAMES, state_path=path)
+    summary = reader.percentiles()
+    assert summary["call_duration"]["count"] == 300
+    assert (summary["call_duration"]["min"], summary["call_duration"]["max"]) == (1, 300)
+    assert summary["call_duration"]["p50"] == pytest.approx(150, rel=0.02)
+    assert summary["rate_difference"] == {"count": 0, "min": None, "max": None, "p50": None, "p90": None, "p99": None}
+
+    # Values recorded after the flush are merged with the file on read
+    reader.record("call_duration", 1000)
+    assert reader.percentiles()["call_duration"]["count"] == 301
+
+
+def test_failed_flush_keeps_the_values(tmp_path):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    registry = SketchRegistry(NAMES, state_path=str(blocker / "sketches.json"))
+    registry.record("call_duration", 5)
+    registry.flush()
+    assert registry.snapshot()["call_duration"].count == 1
+
+    registry.state_path = str(tmp_path / "sketches.json")
+    registry.flush()
+    assert SketchRegistry(NAMES, state_path=registry.state_path).snapshot()["call_duration"].count == 1
+
+
+def test_flush_loop_flushes_when_cancelled(tmp_path):
+    path = str(tmp_path / "sketches.json")
+    registry = SketchRegistry(NAMES, state_path=path, flush_interval=60)
+
+    async def main():
+        task = asyncio.ensure_future(registry.run_flush_loop())
+        await asyncio.sleep(0)
+        registry.record("call_duration", 7)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert SketchRegistry(NAMES, state_path=path).snapshot()["call_duration"].count == 1
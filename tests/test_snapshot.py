@@ -0,0 +1,145 @@
+import asyncio
+import fcntl
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.utils.utils_chains import LoadGraph
+from app.utils.utils_deadline import Deadline
+from app.utils.utils_snapshot import LoadSnapshot, SnapshotFile, epoch
+
+CHICAGO = (41.88, -87.63)
+DALLAS = (32.78, -96.80)
+START = datetime(2030, 1, 1, 6, 0)
+
+
+def load(load_id, origin, destination, pickup_hours, equipment_type="dryvan", rate=1000.0):
+    return {
+        "load_id": load_id, "equipment_type": equipment_type, "loadboard_rate": rate,
+        "origin_lat": origin[0], "origin_lng": origin[1], "destination_lat": destination[0], "destination_lng": destination[1],
+        "pickup_datetime": (START + timedelta(hours=pickup_hours)).isoformat(),
+    }
+
+
+def near(point, miles_north):
+    return (point[0] + miles_north / 69.0, point[1])
+
+
+def rows():
+    return [
+        load("out", near(CHICAGO, 10), DALLAS, 2),
+        load("back", near(DALLAS, 20), near(CHICAGO, 5), 30, rate=None),
+        load("reefer", near(DALLAS, 5), CHICAGO, 30, equipment_type="reefer"),
+        {"load_id": "unlocated", "equipment_type": "dryvan", "pickup_datetime": START.isoformat()},
+    ]
+
+
+class Fetcher:
+    def __init__(self, rows, delay=0.0):
+        self.rows = rows
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.rows
+
+
+def test_mapped_snapshot_matches_rows(tmp_path):
+    path = str(tmp_path / "loads.snapshot")
+    built = LoadSnapshot.from_rows(rows())
+    built.write(path)
+    mapped = LoadSnapshot.open(path)
+
+    assert len(mapped) == 4 and mapped.equipment_types == ["dryvan", "reefer"]
+    for name, column in built.columns.items():
+        np.testing.assert_array_equal(mapped.columns[name], column)
+        assert not mapped.columns[name].flags.writeable
+    assert mapped.row(1)["load_id"] == "back"
+    assert np.isnan(mapped.columns["origin_lat"][3]) and np.isnan(mapped.columns["loadboard_rate"][1])
+
+    graph = LoadGraph(mapped, cell_miles=50, speed_mph=50)
+    assert graph.size == 3
+    chains, _ = graph.find_chains("dryvan", CHICAGO, CHICAGO, epoch(START), 2, Deadline())
+    assert [leg["load"]["load_id"] for leg in chains[0]["legs"]] == ["out", "back"]
+    assert chains[0]["total_rate"] == 1000.0
+
+
+def test_one_worker_builds_the_file_and_the_others_map_it(tmp_path):
+    path = str(tmp_path / "loads.snapshot")
+    fetch = Fetcher(rows(), delay=0.05)
+
+    async def main():
+        # Separate SnapshotFile instances stand in for workers starting together
+        return await asyncio.gather(*(SnapshotFile(path, 60).load(fetch) for _ in range(5)))
+
+    snapshots = asyncio.run(main())
+    assert fetch.calls == 1
+    assert all(len(snapshot) == 4 and snapshot.identity is not None for snapshot in snapshots)
+    assert not os.path.exists(f"{path}.{os.getpid()}.tmp")
+
+    # An unchanged file is not mapped again
+    assert asyncio.run(SnapshotFile(path, 60).load(fetch, snapshots[0])) is snapshots[0]
+    assert fetch.calls == 1
+
+
+def test_stale_file_is_replaced_and_old_mappings_stay_valid(tmp_path):
+    path = str(tmp_path / "loads.snapshot")
+    snapshot_file = SnapshotFile(path, 60)
+    old = asyncio.run(snapshot_file.load(Fetcher(rows())))
+
+    snapshot_file.max_age = 0
+    new = asyncio.run(snapshot_file.load(Fetcher(rows()[:1]), old))
+    assert len(new) == 1 and new.identity != old.identity
+    assert len(old) == 4 and old.row(3)["load_id"] == "unlocated"
+
+
+def test_naive_times_are_utc():
+    assert epoch(START) == epoch("2030-01-01T06:00:00") == epoch("2030-01-01T00:00:00-06:00") == START.replace(tzinfo=timezone.utc).timestamp()
+    assert epoch("not a time") is None
+    assert LoadSnapshot.from_rows(rows()).columns["pickup_epoch"][0] == epoch(START) + 2 * 3600
+
+
+def test_waiting_for_the_lock_is_bounded(tmp_path):
+    path = str(tmp_path / "loads.snapshot")
+    fetch = Fetcher(rows())
+
+    async def main():
+        # Another worker holds the lock and never writes the file
+        with open(f"{path}.lock", "w") as other_worker:
+            fcntl.flock(other_worker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            started = time.monotonic()
+            snapshot = await SnapshotFile(path, 60, lock_timeout=0.2).load(fetch)
+            return snapshot, time.monotonic() - started
+
+    snapshot, waited = asyncio.run(main())
+    assert 0.2 <= waited < 2
+    assert len(snapshot) == 4 and snapshot.identity is None and fetch.calls == 1
+    assert not os.path.exists(path)
+
+
+def test_waiting_worker_maps_the_file_the_lock_holder_wrote(tmp_path):
+    path = str(tmp_path / "loads.snapshot")
+    fetch = Fetcher(rows())
+
+    async def main():
+        with open(f"{path}.lock", "w") as other_worker:
+            fcntl.flock(other_worker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            waiting = asyncio.ensure_future(SnapshotFile(path, 60).load(fetch))
+            await asyncio.sleep(0.1)
+            assert not waiting.done()
+            LoadSnapshot.from_rows(rows()[:2]).write(path)
+            return await waiting
+
+    snapshot = asyncio.run(main())
+    assert len(snapshot) == 2 and snapshot.identity is not None
+    assert fetch.calls == 0
+
+
+def test_missing_state_directory_is_created(tmp_path):
+    path = str(tmp_path / "state" / "loads.snapshot")
+    snapshot = asyncio.run(SnapshotFile(path, 60).load(Fetcher(rows())))
+    assert len(snapshot) == 4 and snapshot.identity is not None and os.path.exists(path)
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, warmup
+from app.config import settings
+from app.supabase import supabase
+from app.utils import utils_loads
+from app.utils.utils_chains import load_graph
+from app.utils.utils_traffic import RecentOrigins, recent_origins
+from app.warmup import Readiness, warm_up
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    readiness = Readiness()
+    monkeypatch.setattr(warmup, "readiness", readiness)
+    monkeypatch.setattr(main, "readiness", readiness)
+    return readiness
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    """Warm-up steps that record their calls instead of reaching real dependencies"""
+    calls = {"geocoded": []}
+
+    async def database_warm_up(connections):
+        calls["connections"] = connections
+
+    async def nothing():
+        pass
+
+    async def get_coordinates(location):
+        calls["geocoded"].append(location)
+
+    monkeypatch.setattr(supabase, "warm_up", database_warm_up)
+    monkeypatch.setattr(warmup, "_preimport", nothing)
+    monkeypatch.setattr(load_graph, "refresh", nothing)
+    monkeypatch.setattr(utils_loads, "get_coordinates", get_coordinates)
+    monkeypatch.setattr(settings, "warmup_connections", 2)
+    monkeypatch.setattr(settings, "warmup_top_origins", 2)
+    return calls
+
+
+def ready(client):
+    response = client.get("/ready")
+    return response.status_code, response.json()
+
+
+def test_ready_fails_until_warm_up_finished(readiness, steps):
+    for origin, count in (("Dallas, TX", 3), ("Chicago, IL", 2), ("Reno, NV", 1)):
+        for _ in range(count):
+            recent_origins.record(origin)
+    recent_origins.flush()
+    client = TestClient(main.app)
+
+    status, body = ready(client)
+    assert status == 503 and body["status"] == "warming_up" and body["warmup_seconds"] is None
+
+    asyncio.run(warm_up())
+    status, body = ready(client)
+    assert status == 200 and body["status"] == "ready"
+    assert body["warmup_seconds"] is not None and body["time_to_ready_seconds"] >= body["warmup_seconds"]
+    assert sorted(body["steps"]) == ["database_pool", "geocode_origins", "imports", "load_graph"]
+    assert all(step["ok"] for step in body["steps"].values())
+    assert steps["connections"] == 2 and steps["geocoded"] == ["Dallas, TX", "Chicago, IL"]
+
+
+def test_failed_step_does_not_block_readiness(readiness, steps, monkeypatch):
+    async def unreachable(connections):
+        raise ConnectionError("database unreachable")
+
+    monkeypatch.setattr(supabase, "warm_up", unreachable)
+    asyncio.run(warm_up())
+
+    assert readiness.ready
+    assert readiness.steps["database_pool"] == {"ok": False, "seconds": readiness.steps["database_pool"]["seconds"], "error": "database unreachable"}
+    assert readiness.steps["load_graph"]["ok"]
+
+
+def test_worker_is_ready_after_the_warm_up_timeout(readiness, steps, monkeypatch):
+    async def hang():
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(load_graph, "refresh", hang)
+    monkeypatch.setattr(settings, "warmup_timeout", 0.1)
+    started = time.monotonic()
+    asyncio.run(warm_up())
+
+    assert time.monotonic() - started < 1
+    status, body = ready(TestClient(main.app))
+    assert status == 200 and body["status"] == "ready"
+    # The hung step never reported and no time was left for geocoding
+    assert "load_graph" not in body["steps"] and "geocode_origins" not in body["steps"]
+    assert body["steps"]["database_pool"]["ok"] and steps["geocoded"] == []
+
+
+def test_recent_origins_keep_the_window_and_create_the_state_directory(tmp_path, monkeypatch):
+    origins = RecentOrigins(str(tmp_path / "state" / "recent_origins.json"), window=60)
+    origins.record("Dallas, TX")
+    origins.flush()
+
+    monkeypatch.setattr(time, "time", lambda: 10 ** 10)
+    origins.record("Chicago, IL")
+    origins.record("Chicago, IL")
+    origins.flush()
+    # Dallas was last searched outside the window
+    assert origins.top(5) == ["Chicago, IL"]